@@ -1,6 +1,13 @@
 // Configuration
 const CHUNKS_DIR = 'histogram_chunks';
-const CHUNK_SIZE = 1000;
+
+// Binary chunks written by histogram_converter.py: chunk_XXXX.idx.json + chunk_XXXX.bin
+const CHUNK_FORMAT_VERSION = 1;
+const MANIFEST_URL = `${CHUNKS_DIR}/manifest.json`;
+const MAX_PARALLEL_CHUNKS = 6;
+const FETCH_RETRIES = 3;
+const DISPLAY_IMAGE_SIZE = 1024; // px, longest side of the shown painting (main.py /thumbnail)
+const CODE_ARRAYS = { uint16: [Uint16Array, 65535], uint8: [Uint8Array, 255] };
 
 // Distance Metrics
 const METRICS = {
@@ -16,6 +23,8 @@ let isDragging = false;
 let lastDragPosition = null;
 let totalChunks = 0;
 let loadedChunks = 0;
+let loadedBytes = 0;
+let manifest = null;
 let globalHistogramMax = 0;
 let currentMetric = METRICS.HELLINGER;
 
@@ -57,11 +66,12 @@ async function init() {
     });
 
     // Load data
-    totalChunks = await detectChunkCount();
-    if (totalChunks === 0) {
-        loadingStatus.textContent = 'Error: No data files found';
+    manifest = await loadManifest();
+    if (!manifest || manifest.chunks.length === 0) {
+        loadingStatus.textContent = 'Error: No data files found (run histogram_converter.py)';
         return;
     }
+    totalChunks = manifest.chunks.length;
 
     await loadAllChunks();
 
@@ -74,62 +84,134 @@ async function init() {
 }
 
 // Data loading functions
-async function detectChunkCount() {
-    let count = 0;
-    while (true) {
-        try {
-            const test = await fetch(`${CHUNKS_DIR}/chunk_${count.toString().padStart(4, '0')}.json`);
-            if (!test.ok) break;
-            count++;
-            if (count > 9999) break;
-        } catch {
-            break;
+async function loadManifest() {
+    try {
+        const response = await fetch(MANIFEST_URL, { cache: 'no-cache' });
+        if (!response.ok) return null;
+        const data = await response.json();
+        if (data.version !== CHUNK_FORMAT_VERSION || data.format !== 'binary') {
+            console.error(`Unsupported chunk manifest ${data.version}/${data.format}`);
+            return null;
         }
+        return data;
+    } catch (error) {
+        console.error('Error loading chunk manifest:', error);
+        return null;
     }
-    return count;
 }
 
-async function loadAllChunks() {
-    for (let i = 0; i < totalChunks; i++) {
+// Stream a file of known size into one preallocated buffer. The URL carries the
+// content hash, so the browser may cache it for good; if the transfer breaks off,
+// the rest is requested with a Range header instead of starting over.
+async function fetchFile(entry) {
+    const url = `${CHUNKS_DIR}/${entry.file}?v=${entry.sha1}`;
+    const bytes = new Uint8Array(entry.bytes);
+    let received = 0;
+
+    for (let attempt = 0; attempt <= FETCH_RETRIES && received < entry.bytes; attempt++) {
         try {
-            const chunkName = `chunk_${i.toString().padStart(4, '0')}.json`;
-            const response = await fetch(`${CHUNKS_DIR}/${chunkName}`);
+            const headers = received > 0 ? { Range: `bytes=${received}-` } : {};
+            const response = await fetch(url, { headers });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            if (received > 0 && response.status !== 206) {
+                // Range not honored: the whole file is coming again
+                loadedBytes -= received;
+                received = 0;
+            }
 
-            if (!response.ok) continue;
+            const reader = response.body.getReader();
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                if (received + value.length > bytes.length) {
+                    throw new Error(`${entry.file} is larger than the manifest says`);
+                }
+                bytes.set(value, received);
+                received += value.length;
+                loadedBytes += value.length;
+                updateProgress();
+            }
+        } catch (error) {
+            console.warn(`Retrying ${entry.file} from byte ${received}:`, error);
+        }
+    }
 
-            const chunkData = await response.json();
+    if (received !== entry.bytes) {
+        throw new Error(`${entry.file}: got ${received} of ${entry.bytes} bytes`);
+    }
+    return bytes.buffer;
+}
 
-            for (const [relPath, imgData] of Object.entries(chunkData)) {
-                const currentMax = Math.max(...imgData.histogram);
-                if (currentMax > globalHistogramMax) {
-                    globalHistogramMax = currentMax;
-                }
+// Decode one binary chunk into a single Float32Array; every image gets a view into it
+function decodeChunk(index, buffer) {
+    if (index.version !== CHUNK_FORMAT_VERSION || index.encoding !== 'sqrt') {
+        throw new Error(`Unsupported chunk format ${index.version}/${index.encoding}`);
+    }
+    const [CodeArray, qmax] = CODE_ARRAYS[index.dtype];
+    const { count, dim } = index;
+    const scales = new Float32Array(buffer, 0, count);
+    const codes = new CodeArray(buffer, count * 4, count * dim);
+    const histograms = new Float32Array(count * dim);
+
+    for (let n = 0; n < count; n++) {
+        // h = scale * (code / qmax)^2; the scale is the image's largest bin
+        const scale = scales[n] / (qmax * qmax);
+        const offset = n * dim;
+        for (let i = 0; i < dim; i++) {
+            const code = codes[offset + i];
+            histograms[offset + i] = code * code * scale;
+        }
+        if (scales[n] > globalHistogramMax) {
+            globalHistogramMax = scales[n];
+        }
+    }
+    return histograms;
+}
 
-                allImages.push({
-                    path: relPath,
-                    img_path: imgData.img_path,
-                    img_shape: imgData.img_shape,
-                    histogram: imgData.histogram,
-                    bins: imgData.bins
-                });
+async function loadAllChunks() {
+    const chunks = manifest.chunks;
+    const decoded = new Array(chunks.length);
+    let next = 0;
+
+    // A few chunks in flight at once: the page is limited by bandwidth, not round trips
+    async function worker() {
+        while (next < chunks.length) {
+            const i = next++;
+            const chunk = chunks[i];
+            try {
+                const [indexBuffer, dataBuffer] = await Promise.all([fetchFile(chunk.index), fetchFile(chunk.data)]);
+                const index = JSON.parse(new TextDecoder().decode(indexBuffer));
+                decoded[i] = { index, histograms: decodeChunk(index, dataBuffer) };
+            } catch (error) {
+                console.error(`Error loading ${chunk.name}:`, error);
             }
-
             loadedChunks++;
             updateProgress();
-
-            if (i % 5 === 0) await new Promise(r => setTimeout(r, 0));
-
-        } catch (error) {
-            console.error(`Error loading chunk ${i}:`, error);
+        }
+    }
+    await Promise.all(Array.from({ length: Math.min(MAX_PARALLEL_CHUNKS, chunks.length) }, worker));
+
+    // Images keep the manifest order, whichever chunk arrived first
+    for (const chunk of decoded) {
+        if (!chunk) continue;
+        const { index, histograms } = chunk;
+        for (let n = 0; n < index.count; n++) {
+            allImages.push({
+                path: index.paths[n],
+                img_shape: index.shapes[n],
+                histogram: histograms.subarray(n * index.dim, (n + 1) * index.dim),
+                bins: index.bins
+            });
         }
     }
     console.log("Global histogram max:", globalHistogramMax);
 }
 
 function updateProgress() {
-    const percent = Math.round((loadedChunks / totalChunks) * 100);
-    progressBar.style.width = `${percent}%`;
-    loadingStatus.textContent = `Loaded ${loadedChunks} of ${totalChunks} chunks (${allImages.length} images)`;
+    const percent = manifest.total_bytes ? Math.round((loadedBytes / manifest.total_bytes) * 100) : 0;
+    progressBar.style.width = `${Math.min(percent, 100)}%`;
+    loadingStatus.textContent = `Loaded ${loadedChunks} of ${totalChunks} chunks ` +
+        `(${(loadedBytes / 1e6).toFixed(1)} of ${(manifest.total_bytes / 1e6).toFixed(1)} MB)`;
 }
 
 // Image display functions
@@ -139,10 +221,10 @@ function loadRandomImage() {
     const randomIndex = Math.floor(Math.random() * allImages.length);
     currentImage = allImages[randomIndex];
 
-    displayImage.src = `wikiart/${currentImage.path}`;
+    displayImage.src = `thumbnail/${currentImage.path}?size=${DISPLAY_IMAGE_SIZE}`;
     imageInfo.textContent = `${currentImage.path} (${currentImage.img_shape[1]}×${currentImage.img_shape[0]})`;
 
-    userHistogram = [...currentImage.histogram];
+    userHistogram = Array.from(currentImage.histogram);
     drawHistogram();
     updateDistance();
 }
@@ -356,7 +438,7 @@ function updateHistogram(e) {
 
 function resetHistogram() {
     if (!currentImage) return;
-    userHistogram = [...currentImage.histogram];
+    userHistogram = Array.from(currentImage.histogram);
     drawHistogram();
     updateDistance();
 }
@@ -416,7 +498,7 @@ function updateDistance() {
     // Update display if closer image found
     if (closestImage && closestImage !== currentImage) {
         currentImage = closestImage;
-        displayImage.src = `wikiart/${currentImage.path}`;
+        displayImage.src = `thumbnail/${currentImage.path}?size=${DISPLAY_IMAGE_SIZE}`;
         imageInfo.textContent = `Closest match (${currentMetric}): ${currentImage.path} (${minDistance.toFixed(4)})`;
     }
 
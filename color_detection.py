@@ -1,9 +1,6 @@
 import cv2
 import os
 import numpy as np
-import pickle
-from pathlib import Path
-from tqdm import tqdm
 import argparse
 
 # Constants
@@ -19,7 +16,11 @@ def parse_arguments():
     parser.add_argument('--dominant-colors', type=int, default=3,
                        help='Number of dominant colors to extract (when mode includes dominant)')
     parser.add_argument('--force-recompute', action='store_true',
-                       help='Force recompute even if pickle files exist')
+                       help='Force recompute of every image instead of only new/changed ones')
+    parser.add_argument('--hash', action='store_true',
+                       help='Compare content hashes so touched but unchanged images are not recomputed')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes for the analysis (1 = single process)')
     return parser.parse_args()
 
 def find_images_recursive(root_folder):
@@ -29,21 +30,14 @@ def find_images_recursive(root_folder):
             for filename in filenames
             if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
 
-def calculate_mean_color(image_path):
-    """Calculate mean color in BGR and HSV spaces"""
-    img = cv2.imread(image_path)
-    if img is None:
-        return None, None
-    
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+def mean_color_from_image(img, hsv=None):
+    """Mean color of an already decoded BGR image in BGR and HSV spaces"""
+    if hsv is None:
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
     return np.mean(img.reshape(-1, 3), axis=0), np.mean(hsv.reshape(-1, 3), axis=0)
 
-def calculate_dominant_color(image_path, k=3):
-    """Calculate dominant colors using k-means clustering"""
-    img = cv2.imread(image_path)
-    if img is None:
-        return None
-    
+def dominant_color_from_image(img, k=3):
+    """Dominant colors of an already decoded BGR image using k-means clustering"""
     pixels = img.reshape(-1, 3).astype(np.float32)
     criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 200, 0.1)
     _, labels, centers = cv2.kmeans(pixels, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
@@ -51,68 +45,27 @@ def calculate_dominant_color(image_path, k=3):
     counts = np.bincount(labels.flatten())
     return centers[np.argsort(counts)[::-1]]  # Sort by frequency
 
-def process_images(args, image_files):
-    """Process images based on selected mode"""
-    mean_colors, dominant_colors = {}, {}
-    
-    for img_path in tqdm(image_files, desc="Analyzing Images", unit="img"):
-        try:
-            rel_path = os.path.relpath(img_path, FOLDER_PATH)
-            
-            if args.mode in ['mean', 'both']:
-                mean_bgr, mean_hsv = calculate_mean_color(img_path)
-                if mean_bgr is not None:
-                    mean_colors[rel_path] = {
-                        'bgr': mean_bgr,
-                        'hsv': mean_hsv,
-                        'path': img_path
-                    }
-            
-            if args.mode in ['dominant', 'both'] and img_path in mean_colors:
-                dom_colors = calculate_dominant_color(img_path, args.dominant_colors)
-                if dom_colors is not None:
-                    dominant_colors[rel_path] = {
-                        'colors': dom_colors,
-                        'path': img_path,
-                        'mean_hsv': mean_colors[rel_path]['hsv'] if rel_path in mean_colors else None
-                    }
-                    
-        except Exception as e:
-            print(f"\n⚠️ Error in {img_path}: {str(e)[:50]}...")
-    
-    return mean_colors, dominant_colors
+def update_color_stores(args, image_files):
+    """Bring the pickles up to date, analyzing only new or changed images"""
+    from feature_extraction import MeanColorExtractor, DominantColorExtractor, run_extractors
 
-def save_results(args, mean_colors, dominant_colors):
-    """Save results to appropriate pickle files"""
+    options = {'force_recompute': args.force_recompute, 'use_hash': args.hash}
+    mean_ext = MeanColorExtractor(**options)
+    dominant_ext = DominantColorExtractor(k=args.dominant_colors, **options)
+    extractors = []
     if args.mode in ['mean', 'both']:
-        with open(os.path.join(PICKLE_DIR, "mean_colors.pkl"), 'wb') as f:
-            pickle.dump(mean_colors, f)
+        extractors.append(mean_ext)
     if args.mode in ['dominant', 'both']:
-        with open(os.path.join(PICKLE_DIR, f"dominant_colors_k{args.dominant_colors}.pkl"), 'wb') as f:
-            pickle.dump(dominant_colors, f)
+        extractors.append(dominant_ext)
+
+    run_extractors(extractors, image_files, FOLDER_PATH, args.workers)
+    return mean_ext.results, dominant_ext.results
 
 def main():
     args = parse_arguments()
     image_files = find_images_recursive(FOLDER_PATH)
     
-    mean_colors, dominant_colors = {}, {}
-    
-    if not args.force_recompute:
-        try:
-            if args.mode in ['mean', 'both']:
-                with open(os.path.join(PICKLE_DIR, "mean_colors.pkl"), 'rb') as f:
-                    mean_colors = pickle.load(f)
-            if args.mode in ['dominant', 'both']:
-                with open(os.path.join(PICKLE_DIR, f"dominant_colors_k{args.dominant_colors}.pkl"), 'rb') as f:
-                    dominant_colors = pickle.load(f)
-            print("🔍 Loaded existing color data files")
-        except FileNotFoundError:
-            pass
-    
-    if (args.mode in ['mean', 'both'] and not mean_colors) or \
-       (args.mode in ['dominant', 'both'] and not dominant_colors):
-        mean_colors, dominant_colors = process_images(args, image_files)
-        save_results(args, mean_colors, dominant_colors)
+    mean_colors, dominant_colors = update_color_stores(args, image_files)
     
     print("\n📊 Analysis Complete")
     if mean_colors:
@@ -1,66 +1,55 @@
 import cv2
 import numpy as np
-import pickle
 import random
-from pathlib import Path
 import matplotlib.pyplot as plt
 import os
 
-# Load histogram data
+from histogram_search import HistogramIndex
+
+# Load histogram data (flat 8x8x8 BGR histograms written by histogram_detection.py)
 HISTOGRAM_FILE = os.path.join("pickles", "color_histograms.pkl")
-with open(HISTOGRAM_FILE, 'rb') as f:
-    histograms = pickle.load(f)
-
-# Convert to list for easier access
-hist_data = []
-for path, data in histograms.items():
-    hist_data.append({
-        'path': data['path'],
-        'hist': data['histogram']
-    })
-
-def compare_histograms(hist1, hist2):
-    """Compare two histograms using correlation"""
-    score = 0
-    for channel in ['hue', 'saturation', 'value']:
-        score += cv2.compareHist(hist1[channel], hist2[channel], cv2.HISTCMP_CORREL)
-    return score / 3  # Average score across channels
-
-def find_closest_histogram(target_hist):
+SEARCH_METHOD = 'correl'  # or 'chisqr', 'intersect', 'bhattacharyya'
+index = HistogramIndex.load(HISTOGRAM_FILE)
+BINS = round(index.dim ** (1 / 3))
+
+def image_data(key):
+    """Viewer record of one indexed image"""
+    i = index.positions[key]
+    return {'key': key, 'path': index.paths[i], 'hist': index.histogram(key)}
+
+def find_closest_histogram(target_hist, exclude=None):
     """Find image with histogram most similar to target"""
-    best_score = -1
-    best_match = None
-    
-    for data in hist_data:
-        score = compare_histograms(target_hist, data['hist'])
-        if score > best_score:
-            best_score = score
-            best_match = data
-    
-    return best_match
+    key, _, _ = index.search(target_hist, k=1, method=SEARCH_METHOD, exclude=exclude)[0]
+    return image_data(key)
+
+def bin_colors(bins=BINS):
+    """RGB color at the center of every flat histogram bin (calcHist order: B, G, R)"""
+    centers = (np.arange(bins) + 0.5) / bins
+    b, g, r = np.meshgrid(centers, centers, centers, indexing='ij')
+    return np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
 
 class InteractiveHistogram:
     def __init__(self):
         self.fig, (self.ax_img, self.ax_hist) = plt.subplots(1, 2, figsize=(16, 6))
-        self.current_data = random.choice(hist_data)
+        self.current_data = image_data(random.choice(index.keys))
         self.current_hist = self.current_data['hist'].copy()
-        self.bins = self.current_hist['bins']
+        self.colors = bin_colors()
         self.bars = None
-        
+
         # Initial display
         self.show_image(self.current_data['path'])
         self.plot_histogram()
-        
+
         # Add randomize button
         ax_random = plt.axes([0.8, 0.01, 0.1, 0.05])
         random_button = plt.Button(ax_random, 'Random Image')
         random_button.on_clicked(self.randomize)
-        
+
         # Connect the click event
         self.fig.canvas.mpl_connect('button_press_event', self.on_click)
-        
+
         plt.show()
-    
+
     def show_image(self, path):
         """Display current image"""
         img = cv2.imread(path)
@@ -69,70 +58,53 @@ class InteractiveHistogram:
         self.ax_img.imshow(img)
         self.ax_img.set_title("Closest Matching Image")
         self.ax_img.axis('off')
-    
+
     def plot_histogram(self):
-        """Plot the current histogram"""
+        """Plot the current histogram, every bar in the color of its bin"""
         self.ax_hist.clear()
-        x = np.arange(self.bins)
-        width = 0.25
-        
-        # Store the bar containers for later interaction
-        self.bars = {}
-        self.bars['hue'] = self.ax_hist.bar(x - width, self.current_hist['hue'], width, color='red', label='Hue')
-        self.bars['saturation'] = self.ax_hist.bar(x, self.current_hist['saturation'], width, color='green', label='Saturation')
-        self.bars['value'] = self.ax_hist.bar(x + width, self.current_hist['value'], width, color='blue', label='Value')
-        
+        x = np.arange(len(self.current_hist))
+        self.bars = self.ax_hist.bar(x, self.current_hist, width=1.0, color=self.colors)
+
         self.ax_hist.set_title("Click Bars to Modify Histogram")
-        self.ax_hist.set_xlabel("Bin")
+        self.ax_hist.set_xlabel(f"Color bin ({BINS}x{BINS}x{BINS} BGR)")
         self.ax_hist.set_ylabel("Normalized Frequency")
-        self.ax_hist.legend()
         self.ax_hist.grid(True, alpha=0.3)
-    
+
     def randomize(self, event):
         """Load a random image and its histogram"""
-        self.current_data = random.choice(hist_data)
+        self.current_data = image_data(random.choice(index.keys))
         self.current_hist = self.current_data['hist'].copy()
         self.show_image(self.current_data['path'])
         self.plot_histogram()
         self.fig.canvas.draw_idle()
-    
+
     def on_click(self, event):
         """Handle clicks on histogram bars"""
-        if event.inaxes != self.ax_hist:
+        if event.inaxes != self.ax_hist or event.xdata is None:
             return
-        
-        # Determine which bar was clicked
-        for channel in ['hue', 'saturation', 'value']:
-            for i, bar in enumerate(self.bars[channel]):
-                if bar.contains(event)[0]:
-                    # Get y position of click relative to bar
-                    new_value = event.ydata
-                    if new_value < 0:
-                        new_value = 0
-                    elif new_value > 1:
-                        new_value = 1
-                    
-                    # Update the current histogram
-                    self.current_hist[channel][i] = new_value
-                    
-                    # Normalize the modified channel
-                    self.current_hist[channel] = cv2.normalize(
-                        self.current_hist[channel], 
-                        None
-                    ).flatten()
-                    
-                    # Find closest match
-                    closest = find_closest_histogram(self.current_hist)
-                    
-                    # Update display
-                    self.show_image(closest['path'])
-                    
-                    # Update current data and redraw
-                    self.current_data = closest
-                    self.current_hist = closest['hist'].copy()
-                    self.plot_histogram()
-                    self.fig.canvas.draw_idle()
-                    return
+
+        # Bars sit at integer x positions
+        i = int(round(event.xdata))
+        if not 0 <= i < len(self.current_hist):
+            return
+
+        # Update the current histogram and keep it normalized to sum 1 like the stored ones
+        self.current_hist[i] = min(max(event.ydata, 0), 1)
+        total = self.current_hist.sum()
+        if total > 0:
+            self.current_hist /= total
+
+        # Find closest match
+        closest = find_closest_histogram(self.current_hist, exclude=[self.current_data['key']])
+
+        # Update display
+        self.show_image(closest['path'])
+
+        # Update current data and redraw
+        self.current_data = closest
+        self.current_hist = closest['hist'].copy()
+        self.plot_histogram()
+        self.fig.canvas.draw_idle()
 
 # Create and show the interactive histogram
-InteractiveHistogram()
\ No newline at end of file
+InteractiveHistogram()
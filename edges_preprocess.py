@@ -105,14 +105,8 @@ def quantize_and_downsample(Im, Iphi, n_downsample=2):
 
     return Im_norm, Iphi_norm
 
-def process_single_image(img_path, base_folder):
-    gray = imread_unicode(img_path)
-    if gray is None:
-        print(f"⚠️ Warning: could not read {img_path}")
-        return None, img_path
-
-    gray = resize_if_needed(gray)
-
+def compute_edge_data(gray):
+    """Quantized edge maps of a grayscale image already limited to RESIZE_MAX_PIXELS"""
     Im, Iphi = gradient_magnitude(gray)
     nms = non_maxima_suppression_vectorized(Im, Iphi)
     hyst = hysteresis_threshold(nms, THRESH_LOW, THRESH_HIGH)
@@ -121,26 +115,31 @@ def process_single_image(img_path, base_folder):
     nms_q = (nms[::2, ::2] / (nms.max() + 1e-8) * 255).clip(0, 255).astype(np.uint8)
     hyst_q = hyst[::2, ::2]
 
-    rel_path = os.path.relpath(img_path, base_folder)
-    key = rel_path.replace(os.sep, '_')
-
-    data = {
-        'path': img_path,
+    return {
         'gradient_magnitude': Im_q,
         'gradient_angle': Iphi_q,
         'nonmaxima': nms_q,
         'hysteresis': hyst_q
     }
+
+def process_single_image(img_path, base_folder):
+    gray = imread_unicode(img_path)
+    if gray is None:
+        print(f"⚠️ Warning: could not read {img_path}")
+        return None, img_path
+
+    gray = resize_if_needed(gray)
+
+    rel_path = os.path.relpath(img_path, base_folder)
+    key = rel_path.replace(os.sep, '_')
+
+    data = {'path': img_path, **compute_edge_data(gray)}
     return key, data
 
 def process_style_folder(style_folder_path, max_workers=NUM_WORKERS):
     style_name = os.path.basename(style_folder_path)
     output_file = os.path.join(OUTPUT_DIR, f"edge_data_{style_name}.pkl")
 
-    if os.path.exists(output_file):
-        print(f"Skipping '{style_name}', pickle exists at {output_file}")
-        return
-
     print(f"\nProcessing style folder: {style_folder_path}")
     image_paths = [os.path.join(style_folder_path, f) for f in os.listdir(style_folder_path)
                    if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
@@ -165,10 +164,11 @@ def process_style_folder(style_folder_path, max_workers=NUM_WORKERS):
     print(f"Done processing style '{style_name}'.")
 
 def main():
-    style_folders = [os.path.join(INPUT_FOLDER, d) for d in os.listdir(INPUT_FOLDER)
-                     if os.path.isdir(os.path.join(INPUT_FOLDER, d))]
-    for style_folder in style_folders:
-        process_style_folder(style_folder, NUM_WORKERS)
+    # Only new or changed images are recomputed and merged into their style's pickle;
+    # images deleted from INPUT_FOLDER are pruned. process_style_folder() rebuilds one style.
+    from feature_extraction import EdgeExtractor, find_images_recursive, run_extractors
+    image_files = find_images_recursive(INPUT_FOLDER)
+    run_extractors([EdgeExtractor()], image_files, INPUT_FOLDER, NUM_WORKERS)
 
 if __name__ == "__main__":
     main()
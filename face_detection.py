@@ -1,57 +1,48 @@
-import os
 import pickle
-from tqdm import tqdm
-from pathlib import Path
-from deepface import DeepFace
-import cv2
+import argparse
 
 # Config
 IMAGE_DIR = "./wikiart/"  # Your image folder
 PICKLE_PATH = "./pickles/emotion_cache.pkl"
 DETECTOR_BACKEND = "opencv"  # "mtcnn" for more accuracy (slower)
 
-def scan_images(image_dir):
-    """Find all images recursively"""
-    return [
-        os.path.join(root, f)
-        for root, _, files in os.walk(image_dir)
-        for f in files
-        if f.lower().endswith(('.png', '.jpg', '.jpeg'))
-    ]
+def analyze_face(img):
+    """Emotion analysis of one image (path or decoded BGR array), None if no face"""
+    from deepface import DeepFace  # TensorFlow import is slow, only pay it when analyzing
+    analysis = DeepFace.analyze(
+        img_path=img,
+        actions=["emotion"],
+        detector_backend=DETECTOR_BACKEND,
+        enforce_detection=False,  # Skip if no face
+        silent=True
+    )
+    if not analysis:
+        return None
+    return {
+        "emotion": analysis[0]["emotion"],
+        "dominant": analysis[0]["dominant_emotion"],
+        "face_region": analysis[0]["region"]
+    }
 
-def analyze_emotions(image_paths, cache_path):
-    """Batch-process images with cached results (ONLY saves faces)"""
-    if Path(cache_path).exists():
-        with open(cache_path, "rb") as f:
-            return pickle.load(f)
-    
-    results = {}
-    for img_path in tqdm(image_paths, desc="Processing Faces"):
-        try:
-            analysis = DeepFace.analyze(
-                img_path=img_path,
-                actions=["emotion"],
-                detector_backend=DETECTOR_BACKEND,
-                enforce_detection=False,  # Skip if no face
-                silent=True
-            )
-            if analysis:  # ONLY store if face detected <<<
-                results[img_path] = {
-                    "emotion": analysis[0]["emotion"],
-                    "dominant": analysis[0]["dominant_emotion"],
-                    "face_region": analysis[0]["region"]
-                }
-            # No 'else' clause = skip entirely <<<
-        except Exception as e:
-            print(f"⚠️ Error on {img_path}: {str(e)[:50]}...")
-    
-    with open(cache_path, "wb") as f:
-        pickle.dump(results, f)
-    return results
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Detect faces and their emotions in the wikiart collection')
+    parser.add_argument('--server', default=None, metavar='URL',
+                        help='Use the warm model of a running inference_server.py instead of loading DeepFace')
+    parser.add_argument('--batch-size', type=int, default=8,
+                        help='Images per request to the inference server')
+    return parser.parse_args()
 
 def main():
-    image_paths = scan_images(IMAGE_DIR)
-    emotion_data = analyze_emotions(image_paths, PICKLE_PATH)
+    args = parse_arguments()
+    # Process only new or changed images and merge them into the existing cache
+    # Same scan as the other extractors, so they all agree on the image set
+    from feature_extraction import EmotionExtractor, run_extractors, find_images_recursive
+    image_paths = find_images_recursive(IMAGE_DIR)
+    extractor = EmotionExtractor(server=args.server, batch_size=args.batch_size if args.server else 1)
+    extractor.output_file = PICKLE_PATH
+    run_extractors([extractor], image_paths, IMAGE_DIR)
+    with open(PICKLE_PATH, 'rb') as f:
+        emotion_data = pickle.load(f)
     
     # Stats
     total_faces = sum(1 for v in emotion_data.values() if v)
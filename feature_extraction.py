@@ -0,0 +1,845 @@
+import os
+import json
+import time
+import pickle
+import argparse
+import warnings
+from itertools import groupby
+from pathlib import Path
+from collections import deque
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from image_io import imread_unicode
+from image_manifest import ImageManifest, scan_signatures
+from feature_store import write_store_for_pickle
+from result_log import ResultLog
+
+# 🔇 Silence warnings (MediaPipe / TF / YOLO are chatty)
+warnings.filterwarnings("ignore")
+os.environ["YOLO_VERBOSE"] = "False"
+
+# Constants
+FOLDER_PATH = './wikiart/'
+PICKLE_DIR = "pickles"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+NUM_WORKERS = 1
+DECODE_THREADS = 4  # threads decoding upcoming images while the current one is processed
+
+os.makedirs(PICKLE_DIR, exist_ok=True)
+
+
+def find_images_recursive(root_folder):
+    """Recursively find all image files in directory, grouped by style folder"""
+    return sorted(os.path.join(dirpath, filename)
+                  for dirpath, _, filenames in os.walk(root_folder)
+                  for filename in filenames
+                  if filename.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def style_of(rel_path):
+    """Top-level style folder of a path relative to FOLDER_PATH"""
+    return Path(rel_path).parts[0]
+
+
+class Frame:
+    """One decoded painting plus lazily derived buffers shared by all extractors.
+
+    Every derived view (gray, RGB, HSV, size-limited copies) is computed at most
+    once per image, no matter how many extractors ask for it.
+    """
+
+    def __init__(self, img_path, rel_path, bgr):
+        self.img_path = img_path
+        self.rel_path = rel_path
+        self.bgr = bgr
+        self._derived = {}
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+    def _derive(self, key, compute):
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    @property
+    def gray(self):
+        return self._derive('gray', lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def rgb(self):
+        return self._derive('rgb', lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB))
+
+    @property
+    def hsv(self):
+        return self._derive('hsv', lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV))
+
+    def limited(self, max_pixels):
+        """BGR image downscaled (INTER_AREA) so that h * w <= max_pixels"""
+        def compute():
+            h, w = self.bgr.shape[:2]
+            if h * w <= max_pixels:
+                return self.bgr
+            scale = np.sqrt(max_pixels / (h * w))
+            return cv2.resize(self.bgr, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self._derive(('limited', max_pixels), compute)
+
+    def limited_gray(self, max_pixels):
+        """Grayscale version of limited(max_pixels)"""
+        def compute():
+            small = self.limited(max_pixels)
+            if small is self.bgr:
+                return self.gray
+            return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return self._derive(('limited_gray', max_pixels), compute)
+
+
+class Extractor:
+    """Base class for a feature computed from a decoded Frame.
+
+    plan()    - load the existing store and manifest, work out which images are
+                new/changed (stale) and which were deleted (pruned right away)
+    setup()   - load models; called once in the process that runs process(),
+                i.e. once per pool worker when running in parallel
+    process() - compute the feature for one frame, return None to skip it
+    process_batch() - same for a list of frames; extractors with batch_size > 1
+                are handed batches when running in a single process
+    add()     - merge one result into the in-memory store
+    finish_style() - called after every image of a style folder is done
+    save()    - write the store and its manifest to disk
+
+    Extractors with checkpoint = True (the slow, model-backed ones) instead stream
+    every finished image to a ResultLog next to their store and keep only keys in
+    memory; save() merges the log into the store on disk. A run that is killed
+    halfway resumes from the log instead of starting over.
+    """
+    name = None
+    output_file = None
+    checkpoint = False
+    batch_size = 1
+
+    def __init__(self, force_recompute=False, use_hash=False):
+        self.force_recompute = force_recompute
+        self.use_hash = use_hash
+        # Constructor arguments, used to build a fresh copy inside each pool worker
+        self.config = {'force_recompute': force_recompute, 'use_hash': use_hash}
+        self.results = {}
+        # Checkpointed extractors only: keys of the store on disk, and the ones to drop from it on save
+        self.stored_keys, self.dropped = set(), set()
+        self.stale, self.removed = set(), set()
+        self.log = None
+
+    @property
+    def manifest_name(self):
+        return self.name
+
+    def store_key(self, rel_path, img_path):
+        return rel_path
+
+    def has_store(self):
+        return Path(self.output_file).exists()
+
+    def read_store(self):
+        if not self.has_store():
+            return {}
+        with open(self.output_file, 'rb') as f:
+            return pickle.load(f)
+
+    def load(self):
+        """Read the existing store so new results are merged into it"""
+        if self.checkpoint:
+            # save() reads the store again; until then only its keys are needed
+            self.stored_keys = set(self.read_store())
+        else:
+            self.results = self.read_store()
+
+    def in_store(self, rel_path, img_path):
+        """Whether the store already holds this image (used for stores older than their manifest)"""
+        return self.store_key(rel_path, img_path) in (self.stored_keys if self.checkpoint else self.results)
+
+    def remove(self, rel_path, img_path):
+        if self.checkpoint:
+            self.dropped.add(self.store_key(rel_path, img_path))
+        else:
+            self.results.pop(self.store_key(rel_path, img_path), None)
+
+    def plan(self, current, folder_path):
+        """Decide what to recompute from the current scan ({rel_path: (img_path, signature)})"""
+        self.current = current
+        self.manifest = ImageManifest(self.manifest_name, self.use_hash)
+        if self.force_recompute:
+            self.stale, self.removed = set(current), set()
+            if self.checkpoint:
+                self.resume()
+            return
+
+        self.load()
+        self.manifest.load()
+        if not self.manifest.exists() and self.has_store():
+            # Store written before manifests existed: trust the images it already holds
+            for rel_path, (img_path, signature) in current.items():
+                if self.in_store(rel_path, img_path):
+                    self.manifest.mark(rel_path, img_path, signature)
+
+        self.stale, self.removed = self.manifest.diff(current)
+        for rel_path in self.removed:
+            self.remove(rel_path, os.path.join(folder_path, rel_path))
+            self.manifest.forget(rel_path)
+        # Changed images drop their old entry; it comes back only if the new version yields a result
+        for rel_path in self.stale:
+            self.remove(rel_path, current[rel_path][0])
+        if self.checkpoint:
+            self.resume()
+
+    @property
+    def log_file(self):
+        return os.path.splitext(self.output_file)[0] + ".log"
+
+    def resume(self):
+        """Replay results an interrupted run already logged for the current image versions"""
+        self.log = ResultLog(self.log_file)
+        for rel_path, (signature, result) in self.log.items():
+            if rel_path not in self.stale or list(self.current[rel_path][1]) != signature:
+                continue
+            img_path = self.current[rel_path][0]
+            if result is not None:
+                self.add(rel_path, img_path, result)
+            self.manifest.mark(rel_path, img_path, self.current[rel_path][1])
+            self.stale.discard(rel_path)
+
+    def has_work(self):
+        return bool(self.stale or self.removed)
+
+    def setup(self):
+        pass
+
+    def needs(self, rel_path):
+        return rel_path in self.stale
+
+    def process(self, frame):
+        raise NotImplementedError
+
+    def process_batch(self, frames):
+        return [self.process(frame) for frame in frames]
+
+    def entry(self, img_path, result):
+        """Store record of one result"""
+        return result
+
+    def add(self, rel_path, img_path, result):
+        if self.checkpoint:
+            return  # already in the log (mark_done), merged into the store by save()
+        self.results[self.store_key(rel_path, img_path)] = self.entry(img_path, result)
+
+    def mark_done(self, rel_path, result=None):
+        """Record that the current version of this image is reflected in the store"""
+        img_path, signature = self.current[rel_path]
+        self.manifest.mark(rel_path, img_path, signature)
+        if self.log is not None:
+            self.log.append(rel_path, (list(signature), result))
+
+    def finish_style(self, style):
+        pass
+
+    def final_results(self):
+        """The complete store to write: for checkpointed extractors, the store on disk
+        without removed/changed images plus every result of this run, read back from the log"""
+        if not self.checkpoint:
+            return self.results
+        results = {} if self.force_recompute else self.read_store()
+        for key in self.dropped:
+            results.pop(key, None)
+        for rel_path, (signature, result) in self.log.items():
+            if result is None or rel_path not in self.current or list(self.current[rel_path][1]) != signature:
+                continue
+            img_path = self.current[rel_path][0]
+            results[self.store_key(rel_path, img_path)] = self.entry(img_path, result)
+        return results
+
+    def save(self):
+        results = self.final_results()
+        with open(self.output_file, 'wb') as f:
+            pickle.dump(results, f)
+        print(f"✅ Saved {len(results)} {self.name} results to {self.output_file}")
+        write_store_for_pickle(self.output_file, results)
+        self.manifest.save()
+        self.drop_log()
+
+    def drop_log(self):
+        """The store now holds everything the checkpoint log did"""
+        if self.log is not None:
+            self.log.remove()
+            self.log = None
+
+
+class MeanColorExtractor(Extractor):
+    name = 'mean'
+    output_file = os.path.join(PICKLE_DIR, "mean_colors.pkl")
+
+    def process(self, frame):
+        from color_detection import mean_color_from_image
+        mean_bgr, mean_hsv = mean_color_from_image(frame.bgr, frame.hsv)
+        return {'bgr': mean_bgr, 'hsv': mean_hsv, 'path': frame.img_path}
+
+
+class DominantColorExtractor(Extractor):
+    name = 'dominant'
+
+    def __init__(self, k=3, **kwargs):
+        super().__init__(**kwargs)
+        self.k = k
+        self.config['k'] = k
+        self.output_file = os.path.join(PICKLE_DIR, f"dominant_colors_k{k}.pkl")
+
+    @property
+    def manifest_name(self):
+        return f"dominant_k{self.k}"
+
+    def process(self, frame):
+        from color_detection import dominant_color_from_image
+        return {
+            'colors': dominant_color_from_image(frame.bgr, self.k),
+            'path': frame.img_path,
+            'mean_hsv': np.mean(frame.hsv.reshape(-1, 3), axis=0)
+        }
+
+
+class HistogramExtractor(Extractor):
+    name = 'histogram'
+    output_file = os.path.join(PICKLE_DIR, "color_histograms.pkl")
+
+    def __init__(self, bins=8, **kwargs):
+        super().__init__(**kwargs)
+        self.bins = bins
+        self.config['bins'] = bins
+
+    def process(self, frame):
+        from histogram_detection import bgr_histogram_from_image
+        return {
+            'histogram': bgr_histogram_from_image(frame.bgr, self.bins),
+            'img_shape': frame.shape,
+            'img_path': frame.img_path,
+            'bins': self.bins
+        }
+
+
+class ModelExtractor(Extractor):
+    """Extractor backed by a slow-loading model (MediaPipe, DeepFace, YOLO).
+
+    With server=URL the model is not loaded here; frames are sent by path, in
+    batches of batch_size, to inference_server.py, which keeps it warm.
+    """
+    server_model = None  # model name on the inference server
+
+    def __init__(self, server=None, batch_size=1, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server
+        self.batch_size = batch_size
+        self.config.update(server=server, batch_size=batch_size)
+
+    def setup(self):
+        if self.server:
+            from inference_client import InferenceClient
+            self.client = InferenceClient(self.server)
+        else:
+            self.load_model()
+
+    def load_model(self):
+        raise NotImplementedError
+
+    def infer(self, frames):
+        """Raw model output for every frame, computed in this process"""
+        raise NotImplementedError
+
+    def to_result(self, frame, output):
+        return output
+
+    def process(self, frame):
+        result = self.process_batch([frame])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def process_batch(self, frames):
+        """Results per frame; a frame the inference server failed on gets its exception"""
+        if self.server:
+            outputs = self.client.infer(self.server_model, [frame.img_path for frame in frames])
+        else:
+            outputs = self.infer(frames)
+        return [output if isinstance(output, Exception) else self.to_result(frame, output)
+                for frame, output in zip(frames, outputs)]
+
+
+class PoseExtractor(ModelExtractor):
+    name = 'pose'
+    server_model = 'pose'
+    output_file = os.path.join(PICKLE_DIR, "pose_results.pkl")
+    checkpoint = True
+
+    def load_model(self):
+        from pose_detection import create_pose_detector
+        self.pose = create_pose_detector()
+
+    def infer(self, frames):
+        from pose_detection import detect_pose_landmarks
+        return [detect_pose_landmarks(self.pose, frame.rgb) for frame in frames]
+
+    def to_result(self, frame, landmarks):
+        if not landmarks:
+            return None
+        return {'landmarks': landmarks, 'img_path': frame.img_path, 'img_shape': frame.shape}
+
+
+class EmotionExtractor(ModelExtractor):
+    name = 'emotion'
+    server_model = 'face'
+    output_file = os.path.join(PICKLE_DIR, "emotion_cache.pkl")
+    checkpoint = True
+
+    def store_key(self, rel_path, img_path):
+        # face_detection.py keys its cache by image path
+        return img_path
+
+    def load_model(self):
+        pass  # DeepFace builds and caches its models on the first analyze call
+
+    def infer(self, frames):
+        from face_detection import analyze_face
+        return [analyze_face(frame.bgr) for frame in frames]
+
+
+class ObjectExtractor(ModelExtractor):
+    name = 'objects'
+    server_model = 'objects'
+    output_file = os.path.join(PICKLE_DIR, "details_results.pkl")
+    ratio_file = os.path.join(PICKLE_DIR, "ratio_results.pkl")
+    checkpoint = True
+
+    def __init__(self, batch_size=8, **kwargs):
+        super().__init__(batch_size=batch_size, **kwargs)
+
+    def load_model(self):
+        from object_scale import load_model
+        self.model = load_model()
+
+    def infer(self, frames):
+        from object_scale import detect_objects_batch
+        return detect_objects_batch(self.model, [frame.bgr for frame in frames])
+
+    def to_result(self, frame, detections):
+        return {'detections': detections, 'img_shape': frame.shape}
+
+    def entry(self, img_path, result):
+        from object_scale import image_entry
+        return image_entry(img_path, result['img_shape'], result['detections'])
+
+    def save(self):
+        from object_scale import save_results, ratios_from_details
+        results = self.final_results()
+        # The ratio index is derived from the details, so pruning/merging only has to touch those
+        save_results(ratios_from_details(results), self.ratio_file)
+        save_results(results, self.output_file)
+        self.manifest.save()
+        self.drop_log()
+
+
+class StyleStoreExtractor(Extractor):
+    """Extractor whose store is one file per style folder (edges, Hough, minimal JSON)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.by_style = {}
+        self.removed_by_style = {}
+
+    def style_output(self, style):
+        raise NotImplementedError
+
+    def style_key(self, rel_path):
+        return os.path.relpath(rel_path, style_of(rel_path)).replace(os.sep, '_')
+
+    def has_store(self):
+        return True
+
+    def load(self):
+        # Style files are only read when that style actually changed
+        pass
+
+    def in_store(self, rel_path, img_path):
+        return os.path.exists(self.style_output(style_of(rel_path)))
+
+    def remove(self, rel_path, img_path):
+        self.removed_by_style.setdefault(style_of(rel_path), set()).add(self.style_key(rel_path))
+
+    def add(self, rel_path, img_path, result):
+        self.by_style.setdefault(style_of(rel_path), {})[self.style_key(rel_path)] = {'path': img_path, **result}
+
+    def finish_style(self, style):
+        # Flush each style as soon as it is done so the whole corpus never sits in memory
+        new_data = self.by_style.pop(style, {})
+        removed = self.removed_by_style.pop(style, set())
+        if not new_data and not removed:
+            return
+
+        data = {} if self.force_recompute else self.read_style(style)
+        for key in removed:
+            data.pop(key, None)
+        data.update(new_data)
+        self.write_style(style, data)
+        self.manifest.save()
+
+    def read_style(self, style):
+        output_file = self.style_output(style)
+        if not os.path.exists(output_file):
+            return {}
+        with open(output_file, 'rb') as f:
+            return pickle.load(f)
+
+    def write_style(self, style, data):
+        output_file = self.style_output(style)
+        if not data:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            return
+        with open(output_file, 'wb') as f:
+            pickle.dump(data, f)
+        print(f"✅ Saved {len(data)} {self.name} results for '{style}' to {output_file}")
+
+    def save(self):
+        for style in set(self.by_style) | set(self.removed_by_style):
+            self.finish_style(style)
+        self.manifest.save()
+
+
+class EdgeExtractor(StyleStoreExtractor):
+    name = 'edges'
+
+    def style_output(self, style):
+        from edges_preprocess import OUTPUT_DIR
+        return os.path.join(OUTPUT_DIR, f"edge_data_{style}.pkl")
+
+    def process(self, frame):
+        from edges_preprocess import compute_edge_data, RESIZE_MAX_PIXELS
+        return compute_edge_data(frame.limited_gray(RESIZE_MAX_PIXELS))
+
+
+class HoughExtractor(StyleStoreExtractor):
+    name = 'hough'
+
+    def style_output(self, style):
+        from hough_transform_preprocess import OUTPUT_DIR
+        return os.path.join(OUTPUT_DIR, f"hough_data_{style}.pkl")
+
+    def process(self, frame):
+        from hough_transform_preprocess import compute_hough_data, MAX_PIXELS
+        return compute_hough_data(frame.limited_gray(MAX_PIXELS))
+
+
+class MinimalEdgesExtractor(StyleStoreExtractor):
+    name = 'minimal_edges'
+
+    def style_parts(self, style):
+        from vse import JSON_OUTPUT_DIR
+        prefix = f"{style}_part"
+        return sorted(os.path.join(JSON_OUTPUT_DIR, f) for f in os.listdir(JSON_OUTPUT_DIR)
+                      if f.startswith(prefix) and f.endswith('.json') and f[len(prefix):-5].isdigit())
+
+    def style_output(self, style):
+        from vse import JSON_OUTPUT_DIR
+        return os.path.join(JSON_OUTPUT_DIR, f"{style}_part1.json")
+
+    def process(self, frame):
+        from vse import compute_minimal_edges
+        return compute_minimal_edges(frame.gray)
+
+    def read_style(self, style):
+        data = {}
+        for part in self.style_parts(style):
+            with open(part, 'r', encoding='utf-8') as f:
+                data.update(json.load(f))
+        return data
+
+    def write_style(self, style, data):
+        from vse import JSON_OUTPUT_DIR, save_json_chunks
+        # The number of parts can shrink, so old parts must not linger
+        for part in self.style_parts(style):
+            os.remove(part)
+        if data:
+            save_json_chunks(data, os.path.join(JSON_OUTPUT_DIR, style))
+
+
+EXTRACTORS = {
+    cls.name: cls for cls in (
+        MeanColorExtractor, DominantColorExtractor, HistogramExtractor, PoseExtractor,
+        EmotionExtractor, ObjectExtractor, EdgeExtractor, HoughExtractor, MinimalEdgesExtractor
+    )
+}
+
+
+def prefetch(executor, fn, items, window):
+    """Like executor.map(fn, items) but never more than `window` calls ahead of the consumer"""
+    pending = deque()
+    items = iter(items)
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            break
+    while pending:
+        item, future = pending.popleft()
+        for next_item in items:
+            pending.append((next_item, executor.submit(fn, next_item)))
+            break
+        yield item, future.result()
+
+
+def group_by_style(image_files, folder_path):
+    """Yield (style, [(img_path, rel_path), ...]) for each style folder"""
+    rel_paths = sorted(((img_path, os.path.relpath(img_path, folder_path)) for img_path in image_files),
+                       key=lambda item: style_of(item[1]))
+    for style, group in groupby(rel_paths, key=lambda item: style_of(item[1])):
+        yield style, list(group)
+
+
+def _run_batch(ext, frames):
+    """Process buffered frames with one process_batch call and merge the results"""
+    try:
+        results = ext.process_batch(frames)
+    except Exception as e:
+        print(f"\n⚠️ {ext.name} error in batch starting at {frames[0].img_path}: {str(e)[:50]}...")
+        return
+    for frame, result in zip(frames, results):
+        if isinstance(result, Exception):
+            # Not marked done: the next run tries this image again
+            print(f"\n⚠️ {ext.name} error in {frame.img_path}: {str(result)[:50]}...")
+            continue
+        if result is not None:
+            ext.add(frame.rel_path, frame.img_path, result)
+        ext.mark_done(frame.rel_path, result)
+
+
+def _run_serial(extractors, groups, progress):
+    for ext in extractors:
+        ext.setup()
+    # Frames waiting for a full batch, per batching extractor
+    pending = {ext.name: [] for ext in extractors if ext.batch_size > 1}
+    window = 2 * max(DECODE_THREADS, *(ext.batch_size for ext in extractors))
+
+    with ThreadPoolExecutor(max_workers=DECODE_THREADS) as decoders:
+        for style, paths in groups:
+            for (img_path, rel_path), bgr in prefetch(decoders, lambda item: imread_unicode(item[0]), paths, window):
+                progress.update()
+                wanted = [ext for ext in extractors if ext.needs(rel_path)]
+
+                if bgr is None:
+                    print(f"\n⚠️ Warning: could not read {img_path}")
+                    continue
+
+                frame = Frame(img_path, rel_path, bgr)
+                for ext in wanted:
+                    if ext.name in pending:
+                        pending[ext.name].append(frame)
+                        if len(pending[ext.name]) >= ext.batch_size:
+                            _run_batch(ext, pending[ext.name])
+                            pending[ext.name] = []
+                        continue
+                    try:
+                        result = ext.process(frame)
+                        if result is not None:
+                            ext.add(rel_path, img_path, result)
+                        ext.mark_done(rel_path, result)
+                    except Exception as e:
+                        print(f"\n⚠️ {ext.name} error in {img_path}: {str(e)[:50]}...")
+
+            # Partial batches are flushed before the style is finished
+            for ext in extractors:
+                if pending.get(ext.name):
+                    _run_batch(ext, pending[ext.name])
+                    pending[ext.name] = []
+                ext.finish_style(style)
+
+
+# Extractors living in a pool worker process, built once by _init_worker
+_worker_extractors = {}
+
+
+def _init_worker(specs):
+    """Pool initializer: build and set up every extractor (and its model) once per worker"""
+    warnings.filterwarnings("ignore")
+    # One OpenCV thread per worker; the pool itself provides the parallelism
+    cv2.setNumThreads(1)
+    for cls, config in specs:
+        ext = cls(**config)
+        ext.setup()
+        _worker_extractors[ext.name] = ext
+
+
+def _process_shared(shm_name, shape, img_path, rel_path, names):
+    """Pool task: view the decoded frame in shared memory and run the requested extractors"""
+    results, errors = {}, {}
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frame = Frame(img_path, rel_path, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+        for name in names:
+            try:
+                result = _worker_extractors[name].process(frame)
+                if result is not None:
+                    results[name] = result
+            except Exception as e:
+                errors[name] = str(e)[:50]
+        # Every view into the shared buffer has to be gone before close()
+        del frame
+    finally:
+        shm.close()
+    return results, errors
+
+
+def _decode_to_shared(img_path):
+    """Decode one image (cv2 releases the GIL) and copy it into a new shared memory block"""
+    bgr = imread_unicode(img_path)
+    if bgr is None:
+        return None
+    shm = shared_memory.SharedMemory(create=True, size=max(1, bgr.nbytes))
+    np.ndarray(bgr.shape, dtype=np.uint8, buffer=shm.buf)[...] = bgr
+    return shm, bgr.shape
+
+
+def _run_pool(extractors, groups, progress, workers):
+    by_name = {ext.name: ext for ext in extractors}
+    specs = [(type(ext), ext.config) for ext in extractors]
+    max_in_flight = workers * 2
+
+    def collect(done):
+        for future in done:
+            shm, img_path, rel_path, names = in_flight.pop(future)
+            shm.close()
+            shm.unlink()
+            progress.update()
+            try:
+                results, errors = future.result()
+            except Exception as e:
+                print(f"\n⚠️ Worker error in {img_path}: {str(e)[:50]}...")
+                continue
+            for name, result in results.items():
+                by_name[name].add(rel_path, img_path, result)
+            for name, error in errors.items():
+                print(f"\n⚠️ {name} error in {img_path}: {error}...")
+            for name in names:
+                if name not in errors:
+                    by_name[name].mark_done(rel_path, results.get(name))
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as decoders, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,),
+                                mp_context=multiprocessing.get_context('spawn')) as pool:
+        for style, paths in groups:
+            todo = [(img_path, rel_path, [ext.name for ext in extractors if ext.needs(rel_path)])
+                    for img_path, rel_path in paths]
+
+            decoded_frames = prefetch(decoders, lambda item: _decode_to_shared(item[0]), todo, max_in_flight)
+            for (img_path, rel_path, names), decoded in decoded_frames:
+                if decoded is None:
+                    print(f"\n⚠️ Warning: could not read {img_path}")
+                    progress.update()
+                    continue
+                while len(in_flight) >= max_in_flight:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                shm, shape = decoded
+                future = pool.submit(_process_shared, shm.name, shape, img_path, rel_path, names)
+                in_flight[future] = (shm, img_path, rel_path, names)
+
+            # A style is only complete once all of its frames came back
+            collect(wait(in_flight).done)
+            for ext in extractors:
+                ext.finish_style(style)
+
+
+def run_extractors(extractors, image_files, folder_path=FOLDER_PATH, workers=NUM_WORKERS):
+    """Decode every image once and fan the frame out to all extractors that need it.
+
+    With workers > 1, images are decoded by a thread pool into shared memory and
+    processed by a pool of worker processes, each holding its own extractor models.
+    Without workers, upcoming images are decoded by DECODE_THREADS threads and
+    extractors with batch_size > 1 get their frames in batches.
+    Only images that are new or changed since the last run (per each store's
+    manifest) are decoded; results of deleted images are pruned from the stores.
+    """
+    current = scan_signatures(image_files, folder_path)
+    for ext in extractors:
+        ext.plan(current, folder_path)
+        print(f"🔍 {ext.name}: {len(ext.stale)} new/changed, {len(ext.removed)} removed")
+
+    extractors = [ext for ext in extractors if ext.has_work()]
+    if not extractors:
+        print("🔍 All selected feature stores are up to date")
+        return []
+
+    todo = [img_path for img_path in image_files
+            if any(ext.needs(os.path.relpath(img_path, folder_path)) for ext in extractors)]
+    groups = group_by_style(todo, folder_path)
+    start = time.perf_counter()
+    with tqdm(total=len(todo), desc="Extracting features", unit="img") as progress:
+        if workers > 1:
+            _run_pool(extractors, groups, progress, workers)
+        else:
+            _run_serial(extractors, groups, progress)
+    seconds = time.perf_counter() - start
+    print(f"⚡ {len(todo)} images in {seconds:.1f}s: {len(todo) / max(seconds, 1e-9):.2f} img/s")
+
+    for ext in extractors:
+        ext.save()
+    return extractors
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Single-pass feature extraction for the wikiart collection')
+    parser.add_argument('--features', nargs='+', choices=sorted(EXTRACTORS), default=['mean', 'histogram'],
+                        help='Feature stores to compute in this pass')
+    parser.add_argument('--folder', default=FOLDER_PATH,
+                        help='Root image folder')
+    parser.add_argument('--dominant-colors', type=int, default=3,
+                        help='Number of dominant colors to extract (dominant feature)')
+    parser.add_argument('--force-recompute', action='store_true',
+                        help='Recompute every image, ignoring the existing stores')
+    parser.add_argument('--hash', action='store_true',
+                        help='Also compare content hashes, so touched but unchanged files are not recomputed')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                        help='Worker processes (1 = run everything in this process)')
+    parser.add_argument('--batch-size', type=int, default=8,
+                        help='Images per YOLO call (objects feature, single process only); '
+                             'with --server also images per request for pose and emotion')
+    parser.add_argument('--server', default=None, metavar='URL',
+                        help='Run pose/emotion/objects on a running inference_server.py, '
+                             'e.g. http://127.0.0.1:5055')
+    return parser.parse_args()
+
+
+def build_extractors(args):
+    extractors = []
+    for name in args.features:
+        kwargs = {'force_recompute': args.force_recompute, 'use_hash': args.hash}
+        if name == 'dominant':
+            kwargs['k'] = args.dominant_colors
+        if issubclass(EXTRACTORS[name], ModelExtractor):
+            kwargs['server'] = args.server
+            if name == 'objects' or args.server:
+                kwargs['batch_size'] = args.batch_size
+        extractors.append(EXTRACTORS[name](**kwargs))
+    return extractors
+
+
+def main():
+    args = parse_arguments()
+    image_files = find_images_recursive(args.folder)
+    print(f"Found {len(image_files)} images")
+    run_extractors(build_extractors(args), image_files, args.folder, args.workers)
+    print("\n📊 Extraction Complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import json
+import shutil
+import pickle
+import argparse
+
+import numpy as np
+
+# Column layout of a store directory:
+#   meta.json       - row count, column dtypes/shapes and free-form attrs
+#   keys.npy        - sorted utf-8 keys (fixed-width bytes), row i belongs to keys[i]
+#   <column>.npy    - one fixed-dtype matrix per feature, first axis = row
+# Ragged per-row lists (e.g. object detections) are stored as flat columns plus an
+# '<name>_offsets' column of N + 1 row boundaries.
+
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+LANDMARK_FIELDS = ['x', 'y', 'z', 'visibility']
+NUM_LANDMARKS = 33
+
+
+def store_dir_for(pickle_file):
+    """pickles/color_histograms.pkl -> pickles/color_histograms_store"""
+    return os.path.splitext(pickle_file)[0] + "_store"
+
+
+def _encode(strings):
+    return np.array([s.encode('utf-8') for s in strings], dtype=bytes)
+
+
+def write_store(store_dir, keys, columns, attrs=None):
+    """Write a columnar store; rows are sorted by key so lookups need no index in memory"""
+    keys = _encode(keys)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    if len(keys) > 1 and np.any(keys[1:] == keys[:-1]):
+        raise ValueError("Duplicate keys in feature store")
+
+    tmp_dir = store_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    meta = {'count': len(keys), 'columns': {}, 'attrs': attrs or {}}
+    np.save(os.path.join(tmp_dir, "keys.npy"), keys)
+    for name, values in columns.items():
+        if name.endswith('_offsets') or name.startswith('flat_'):
+            # Ragged data is written as-is, offsets are remapped below
+            continue
+        values = np.asarray(values)
+        if len(values) != len(order):
+            raise ValueError(f"Column '{name}' has {len(values)} rows, expected {len(order)}")
+        values = values[order]
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+        meta['columns'][name] = {'dtype': values.dtype.str, 'shape': list(values.shape)}
+
+    for name in [n[:-len('_offsets')] for n in columns if n.endswith('_offsets')]:
+        _write_ragged(tmp_dir, meta, name, columns, order)
+
+    with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1)
+
+    # Swap directories; readers holding the old memmaps keep working (POSIX)
+    old_dir = store_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"✅ Saved columnar store ({len(keys)} rows, {len(meta['columns'])} columns) to {store_dir}")
+
+
+def _write_ragged(tmp_dir, meta, name, columns, order):
+    """Reorder ragged rows (offsets + flat_<name>_* columns) to the sorted key order"""
+    offsets = np.asarray(columns[f"{name}_offsets"], dtype=np.int64)
+    flat_names = [n for n in columns if n.startswith(f"flat_{name}_")]
+    lengths = np.diff(offsets)[order]
+    new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    take = (np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in order])
+            if len(order) else np.zeros(0, dtype=np.int64)).astype(np.int64)
+
+    np.save(os.path.join(tmp_dir, f"{name}_offsets.npy"), new_offsets)
+    meta['columns'][f"{name}_offsets"] = {'dtype': new_offsets.dtype.str, 'shape': list(new_offsets.shape)}
+    for flat_name in flat_names:
+        values = np.asarray(columns[flat_name])[take]
+        np.save(os.path.join(tmp_dir, f"{flat_name}.npy"), values)
+        meta['columns'][flat_name] = {'dtype': values.dtype.str, 'shape': list(values.shape)}
+
+
+class FeatureStore:
+    """Read-only view of a columnar store; every column is an np.memmap paged in on access.
+
+    Opening only reads meta.json and maps keys.npy, so it costs milliseconds no
+    matter how many rows the store holds.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.count = meta['count']
+        self.attrs = meta['attrs']
+        self.column_names = list(meta['columns'])
+        self.keys = np.load(os.path.join(store_dir, "keys.npy"), mmap_mode='r')
+        self._columns = {}
+
+    @classmethod
+    def exists(cls, store_dir):
+        return os.path.exists(os.path.join(store_dir, "meta.json"))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.row(key) is not None
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.store_dir, f"{name}.npy"), mmap_mode='r')
+        return self._columns[name]
+
+    def key(self, row):
+        return self.keys[row].decode('utf-8')
+
+    def iter_keys(self):
+        for raw in self.keys:
+            yield raw.decode('utf-8')
+
+    def row(self, key):
+        """Row index of key (binary search over the sorted key table), or None"""
+        raw = key.encode('utf-8')
+        if len(raw) > self.keys.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.keys, raw))
+        if i < self.count and self.keys[i] == raw:
+            return i
+        return None
+
+    def text(self, name, row):
+        """Decoded value of a string column"""
+        return self.column(name)[row].decode('utf-8')
+
+    def get(self, key, name):
+        i = self.row(key)
+        return None if i is None else self.column(name)[i]
+
+    def ragged(self, name, row):
+        """{flat column suffix: values} of one row of a ragged column"""
+        offsets = self.column(f"{name}_offsets")
+        start, end = offsets[row], offsets[row + 1]
+        prefix = f"flat_{name}_"
+        return {n[len(prefix):]: self.column(n)[start:end]
+                for n in self.column_names if n.startswith(prefix)}
+
+
+# ---------------- Converters from the pickled dict-of-dicts stores ----------------
+
+def _string_column(values):
+    return _encode([str(v).replace('\\', '/') for v in values])
+
+
+def histogram_columns(histograms):
+    keys = list(histograms)
+    first = next(iter(histograms.values()), {'bins': 8})
+    dim = first['bins'] ** 3
+    return keys, {
+        'histogram': np.array([histograms[k]['histogram'] for k in keys], dtype=np.float32).reshape(-1, dim),
+        'img_shape': np.array([histograms[k]['img_shape'] for k in keys], dtype=np.int32).reshape(-1, 3),
+        'img_path': _string_column(histograms[k]['img_path'] for k in keys),
+    }, {'bins': first['bins']}
+
+
+def mean_color_columns(mean_colors):
+    keys = list(mean_colors)
+    return keys, {
+        'bgr': np.array([mean_colors[k]['bgr'] for k in keys], dtype=np.float32).reshape(-1, 3),
+        'hsv': np.array([mean_colors[k]['hsv'] for k in keys], dtype=np.float32).reshape(-1, 3),
+        'path': _string_column(mean_colors[k]['path'] for k in keys),
+    }, {}
+
+
+def landmarks_array(landmarks):
+    """List of landmark dicts -> (33, 4) float32 [x, y, z, visibility]"""
+    return np.array([[lm[f] for f in LANDMARK_FIELDS] for lm in landmarks], dtype=np.float32)
+
+
+def pose_columns(pose_results):
+    keys = [k for k, v in pose_results.items() if v.get('landmarks')]
+    landmarks = np.zeros((len(keys), NUM_LANDMARKS, len(LANDMARK_FIELDS)), dtype=np.float32)
+    for i, k in enumerate(keys):
+        landmarks[i] = landmarks_array(pose_results[k]['landmarks'])
+    return keys, {
+        'landmarks': landmarks,
+        'img_shape': np.array([pose_results[k]['img_shape'] for k in keys], dtype=np.int32).reshape(-1, 3),
+        'img_path': _string_column(pose_results[k]['img_path'] for k in keys),
+    }, {'landmark_fields': LANDMARK_FIELDS}
+
+
+def emotion_columns(emotion_cache):
+    keys = [k for k, v in emotion_cache.items() if v]
+    emotion = np.array([[emotion_cache[k]['emotion'].get(e, 0.0) for e in EMOTIONS] for k in keys],
+                       dtype=np.float32).reshape(-1, len(EMOTIONS))
+    region = np.array([[emotion_cache[k]['face_region'].get(f, 0) for f in ('x', 'y', 'w', 'h')] for k in keys],
+                      dtype=np.int32).reshape(-1, 4)
+    return keys, {
+        'emotion': emotion,
+        'dominant': np.array([EMOTIONS.index(emotion_cache[k]['dominant']) for k in keys], dtype=np.int8),
+        'face_region': region,
+    }, {'emotions': EMOTIONS}
+
+
+def details_columns(image_details):
+    keys = list(image_details)
+    detections = [image_details[k]['detections'] for k in keys]
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(d) for d in detections], out=offsets[1:])
+    flat = [det for dets in detections for det in dets]
+    class_names = {}
+    for det in flat:
+        class_names[det['class_id']] = det['class_name']
+    return keys, {
+        'img_shape': np.array([image_details[k]['img_shape'] for k in keys], dtype=np.int32).reshape(-1, 3),
+        'img_path': _string_column(image_details[k]['img_path'] for k in keys),
+        'detections_offsets': offsets,
+        'flat_detections_class_id': np.array([d['class_id'] for d in flat], dtype=np.int16),
+        'flat_detections_confidence': np.array([d['confidence'] for d in flat], dtype=np.float32),
+        'flat_detections_box': np.array([d['box_coords'] for d in flat], dtype=np.int32).reshape(-1, 4),
+        'flat_detections_ratio': np.array([d['ratio'] for d in flat], dtype=np.int16),
+        'flat_detections_normalized_ratio': np.array([d['normalized_ratio'] for d in flat], dtype=np.float32),
+    }, {'class_names': {str(k): v for k, v in sorted(class_names.items())}}
+
+
+def hough_meta_columns(meta):
+    # A key listed twice (same name in two part files) keeps its last Annoy item
+    items = {key: i for i, key in enumerate(meta['keys'])}
+    keys = list(items)
+    return keys, {
+        'item': np.array([items[k] for k in keys], dtype=np.int32),
+        'path': _string_column(meta['metadata'][k]['path'] for k in keys),
+        'file': _string_column(meta['metadata'][k]['file'] for k in keys),
+    }, {'dim': meta['dim'], 'probe': meta.get('probe')}
+
+
+CONVERTERS = {
+    'color_histograms': histogram_columns,
+    'mean_colors': mean_color_columns,
+    'pose_results': pose_columns,
+    'emotion_cache': emotion_columns,
+    'details_results': details_columns,
+    'hough_meta': hough_meta_columns,
+}
+
+
+def converter_for(pickle_file):
+    name = os.path.splitext(os.path.basename(pickle_file))[0]
+    for prefix, converter in CONVERTERS.items():
+        if name.startswith(prefix):
+            return converter
+    return None
+
+
+def write_store_for_pickle(pickle_file, data):
+    """Write the columnar twin of a pickled store next to it (no-op for unknown stores)"""
+    converter = converter_for(pickle_file)
+    if converter is None:
+        return None
+    keys, columns, attrs = converter(data)
+    store_dir = store_dir_for(pickle_file)
+    write_store(store_dir, keys, columns, attrs)
+    return store_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pickled feature stores to columnar, memory-mappable stores')
+    parser.add_argument('pickles', nargs='+', help='Pickle files, e.g. pickles/color_histograms.pkl')
+    args = parser.parse_args()
+
+    for pickle_file in args.pickles:
+        if converter_for(pickle_file) is None:
+            print(f"⚠️ No columnar layout known for {pickle_file}, skipping")
+            continue
+        with open(pickle_file, 'rb') as f:
+            data = pickle.load(f)
+        write_store_for_pickle(pickle_file, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,157 @@
 # chunked_json_converter.py
+import re
 import json
+import hashlib
 import pickle
+import argparse
 import os
 from math import ceil
+import numpy as np
 from tqdm import tqdm
 
-def convert_to_chunks(pickle_path, output_dir, chunk_size=1000):
+# Binary chunk layout (little endian), read by app.js:
+#   chunk_0001.bin       float32 scales[count], then <dtype> codes[count * dim]
+#   chunk_0001.idx.json  {"version", "count", "bins", "dim", "dtype", "encoding", "paths", "shapes"}
+# A histogram is restored as h = scale * (code / QMAX)^2: every bin is stored as the
+# square root of its fraction of the image's largest bin, which keeps the small bins
+# (most of a painting's colors) precise and makes sqrt(h) for the Hellinger distance free.
+#
+# manifest.json lists every chunk with its files' sizes and sha1, so the viewer can
+# fetch all of them in parallel without probing, and cache them by content
+CHUNK_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+DTYPES = {'uint16': (np.uint16, 65535), 'uint8': (np.uint8, 255)}
+# uint8 halves the download against uint16; thanks to the sqrt encoding the restored
+# bins stay within ~2e-3 of the originals, well below what changes a similarity ranking
+DEFAULT_DTYPE = 'uint8'
+
+def quantize(histograms, dtype=DEFAULT_DTYPE):
+    """(N, dim) float histograms -> (float32 scales (N,), codes (N, dim))"""
+    np_dtype, qmax = DTYPES[dtype]
+    histograms = np.asarray(histograms, dtype=np.float32)
+    scales = histograms.max(axis=1)
+    safe = np.where(scales > 0, scales, 1)[:, None]
+    codes = np.rint(np.sqrt(histograms / safe) * qmax).astype(np_dtype)
+    return scales.astype(np.float32), codes
+
+def dequantize(scales, codes, dtype=DEFAULT_DTYPE):
+    _, qmax = DTYPES[dtype]
+    return scales[:, None] * np.square(codes.astype(np.float32) / qmax)
+
+def write_binary_chunk(output_dir, chunk_idx, items, dtype=DEFAULT_DTYPE):
+    keys = [rel_path.replace('\\', '/') for rel_path, _ in items]
+    histograms = np.array([img_data['histogram'] for _, img_data in items], dtype=np.float32)
+    scales, codes = quantize(histograms, dtype)
+
+    name = f"chunk_{chunk_idx:04d}"
+    with open(os.path.join(output_dir, f"{name}.bin"), 'wb') as f:
+        f.write(scales.astype('<f4').tobytes())
+        f.write(codes.astype(codes.dtype.newbyteorder('<')).tobytes())
+    index = {
+        'version': CHUNK_FORMAT_VERSION,
+        'count': len(keys),
+        'bins': items[0][1]['bins'],
+        'dim': histograms.shape[1],
+        'dtype': dtype,
+        'encoding': 'sqrt',
+        'paths': keys,
+        'shapes': [list(img_data['img_shape'][:2]) for _, img_data in items],
+    }
+    with open(os.path.join(output_dir, f"{name}.idx.json"), 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+
+def write_json_chunk(output_dir, chunk_idx, items):
+    chunk_data = {}
+    for rel_path, img_data in items:
+        # Store with original path as key
+        chunk_data[rel_path] = {
+            'histogram': img_data['histogram'].tolist(),
+            'img_path': img_data['img_path'].replace('\\', '/'),
+            'img_shape': img_data['img_shape'],
+            'bins': img_data['bins']
+        }
+
+    # Save as chunk_0001.json, etc.
+    with open(os.path.join(output_dir, f"chunk_{chunk_idx:04d}.json"), 'w') as f:
+        json.dump(chunk_data, f)
+
+def file_entry(output_dir, filename):
+    h = hashlib.sha1()
+    with open(os.path.join(output_dir, filename), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return {'file': filename, 'bytes': os.path.getsize(os.path.join(output_dir, filename)), 'sha1': h.hexdigest()}
+
+def write_manifest(output_dir, fmt, dtype, chunk_counts, bins, dim):
+    chunks = []
+    for chunk_idx, count in enumerate(chunk_counts):
+        name = f"chunk_{chunk_idx:04d}"
+        if fmt == 'binary':
+            files = {'index': file_entry(output_dir, f"{name}.idx.json"), 'data': file_entry(output_dir, f"{name}.bin")}
+        else:
+            files = {'data': file_entry(output_dir, f"{name}.json")}
+        chunks.append({'name': name, 'count': count, **files})
+
+    manifest = {
+        'version': CHUNK_FORMAT_VERSION,
+        'format': fmt,
+        'dtype': dtype if fmt == 'binary' else 'float',
+        'bins': bins,
+        'dim': dim,
+        'total_items': sum(chunk_counts),
+        'total_bytes': sum(c[f]['bytes'] for c in chunks for f in ('index', 'data') if f in c),
+        'chunks': chunks,
+    }
+    # Replace atomically: the server may be handing out the old manifest right now
+    tmp_path = os.path.join(output_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+    print(f"✅ Wrote {len(chunks)} chunks ({manifest['total_bytes'] / 1e6:.1f} MB) and {MANIFEST_NAME} to {output_dir}")
+
+def remove_stale_chunks(output_dir, total_chunks, suffixes):
+    """Drop chunks left over from a larger collection, so the viewer does not load them"""
+    for filename in os.listdir(output_dir):
+        match = re.fullmatch(r"chunk_(\d{4})(\..+)", filename)
+        if match and match.group(2) in suffixes and int(match.group(1)) >= total_chunks:
+            os.remove(os.path.join(output_dir, filename))
+
+def convert_to_chunks(pickle_path, output_dir, chunk_size=1000, fmt='binary', dtype=DEFAULT_DTYPE):
     os.makedirs(output_dir, exist_ok=True)
-    
+
     with open(pickle_path, 'rb') as f:
         data = pickle.load(f)
-    
+
     items = list(data.items())
     total_chunks = ceil(len(items) / chunk_size)
-    
+
+    chunk_counts = []
     for chunk_idx in tqdm(range(total_chunks), desc="Creating chunks"):
-        chunk_data = {}
         start = chunk_idx * chunk_size
         end = start + chunk_size
-        
-        for rel_path, img_data in items[start:end]:
-            # Store with original path as key
-            chunk_data[rel_path] = {
-                'histogram': img_data['histogram'].tolist(),
-                'img_path': img_data['img_path'].replace('\\', '/'),
-                'img_shape': img_data['img_shape'],
-                'bins': img_data['bins']
-            }
-        
-        # Save as chunk_0001.json, etc.
-        with open(os.path.join(output_dir, f"chunk_{chunk_idx:04d}.json"), 'w') as f:
-            json.dump(chunk_data, f)
+        if fmt == 'binary':
+            write_binary_chunk(output_dir, chunk_idx, items[start:end], dtype)
+        else:
+            write_json_chunk(output_dir, chunk_idx, items[start:end])
+        chunk_counts.append(len(items[start:end]))
+
+    remove_stale_chunks(output_dir, total_chunks, ('.bin', '.idx.json') if fmt == 'binary' else ('.json',))
+    first = items[0][1] if items else {'bins': 8, 'histogram': np.zeros(512)}
+    write_manifest(output_dir, fmt, dtype, chunk_counts, first['bins'], len(first['histogram']))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Split the color histograms into chunks for the browser viewer')
+    parser.add_argument('--format', choices=['binary', 'json'], default='binary',
+                        help='binary: quantized typed-array chunks (app.js); json: legacy float lists')
+    parser.add_argument('--dtype', choices=sorted(DTYPES), default=DEFAULT_DTYPE,
+                        help='Bin precision of binary chunks (uint16 doubles the size for ~1e-6 error)')
+    parser.add_argument('--chunk-size', type=int, default=1000)  # Adjust based on performance
+    args = parser.parse_args()
+
     convert_to_chunks(
         "pickles/color_histograms.pkl",
         "histogram_chunks",
-        chunk_size=1000  # Adjust based on performance
-    )
\ No newline at end of file
+        chunk_size=args.chunk_size,
+        fmt=args.format,
+        dtype=args.dtype
+    )
@@ -1,9 +1,22 @@
 import cv2
 import os
+import argparse
 import numpy as np
-from tqdm import tqdm
-import pickle
-from pathlib import Path
+
+def bgr_histogram_from_image(img, n_bins=8):
+    """Flat, sum-normalized n_bins^3 BGR histogram of an already decoded image"""
+    # Calculate 3D histogram using OpenCV's optimized function
+    hist = cv2.calcHist(
+        images=[img],
+        channels=[0, 1, 2],  # BGR channels
+        mask=None,
+        histSize=[n_bins] * 3,
+        ranges=[0, 256] * 3
+    )
+
+    # Normalize histogram to sum to 1
+    hist = hist / np.sum(hist)
+    return hist.flatten()
 
 def compute_bgr_histogram(image_path, folder_path, n_bins=8):
     """Optimized version using cv2.calcHist"""
@@ -12,21 +25,9 @@ def compute_bgr_histogram(image_path, folder_path, n_bins=8):
         if img is None:
             return None
         
-        # Calculate 3D histogram using OpenCV's optimized function
-        hist = cv2.calcHist(
-            images=[img],
-            channels=[0, 1, 2],  # BGR channels
-            mask=None,
-            histSize=[n_bins] * 3,
-            ranges=[0, 256] * 3
-        )
-        
-        # Normalize histogram to sum to 1
-        hist = hist / np.sum(hist)
-        
         return {
             'relative_path': os.path.relpath(image_path, folder_path),
-            'histogram': hist.flatten(),
+            'histogram': bgr_histogram_from_image(img, n_bins),
             'img_shape': img.shape,
             'img_path': image_path,
             'bins': n_bins
@@ -35,7 +36,14 @@ def compute_bgr_histogram(image_path, folder_path, n_bins=8):
         print(f"\n⚠️ Error processing {image_path}: {str(e)}")
         return None
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Compute BGR color histograms of the wikiart collection')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes for the analysis (1 = single process)')
+    return parser.parse_args()
+
 def main():
+    args = parse_arguments()
     # Constants
     PICKLE_DIR = "pickles"
     HISTOGRAM_PICKLE_FILE = os.path.join(PICKLE_DIR, "color_histograms.pkl")
@@ -44,10 +52,6 @@ def main():
     
     os.makedirs(PICKLE_DIR, exist_ok=True)
 
-    if Path(HISTOGRAM_PICKLE_FILE).exists():
-        print(f"🔍 Found existing results file")
-        return
-
     # Find images
     print("Finding images...")
     image_files = []
@@ -58,22 +62,11 @@ def main():
     
     print(f"Found {len(image_files)} images to process")
 
-    # Process images with progress bar
-    histograms = {}
-    for img_path in tqdm(image_files, desc="Processing images"):
-        result = compute_bgr_histogram(img_path, FOLDER_PATH, BINS)
-        if result:
-            histograms[result['relative_path']] = {
-                'histogram': result['histogram'],
-                'img_shape': result['img_shape'],
-                'img_path': result['img_path'],
-                'bins': result['bins']
-            }
-    
-    # Save results
-    with open(HISTOGRAM_PICKLE_FILE, 'wb') as f:
-        pickle.dump(histograms, f)
-    print(f"✅ Saved results to {HISTOGRAM_PICKLE_FILE}")
+    # Only new or changed images are processed; deleted ones are pruned from the pickle
+    from feature_extraction import HistogramExtractor, run_extractors
+    extractor = HistogramExtractor(bins=BINS)
+    run_extractors([extractor], image_files, FOLDER_PATH, args.workers)
+    histograms = extractor.results
 
     # Verification
     if histograms:
@@ -0,0 +1,305 @@
+import os
+import time
+import pickle
+import argparse
+
+import cv2
+import numpy as np
+
+from feature_store import FeatureStore, store_dir_for
+
+HISTOGRAM_FILE = os.path.join("pickles", "color_histograms.pkl")
+ANN_INDEX_FILE = os.path.join("pickles", "histogram.ann")
+ANN_META_FILE = os.path.join("pickles", "histogram_ann_meta.pkl")
+ANN_TREES = 50
+TOP_K = 10
+
+# Same measures as cv2.compareHist; True = higher score is more similar
+METHODS = {
+    'correl': True,          # cv2.HISTCMP_CORREL
+    'chisqr': False,         # cv2.HISTCMP_CHISQR
+    'intersect': True,       # cv2.HISTCMP_INTERSECT
+    'bhattacharyya': False,  # cv2.HISTCMP_BHATTACHARYYA
+}
+
+
+class HistogramIndex:
+    """All flat 8x8x8 BGR histograms in one contiguous float32 matrix, searched with NumPy.
+
+    The matrix is kept transposed (bins x images), so one histogram bin of every
+    image is a contiguous row. Bins where the query is zero add nothing to any
+    of the four measures, and a painting uses a small part of the 512 bins, so
+    a query only streams the rows of its own non-zero bins instead of the whole
+    matrix (the search is memory bound). Batches of queries are answered with
+    one matrix product over the union of their bins.
+    Scores equal cv2.compareHist(query, histogram, method).
+    """
+
+    def __init__(self, keys, paths, histograms):
+        self.keys = list(keys)
+        self.paths = list(paths)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        hist = np.asarray(histograms, dtype=np.float32)
+        self.dim = hist.shape[1]
+        self.hist_t = np.ascontiguousarray(hist.T)
+        self.sqrt_t = np.sqrt(self.hist_t)
+
+        # Per-image statistics used to finish the scores after the matrix products
+        sums = self.hist_t.sum(axis=0, dtype=np.float64)
+        self.sums = sums.astype(np.float32)
+        self.means = (sums / self.dim).astype(np.float32)
+        centered_sq = np.einsum('ij,ij->j', self.hist_t, self.hist_t, dtype=np.float64) - self.dim * (sums / self.dim) ** 2
+        self.centered_norms = np.sqrt(np.maximum(centered_sq, 0)).astype(np.float32)
+
+    @classmethod
+    def load(cls, histogram_file=HISTOGRAM_FILE):
+        """Load from the columnar store next to the pickle (fast), else from the pickle itself"""
+        store_dir = store_dir_for(histogram_file)
+        if FeatureStore.exists(store_dir):
+            store = FeatureStore(store_dir)
+            paths = [store.text('img_path', i) for i in range(len(store))]
+            return cls(store.iter_keys(), paths, store.column('histogram'))
+        with open(histogram_file, 'rb') as f:
+            histograms = pickle.load(f)
+        keys = list(histograms)
+        return cls(keys, [histograms[k]['img_path'] for k in keys],
+                   np.array([histograms[k]['histogram'] for k in keys], dtype=np.float32))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def histogram(self, key):
+        """Stored histogram of one image, usable as a query"""
+        return self.hist_t[:, self.positions[key]].copy()
+
+    def scores(self, queries, method='correl'):
+        """(Q, N) scores of every query against every image"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-bin histograms, got {queries.shape[1]}")
+        if method == 'correl':
+            return self._correl(queries)
+        if method == 'bhattacharyya':
+            return self._bhattacharyya(queries)
+        if method == 'chisqr':
+            return np.stack([self._chisqr(q) for q in queries])
+        if method == 'intersect':
+            return np.stack([self._intersect(q) for q in queries])
+        raise ValueError(f"Unknown method '{method}', use one of {sorted(METHODS)}")
+
+    def _dot(self, queries, matrix_t):
+        """queries @ matrix_t, reading only the rows of bins some query uses"""
+        nz = np.flatnonzero(queries.any(axis=0))
+        if len(queries) > 1:
+            # Gathering rows costs a copy; only worth it while the batch uses few bins
+            if len(nz) > self.dim // 2:
+                return queries @ matrix_t
+            return queries[:, nz] @ matrix_t[nz]
+        acc = np.zeros((1, matrix_t.shape[1]), dtype=np.float32)
+        tmp = np.empty(matrix_t.shape[1], dtype=np.float32)
+        for j in nz:
+            np.multiply(matrix_t[j], queries[0, j], out=tmp)
+            acc[0] += tmp
+        return acc
+
+    def _correl(self, queries):
+        # sum((q - mq)(x - mx)) = q.x - D * mq * mx, so the matrix is never centered
+        q_means = queries.mean(axis=1, keepdims=True)
+        q_norms = np.linalg.norm(queries - q_means, axis=1, keepdims=True)
+        dots = self._dot(queries, self.hist_t) - self.dim * q_means * self.means
+        denom = q_norms * self.centered_norms
+        return np.divide(dots, denom, out=np.ones_like(dots), where=denom > 0)
+
+    def _bhattacharyya(self, queries):
+        coeff = self._dot(np.sqrt(queries), self.sqrt_t)
+        denom = np.sqrt(queries.sum(axis=1, keepdims=True) * self.sums)
+        coeff = np.divide(coeff, denom, out=np.zeros_like(coeff), where=denom > 0)
+        return np.sqrt(np.maximum(1 - coeff, 0))
+
+    def _chisqr(self, query):
+        # sum over the query's non-zero bins of (q - x)^2 / q; cv2 skips the zero bins as well
+        acc = np.zeros(len(self), dtype=np.float32)
+        tmp = np.empty(len(self), dtype=np.float32)
+        for j in np.flatnonzero(query):
+            np.subtract(self.hist_t[j], query[j], out=tmp)
+            np.multiply(tmp, tmp, out=tmp)
+            tmp *= 1 / query[j]
+            acc += tmp
+        return acc
+
+    def _intersect(self, query):
+        # min(q, x) is 0 wherever q is
+        acc = np.zeros(len(self), dtype=np.float32)
+        tmp = np.empty(len(self), dtype=np.float32)
+        for j in np.flatnonzero(query):
+            np.minimum(self.hist_t[j], query[j], out=tmp)
+            acc += tmp
+        return acc
+
+    def search(self, queries, k=TOP_K, method='correl', exclude=None):
+        """Top-k [(key, path, score)] per query, best first.
+
+        queries is one histogram or a (Q, bins) batch; a single histogram returns
+        a single result list. Keys in exclude (e.g. the query image) are skipped.
+        """
+        single = np.asarray(queries).ndim == 1
+        scores = self.scores(queries, method)
+        higher_is_better = METHODS[method]
+        if not higher_is_better:
+            scores = -scores
+        if exclude:
+            skip = [self.positions[key] for key in exclude if key in self.positions]
+            scores[:, skip] = -np.inf
+
+        n = scores.shape[1]
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.argsort(-scores, axis=1)
+        results = []
+        for row, candidates in zip(scores, top):
+            order = candidates[np.argsort(-row[candidates], kind='stable')]
+            sign = 1 if higher_is_better else -1
+            results.append([(self.keys[i], self.paths[i], float(sign * row[i])) for i in order])
+        return results[0] if single else results
+
+
+class HistogramAnnIndex:
+    """Annoy index over Hellinger-transformed histograms (sqrt of every bin).
+
+    The square roots of a sum-normalized histogram form a unit vector, and the
+    Euclidean distance between two of them is sqrt(2) times their Hellinger
+    distance, so Annoy's plain euclidean metric ranks by a proper histogram
+    distance. Results carry the Hellinger distance (0 = identical, 1 = disjoint).
+    The index file is memory-mapped, so loading is instant and shared between processes.
+    """
+
+    def __init__(self, index_file=ANN_INDEX_FILE, meta_file=ANN_META_FILE):
+        from annoy import AnnoyIndex
+        with open(meta_file, 'rb') as f:
+            meta = pickle.load(f)
+        self.keys = meta['keys']
+        self.paths = meta['paths']
+        self.dim = meta['dim']
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.index = AnnoyIndex(self.dim, 'euclidean')
+        self.index.load(index_file)
+
+    @staticmethod
+    def exists(index_file=ANN_INDEX_FILE, meta_file=ANN_META_FILE):
+        return os.path.exists(index_file) and os.path.exists(meta_file)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def histogram(self, key):
+        """Stored histogram of one image (squared back from the index vector)"""
+        return np.square(np.array(self.index.get_item_vector(self.positions[key]), dtype=np.float32))
+
+    def search(self, queries, k=TOP_K, search_k=-1, exclude=None):
+        """Top-k [(key, path, hellinger distance)] per histogram query, nearest first.
+
+        Like HistogramIndex.search, a single histogram returns a single list.
+        search_k trades speed for recall (-1 = Annoy default, n_trees * k).
+        """
+        single = np.asarray(queries).ndim == 1
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        sums = queries.sum(axis=1, keepdims=True)
+        vectors = np.sqrt(np.divide(queries, sums, out=np.zeros_like(queries), where=sums > 0))
+        skip = set(exclude or ())
+
+        results = []
+        for vector in vectors:
+            ids, dists = self.index.get_nns_by_vector(vector.tolist(), k + len(skip), search_k=search_k,
+                                                      include_distances=True)
+            hits = [(self.keys[i], self.paths[i], d / np.sqrt(2)) for i, d in zip(ids, dists)
+                    if self.keys[i] not in skip]
+            results.append(hits[:k])
+        return results[0] if single else results
+
+
+def build_ann_index(index, n_trees=ANN_TREES, index_file=ANN_INDEX_FILE, meta_file=ANN_META_FILE):
+    """Build the Annoy index from a loaded HistogramIndex (its sqrt matrix is the Hellinger transform)"""
+    from annoy import AnnoyIndex
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    ann = AnnoyIndex(index.dim, 'euclidean')
+    norms = np.sqrt(np.maximum(index.sums, 1e-12))
+    for i in range(len(index)):
+        # sqrt(h / sum(h)), so histograms that are not exactly normalized still become unit vectors
+        ann.add_item(i, (index.sqrt_t[:, i] / norms[i]).tolist())
+    ann.build(n_trees)
+
+    # Write both files under temporary names first so a running server never sees half an index
+    ann.save(index_file + '.tmp')
+    with open(meta_file + '.tmp', 'wb') as f:
+        pickle.dump({'keys': index.keys, 'paths': index.paths, 'dim': index.dim,
+                     'metric': 'euclidean', 'transform': 'sqrt'}, f)
+    os.replace(index_file + '.tmp', index_file)
+    os.replace(meta_file + '.tmp', meta_file)
+    print(f"✅ Built Annoy index over {len(index)} histograms ({n_trees} trees): {index_file}")
+
+
+def query_from_image(img_path, bins=8):
+    from histogram_detection import bgr_histogram_from_image
+    img = cv2.imread(img_path)
+    if img is None:
+        raise FileNotFoundError(f"Could not read image: {img_path}")
+    return bgr_histogram_from_image(img, bins)
+
+
+def benchmark(index, method, k, n_queries=100, batch=16):
+    rng = np.random.default_rng(0)
+    queries = index.hist_t[:, rng.integers(0, len(index), n_queries)].T.copy()
+    start = time.perf_counter()
+    for q in queries:
+        index.search(q, k, method)
+    single_ms = (time.perf_counter() - start) * 1000 / n_queries
+    start = time.perf_counter()
+    for i in range(0, n_queries, batch):
+        index.search(queries[i:i + batch], k, method)
+    batched_ms = (time.perf_counter() - start) * 1000 / n_queries
+    print(f"⏱️ {method}: {single_ms:.2f} ms/query, {batched_ms:.2f} ms/query in batches of {batch} "
+          f"({len(index)} histograms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find paintings with similar color histograms')
+    parser.add_argument('query', nargs='?', help='Image file, or key (relative path) of an indexed image')
+    parser.add_argument('--method', choices=sorted(METHODS), default='correl')
+    parser.add_argument('-k', type=int, default=TOP_K)
+    parser.add_argument('--histograms', default=HISTOGRAM_FILE)
+    parser.add_argument('--benchmark', action='store_true', help='Time queries with every method')
+    parser.add_argument('--build-ann', action='store_true',
+                        help=f'(Re)build the approximate index {ANN_INDEX_FILE}')
+    parser.add_argument('--trees', type=int, default=ANN_TREES, help='Annoy trees for --build-ann')
+    parser.add_argument('--ann', action='store_true',
+                        help='Answer the query from the approximate index (Hellinger distance)')
+    args = parser.parse_args()
+
+    index = None
+    if args.build_ann or args.benchmark or (args.query and not args.ann):
+        start = time.perf_counter()
+        index = HistogramIndex.load(args.histograms)
+        print(f"✅ Loaded {len(index)} histograms in {time.perf_counter() - start:.2f}s")
+
+    if args.build_ann:
+        build_ann_index(index, args.trees)
+    if args.benchmark:
+        for method in METHODS:
+            benchmark(index, method, args.k)
+    if not args.query:
+        return
+
+    searcher = HistogramAnnIndex() if args.ann else index
+    if args.query in searcher.positions:
+        query, exclude = searcher.histogram(args.query), [args.query]
+    else:
+        query, exclude = query_from_image(args.query), None
+    if args.ann:
+        results = searcher.search(query, args.k, exclude=exclude)
+    else:
+        results = searcher.search(query, args.k, args.method, exclude)
+    for key, path, score in results:
+        print(f"{score:10.4f}  {path}")
+
+
+if __name__ == "__main__":
+    main()
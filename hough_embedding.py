@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import os
+import time
+import hashlib
+import argparse
+import numpy as np
+from annoy import AnnoyIndex
+
+# Hough accumulators (180 x 180 = 32,400 values) are projected to EMBED_DIMS with a
+# PCA fitted on the corpus. Rows are scaled to unit length first, so the Euclidean
+# distance between two embeddings approximates the raw index's angular distance
+# (Annoy's angular distance is the Euclidean distance of the normalized vectors),
+# and the item ids are those of pickles/hough.ann and pickles/hough_vectors.npy.
+EMBED_DIMS = 128
+FIT_SAMPLES = 20000   # rows the PCA is fitted on
+FIT_BATCH = 512       # rows per partial_fit; each costs an SVD of (FIT_BATCH + dims) x 32,400
+BATCH_SIZE = 2048     # rows per transform / exact-search step
+EMBED_TREES = 50      # trees over 128 dims are cheap, more of them buys recall
+EMBED_FILE = 'pickles/hough_pca.npz'
+EMBED_INDEX_FILE = 'pickles/hough_pca.ann'
+PROBE_ROWS = 8        # rows fingerprinted to tell the files of two builds apart
+
+
+def generation_probe(rows):
+    """sha1 of the first PROBE_ROWS accumulators of a build (uint8 rows or Annoy item vectors).
+
+    Every file of a build records it, so a server reloading halfway through a
+    rebuild can tell that a new file does not belong with an old one.
+    """
+    rows = np.rint(np.asarray(rows[:PROBE_ROWS], dtype=np.float32)).astype(np.uint8)
+    return hashlib.sha1(rows.tobytes()).hexdigest()
+
+
+def normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    x = x.reshape(len(x), -1)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms > 0, norms, 1)
+
+
+class HoughEmbedding:
+    """Fitted projection: embed(x) = (x / |x| - mean) @ components.T.
+
+    Plain numpy at query time; scikit-learn is only needed to fit it. probe is the
+    generation_probe of the vectors it was fitted on, index_probe the first
+    PROBE_ROWS embeddings added to its Annoy index (both None for older files).
+    """
+
+    def __init__(self, mean, components, probe=None, index_probe=None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.probe = probe
+        self.index_probe = index_probe
+
+    @classmethod
+    def load(cls, path=EMBED_FILE):
+        with np.load(path) as f:
+            probe = str(f['probe']) if 'probe' in f else None
+            index_probe = f['index_probe'] if 'index_probe' in f else None
+            return cls(f['mean'], f['components'], probe, index_probe)
+
+    @staticmethod
+    def exists(path=EMBED_FILE):
+        return os.path.exists(path)
+
+    def save(self, path=EMBED_FILE):
+        with open(path + '.tmp', 'wb') as f:
+            probes = {} if self.probe is None else {'probe': np.array(self.probe), 'index_probe': self.index_probe}
+            np.savez(f, mean=self.mean, components=self.components, **probes)
+        os.replace(path + '.tmp', path)
+
+    @property
+    def dims(self):
+        return self.components.shape[0]
+
+    def transform(self, vectors):
+        """(N, 32400) accumulators (any numeric dtype) -> (N, dims) float32"""
+        return (normalize_rows(vectors) - self.mean) @ self.components.T
+
+
+def rerank(vectors, query, candidates, k):
+    """Exact angular distance (Annoy's sqrt(2 - 2 cos)) from query to candidate rows of vectors.
+
+    Returns (ids, distances) of the k nearest. Candidates are read in row order,
+    so a memory-mapped matrix is touched sequentially.
+    """
+    ids = np.unique(np.asarray(candidates, dtype=np.int64))
+    rows = vectors[ids].astype(np.float32)
+    rows /= np.maximum(np.sqrt(np.einsum('ij,ij->i', rows, rows)), 1e-12)[:, None]
+    query = np.asarray(query, dtype=np.float32).ravel()
+    query = query / max(float(np.sqrt(query @ query)), 1e-12)
+    # Distance of the unit vectors directly, not sqrt(2 - 2 cos): no cancellation
+    # for near-identical images, so float32 is enough
+    rows -= query
+    distances = np.sqrt(np.einsum('ij,ij->i', rows, rows))
+    order = np.argsort(distances, kind='stable')[:k]
+    return ids[order], distances[order]
+
+
+def fit_embedding(vectors, dims=EMBED_DIMS, samples=FIT_SAMPLES, batch_size=FIT_BATCH, seed=0):
+    """IncrementalPCA over a sample of the (memory-mapped) vectors, one batch in memory at a time"""
+    from sklearn.decomposition import IncrementalPCA
+
+    n = len(vectors)
+    dims = min(dims, n, vectors.shape[1])
+    rows = np.sort(np.random.default_rng(seed).choice(n, min(samples, n), replace=False))
+    batch_size = max(batch_size, dims)  # every partial_fit needs at least dims rows
+    pca = IncrementalPCA(n_components=dims)
+    for chunk in np.array_split(rows, max(1, len(rows) // batch_size)):
+        pca.partial_fit(normalize_rows(vectors[chunk]))
+    print(f"PCA to {dims} dims keeps {pca.explained_variance_ratio_.sum():.1%} of the variance ({len(rows)} rows)")
+    return HoughEmbedding(pca.mean_, pca.components_)
+
+
+def build_embedding_index(vectors_file='pickles/hough_vectors.npy', embed_file=EMBED_FILE,
+                          index_file=EMBED_INDEX_FILE, dims=EMBED_DIMS, n_trees=EMBED_TREES):
+    """Fit the projection and build its Annoy index; both are renamed into place when complete.
+
+    The two files cannot be swapped at once, so the projection records probes of
+    its index and of the vectors, and the server ignores a pair that does not match.
+    """
+    start = time.time()
+    vectors = np.load(vectors_file, mmap_mode='r')
+    embedding = fit_embedding(vectors, dims)
+    embedding.probe = generation_probe(vectors)
+
+    index = AnnoyIndex(embedding.dims, metric='euclidean')
+    index.on_disk_build(index_file + '.tmp')
+    for begin in range(0, len(vectors), BATCH_SIZE):
+        embedded = embedding.transform(vectors[begin:begin + BATCH_SIZE])
+        if begin == 0:
+            embedding.index_probe = embedded[:PROBE_ROWS]
+        for i, vec in enumerate(embedded, begin):
+            index.add_item(i, vec)
+    index.build(n_trees, n_jobs=-1)
+    index.unload()
+
+    os.replace(index_file + '.tmp', index_file)
+    embedding.save(embed_file)
+    print(f"Built {embedding.dims}-dim embedding index ({len(vectors)} items, {n_trees} trees) "
+          f"to {index_file} in {time.time() - start:.1f}s")
+    return embedding
+
+
+# ---------------- Recall vs latency against the raw 32,400-dim index ----------------
+
+def exact_neighbors(vectors, query_rows, k):
+    """Exact angular top-k of corpus rows (the row itself left out), streamed over the memmap"""
+    queries = normalize_rows(vectors[query_rows])
+    best_sim = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    for begin in range(0, len(vectors), BATCH_SIZE):
+        sims = queries @ normalize_rows(vectors[begin:begin + BATCH_SIZE]).T
+        ids = np.arange(begin, begin + sims.shape[1])
+        sims[ids[None, :] == np.asarray(query_rows)[:, None]] = -np.inf
+        best_sim = np.concatenate([best_sim, sims], axis=1)
+        best_ids = np.concatenate([best_ids, np.broadcast_to(ids, sims.shape)], axis=1)
+        if best_sim.shape[1] > k:
+            keep = np.argpartition(-best_sim, k, axis=1)[:, :k]
+            best_sim = np.take_along_axis(best_sim, keep, axis=1)
+            best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    return [set(row) for row in best_ids]
+
+
+def timed_search(index, vectors, query_rows, k, search_k, raw=None, candidates=1):
+    """Search every query; with raw vectors given, fetch candidates * k and re-rank them exactly"""
+    found, latencies = [], []
+    for row, vec in zip(query_rows, vectors):
+        start = time.perf_counter()
+        ids = index.get_nns_by_vector(vec, (k + 1) * candidates, search_k=search_k)
+        if raw is not None:
+            ids, _ = rerank(raw, raw[row], ids, k + 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(set([i for i in ids if i != row][:k]))
+    return found, np.array(latencies)
+
+
+def recall_report(vectors_file='pickles/hough_vectors.npy', raw_index_file='pickles/hough.ann',
+                  embed_file=EMBED_FILE, embed_index_file=EMBED_INDEX_FILE,
+                  queries=200, k=10, search_ks=(-1, 1000, 10000), rerank_candidates=10, seed=1):
+    """Recall@k (vs exact angular search on the raw vectors) and per-query latency of both indexes"""
+    vectors = np.load(vectors_file, mmap_mode='r')
+    query_rows = np.sort(np.random.default_rng(seed).choice(len(vectors), min(queries, len(vectors)), replace=False))
+    k = min(k, len(vectors) - 1)
+    print(f"Exact top-{k} for {len(query_rows)} corpus queries...")
+    truth = exact_neighbors(vectors, query_rows, k)
+
+    raw = AnnoyIndex(vectors.shape[1], metric='angular')
+    raw.load(raw_index_file)
+    embedding = HoughEmbedding.load(embed_file)
+    embedded = AnnoyIndex(embedding.dims, metric='euclidean')
+    embedded.load(embed_index_file)
+    raw_queries = vectors[query_rows].astype(np.float32)
+    embedded_queries = embedding.transform(raw_queries)
+    runs = {
+        f"raw ({vectors.shape[1]} dims, {os.path.getsize(raw_index_file) / 1e6:.0f} MB)": (raw, raw_queries, {}),
+        f"pca ({embedding.dims} dims, {os.path.getsize(embed_index_file) / 1e6:.0f} MB)": (embedded, embedded_queries, {}),
+        f"pca + re-rank x{rerank_candidates}": (embedded, embedded_queries, {'raw': vectors, 'candidates': rerank_candidates}),
+    }
+
+    print(f"{'index':<28} {'search_k':>9} {f'recall@{k}':>10} {'mean ms':>9} {'p95 ms':>8}")
+    for name, (index, query_vectors, options) in runs.items():
+        for search_k in search_ks:
+            found, latencies = timed_search(index, query_vectors, query_rows, k, search_k, **options)
+            recall = np.mean([len(f & t) / k for f, t in zip(found, truth)])
+            print(f"{name:<28} {search_k:>9} {recall:>10.3f} {latencies.mean():>9.2f} {np.percentile(latencies, 95):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact PCA embedding of the Hough accumulators and its Annoy index')
+    parser.add_argument('--vectors', default='pickles/hough_vectors.npy',
+                        help='uint8 vector matrix written by precompute_annoy.py')
+    parser.add_argument('--dims', type=int, default=EMBED_DIMS, help='Embedding size (64-256 works well)')
+    parser.add_argument('--trees', type=int, default=EMBED_TREES)
+    parser.add_argument('--report', action='store_true',
+                        help='Only compare recall and latency of the raw and embedding indexes')
+    parser.add_argument('--queries', type=int, default=200, help='Corpus images used as queries in the report')
+    args = parser.parse_args()
+
+    if not args.report:
+        build_embedding_index(args.vectors, dims=args.dims, n_trees=args.trees)
+    recall_report(args.vectors, queries=args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,192 @@ import os
 import json
 import gzip
 import base64
+import random
 import numpy as np
-from flask import Flask, request, jsonify
+import cv2
+from flask import Flask, request, jsonify, abort
 from flask_cors import CORS
 from annoy import AnnoyIndex
 import threading
 import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import time
 import pickle
 
+from image_io import imread_unicode
+from feature_store import FeatureStore, store_dir_for, write_store_for_pickle
+from precompute_annoy import build_index
+from hough_embedding import HoughEmbedding, rerank, generation_probe, PROBE_ROWS
+from query_cache import QueryCache, quantize, query_key
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
+PART_CACHE_SIZE = 4          # decoded json part files kept in memory (each up to vse.MAX_JSON_SIZE_BYTES)
+THUMBNAIL_CACHE_SIZE = 512   # encoded thumbnails kept in memory
+SEARCH_CACHE_SIZE = 4096     # search results kept for repeated queries
+SEARCH_CACHE_TTL = 3600      # seconds
+SEARCH_CACHE_STEP = 4        # Hough values are bucketed by 4 for the cache key, so near-identical drawings share results
+THUMBNAIL_SIZE = 512         # default longest side in pixels
+MAX_THUMBNAIL_SIZE = 2048
+CANDIDATES = 10       # Annoy returns top_k * CANDIDATES, re-ranked exactly against the stored vectors
+MAX_CANDIDATES = 100
+MAX_TOP_K = 1000
+BATCH_WORKERS = os.cpu_count() or 4  # Annoy releases the GIL during a lookup, so threads run in parallel
+THUMBNAIL_QUALITY = 85
+RELOAD_CHECK_INTERVAL = 1.0  # s between checks for a rebuilt index on disk
+
+def file_versions(ann_file, meta_file):
+    """mtimes of every file a HoughIndex maps (None if missing); a rebuild changes at least one"""
+    stem = os.path.splitext(ann_file)[0]
+    paths = (ann_file, os.path.join(store_dir_for(meta_file), 'meta.json'),
+             stem + '_vectors.npy', stem + '_pca.npz', stem + '_pca.ann')
+    versions = []
+    for path in paths:
+        try:
+            versions.append(os.path.getmtime(path))
+        except OSError:
+            versions.append(None)
+    return tuple(versions)
+
+class HoughIndex:
+    """One generation of the search index: the Annoy file and its key table, both memory-mapped.
+
+    Loading maps hough.ann and the hough_meta_store columns instead of reading
+    them, so it takes milliseconds. A HoughIndex is never modified; a reload
+    builds a new one and swaps the reference, and queries already holding the
+    old one finish on it.
+    """
+    def __init__(self, ann_file, meta_file):
+        store_dir = store_dir_for(meta_file)
+        if not FeatureStore.exists(store_dir):
+            # Metadata pickled by an older precompute_annoy.py: write its mappable twin once
+            with open(meta_file, 'rb') as f:
+                write_store_for_pickle(meta_file, pickle.load(f))
+        self.ann_file = ann_file
+        self.meta_file = meta_file
+        self.store = FeatureStore(store_dir)
+        self.dim = self.store.attrs['dim']
+        self.index = AnnoyIndex(self.dim, metric='angular')
+        self.index.load(self.ann_file)  # mmap, pages come in as queries touch them
+        # Written by the same build as the key table? (None for builds that predate probes)
+        self.probe = self.store.attrs.get('probe')
+        n_probe = min(PROBE_ROWS, self.index.get_n_items())
+        if self.probe is not None and self.probe != generation_probe([self.index.get_item_vector(i) for i in range(n_probe)]):
+            raise ValueError(f"'{ann_file}' and '{store_dir}' are from different builds (rebuild still running?)")
+        # Annoy item id -> store row (rows are sorted by key)
+        items = self.store.column('item')
+        self.rows_by_item = np.full(self.index.get_n_items(), -1, dtype=np.int64)
+        self.rows_by_item[items] = np.arange(len(items))
+        self.embedding, self.embed_index = self.load_embedding(ann_file)
+        self.vectors = self.load_vectors(ann_file)
+        self.loaded_at = time.time()
+
+    def load_vectors(self, ann_file):
+        """Memory-mapped uint8 sinusoids written by precompute_annoy.py (row = item), for re-ranking"""
+        vectors_file = os.path.splitext(ann_file)[0] + '_vectors.npy'
+        if not os.path.exists(vectors_file):
+            return None
+        vectors = np.load(vectors_file, mmap_mode='r')
+        if vectors.shape != (self.index.get_n_items(), self.dim):
+            logger.warning(f"Ignoring {vectors_file}: shape {vectors.shape} does not match {ann_file}")
+            return None
+        if self.probe is not None and generation_probe(vectors) != self.probe:
+            logger.warning(f"Ignoring {vectors_file}: not from the build of {ann_file}")
+            return None
+        return vectors
+
+    def load_embedding(self, ann_file):
+        """Compact PCA embedding and its index (hough_embedding.py), when built for these items"""
+        stem = os.path.splitext(ann_file)[0]
+        embed_file, embed_index_file = stem + '_pca.npz', stem + '_pca.ann'
+        if not (os.path.exists(embed_file) and os.path.exists(embed_index_file)):
+            return None, None
+        embedding = HoughEmbedding.load(embed_file)
+        embed_index = AnnoyIndex(embedding.dims, metric='euclidean')
+        embed_index.load(embed_index_file)
+        if embed_index.get_n_items() != self.index.get_n_items():
+            logger.warning(f"Ignoring {embed_index_file}: {embed_index.get_n_items()} items, "
+                           f"{ann_file} has {self.index.get_n_items()} (rerun hough_embedding.py)")
+            return None, None
+        if embedding.probe is not None and self.probe is not None and embedding.probe != self.probe:
+            logger.warning(f"Ignoring {embed_file}: fitted for another build of {ann_file} (rerun hough_embedding.py)")
+            return None, None
+        if embedding.index_probe is not None:
+            stored = [embed_index.get_item_vector(i) for i in range(len(embedding.index_probe))]
+            if not np.allclose(stored, embedding.index_probe, atol=1e-4):
+                logger.warning(f"Ignoring {embed_index_file}: not built with {embed_file}")
+                return None, None
+        return embedding, embed_index
+
+    def space(self, use_embedding=True):
+        """Name of the index a query runs on: the embedding when built and wanted, else raw"""
+        return 'embedding' if use_embedding and self.embedding is not None else 'raw'
+
+    def nns_by_vector(self, q, n, use_embedding=True, search_k=-1):
+        # Euclidean distance of embeddings approximates the raw angular distance
+        if self.space(use_embedding) == 'embedding':
+            return self.embed_index.get_nns_by_vector(self.embedding.transform(q[None])[0], n, search_k, include_distances=True)
+        return self.index.get_nns_by_vector(q, n, search_k, include_distances=True)
+
+    def nns_by_item(self, item, n, use_embedding=True, search_k=-1):
+        index = self.embed_index if self.space(use_embedding) == 'embedding' else self.index
+        return index.get_nns_by_item(item, n, search_k, include_distances=True)
+
+    def search(self, q, n, item=None, use_embedding=True, search_k=-1, candidates=CANDIDATES):
+        """Nearest n items to vector q (or to indexed item): (ids, angular distances).
+
+        Two stages when the vectors are mapped: Annoy proposes n * candidates items
+        (search_k as given, -1 = Annoy default) and they are re-ranked by the exact
+        distance to the raw query. candidates=1 returns Annoy's answer as is.
+        """
+        reranked = self.vectors is not None and candidates > 1
+        fetch = n * candidates if reranked else n
+        if item is None:
+            idxs, dists = self.nns_by_vector(q, fetch, use_embedding, search_k)
+        else:
+            idxs, dists = self.nns_by_item(item, fetch, use_embedding, search_k)
+            q = self.vectors[item] if reranked else None
+        if reranked and idxs:
+            idxs, dists = rerank(self.vectors, q, idxs, n)
+        return idxs, dists
+
+    def __len__(self):
+        return len(self.store)
+
+    def meta(self, key):
+        """{'path', 'file'} of an indexed image (KeyError if unknown)"""
+        row = self.store.row(key)
+        if row is None:
+            raise KeyError(key)
+        return {'path': self.store.text('path', row), 'file': self.store.text('file', row)}
+
+    def item_of(self, key):
+        row = self.store.row(key)
+        if row is None:
+            raise KeyError(key)
+        return int(self.store.column('item')[row])
+
+    def random_key(self):
+        return self.store.key(random.randrange(len(self.store)))
+
+    def results(self, idxs, dists, exclude=None):
+        results = []
+        for idx, dist in zip(idxs, dists):
+            row = self.rows_by_item[idx]
+            if row < 0:
+                continue
+            key = self.store.key(row)
+            if key == exclude:
+                continue
+            results.append({'key': key, 'distance': float(dist),
+                            'path': self.store.text('path', row), 'file': self.store.text('file', row)})
+        return results
+
 class HoughDatabase:
     def __init__(self,
                  json_folder="json_minimal_edges_base64",
@@ -28,11 +199,20 @@ class HoughDatabase:
         self.ann_file = ann_file
         self.meta_file = meta_file
         self.n_trees = n_trees
-        self.keys = []
-        self.metadata = {}
-        self.index = None
+        self.current = None
+        self.version = None   # file_versions() of the last index loaded, or that failed to load
+        self.checked_at = 0.0
+        self.error = None     # why the index could not be built, reported by /status
+        self.reload_lock = threading.Lock()
         self.loading_complete = threading.Event()
-        threading.Thread(target=self.load_all_data, daemon=True).start()
+        self.parts = QueryCache(PART_CACHE_SIZE)
+        self.thumbnails = QueryCache(THUMBNAIL_CACHE_SIZE)
+        self.search_cache = QueryCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        if os.path.exists(self.ann_file) and os.path.exists(self.meta_file):
+            # Precomputed: map it before the server takes its first request
+            self.reload()
+        else:
+            threading.Thread(target=self.build_from_json, daemon=True).start()
 
     def decode_base64_gzip(self, encoded):
         data_b64 = encoded['data']
@@ -41,100 +221,422 @@ class HoughDatabase:
         arr = np.frombuffer(decompressed, dtype=np.uint8)
         return arr.reshape(encoded['shape'])
 
-    def load_all_data(self):
-        # Try loading precomputed files
-        if os.path.exists(self.ann_file) and os.path.exists(self.meta_file):
-            logger.info("Loading precomputed Annoy index and metadata...")
-            with open(self.meta_file, 'rb') as f:
-                meta = pickle.load(f)
-            self.keys = meta['keys']
-            self.metadata = meta['metadata']
-            dim = meta['dim']
-            self.index = AnnoyIndex(dim, metric='angular')
-            self.index.load(self.ann_file)
-            logger.info(f"Loaded {len(self.keys)} items from precomputed index.")
-            self.loading_complete.set()
+    def reload(self, ann_file=None, meta_file=None):
+        """Map a (new) index and swap it in atomically; in-flight queries keep the old one"""
+        with self.reload_lock:
+            return self.swap_in(ann_file or self.ann_file, meta_file or self.meta_file)
+
+    def swap_in(self, ann_file, meta_file):
+        start = time.perf_counter()
+        version = file_versions(ann_file, meta_file)
+        try:
+            new = HoughIndex(ann_file, meta_file)
+        finally:
+            # A failed load is only retried by refresh() once the files change again
+            self.version = version
+        old, self.current = self.current, new
+        self.error = None
+        self.search_cache.clear()
+        if old is not None:
+            # Items may have moved between part files
+            self.parts.clear()
+            self.thumbnails.clear()
+        self.loading_complete.set()
+        logger.info(f"Loaded {len(new)} items from '{new.ann_file}' in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return new
+
+    def refresh(self):
+        """Reload when the index files changed on disk since they were loaded.
+
+        Called before every request, at most once per RELOAD_CHECK_INTERVAL, so each
+        process serving the app (e.g. every gunicorn worker of serve.py) picks up a
+        rebuilt index by itself, not only the one that answered /admin/reload.
+        """
+        now = time.monotonic()
+        if now - self.checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        # Without an index yet (e.g. a worker forked while the master still builds it),
+        # wait for the default files: the .ann is the last one a build writes
+        current = self.current
+        ann_file, meta_file = (current.ann_file, current.meta_file) if current else (self.ann_file, self.meta_file)
+        if current is None and not os.path.exists(ann_file):
+            return
+        if file_versions(ann_file, meta_file) == self.version:
             return
+        if not self.reload_lock.acquire(blocking=False):
+            return  # another thread is already reloading
+        try:
+            if file_versions(ann_file, meta_file) != self.version:
+                self.swap_in(ann_file, meta_file)
+        except Exception as e:
+            logger.error(f"Reload of '{ann_file}' failed, still serving the previous index: {e}")
+        finally:
+            self.reload_lock.release()
 
+    def build_from_json(self):
         # Fallback: build from JSON
         logger.info(f"Precomputed files missing. Building index from JSON in '{self.json_folder}'...")
-        if not os.path.exists(self.json_folder):
-            logger.error(f"JSON folder '{self.json_folder}' not found.")
+        try:
+            if not os.path.exists(self.json_folder):
+                raise FileNotFoundError(f"JSON folder '{self.json_folder}' not found.")
+            # Decoded in this process: a pool would re-import this module in every worker
+            build_index(self.json_folder, self.ann_file, self.meta_file, n_trees=self.n_trees, workers=1)
+            self.reload()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            logger.error(f"Could not build the index: {self.error}")
+        finally:
+            # Also after a failure, so nothing waits forever; /status reports the error
             self.loading_complete.set()
-            return
 
-        hough_vectors = []
-        for filename in sorted(os.listdir(self.json_folder)):
-            if not filename.endswith('.json'):
-                continue
-            path = os.path.join(self.json_folder, filename)
-            try:
-                with open(path, 'r') as f:
-                    data = json.load(f)
-                for key, val in data.items():
-                    if 'hough_sinusoids' in val:
-                        arr = self.decode_base64_gzip(val['hough_sinusoids'])
-                        hough_vectors.append(arr.flatten().astype(np.float32))
-                        self.keys.append(key)
-                        self.metadata[key] = {'path': val.get('path',''), 'file': filename}
-            except Exception as e:
-                logger.warning(f"Skipping {filename}: {e}")
-
-        if not hough_vectors:
-            logger.error("No Hough data found in JSON files.")
-            self.loading_complete.set()
-            return
+    @property
+    def dim(self):
+        return self.current.dim if self.current else None
 
-        # Build the Annoy index
-        stacked = np.vstack(hough_vectors)
-        dim = stacked.shape[1]
-        self.index = AnnoyIndex(dim, metric='angular')
-        for i, vec in enumerate(stacked):
-            self.index.add_item(i, vec)
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(self.ann_file), exist_ok=True)
-        self.index.build(self.n_trees)
-        self.index.save(self.ann_file)
-
-        # Save metadata for future loads
-        meta = {'keys': self.keys, 'metadata': self.metadata, 'dim': dim}
-        with open(self.meta_file, 'wb') as f:
-            pickle.dump(meta, f)
-        logger.info(f"Built and saved index ({len(self.keys)} items, dim={dim}) to '{self.ann_file}' and metadata to '{self.meta_file}'")
+    def __len__(self):
+        return len(self.current) if self.current else 0
 
-        self.loading_complete.set()
+    def meta(self, key):
+        if self.current is None:
+            raise KeyError(key)
+        return self.current.meta(key)
+
+    def load_part(self, filename):
+        with open(os.path.join(self.json_folder, filename), 'r') as f:
+            return json.load(f)
 
-    def find_similar(self, query_array, top_k=10):
-        if not self.loading_complete.is_set():
+    def item(self, key):
+        """Stored record of one image: path plus its encoded edges and sinusoids (KeyError if unknown)"""
+        return self.parts.get_or_load(self.meta(key)['file'], self.load_part)[key]
+
+    def image_path(self, key):
+        # Paths were written on Windows, relative to the folder the server runs in
+        return os.path.normpath(self.meta(key)['path'].replace('\\', '/'))
+
+    def thumbnail(self, key, size=THUMBNAIL_SIZE):
+        """JPEG bytes of the image scaled to fit size x size, or None if it cannot be read"""
+        def render(cache_key):
+            img = imread_unicode(self.image_path(key))
+            if img is None:
+                return None
+            h, w = img.shape[:2]
+            scale = size / max(h, w)
+            if scale < 1:
+                img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+            return buf.tobytes() if ok else None
+        return self.thumbnails.get_or_load((key, size), render)
+
+    def find_similar(self, query_array, top_k=10, cached=True, **options):
+        """options: use_embedding, search_k, candidates (see HoughIndex.search).
+
+        cached=False skips the search cache, so bulk queries do not evict interactive ones.
+        """
+        current = self.current
+        if current is None:
             return []
-        q = query_array.flatten().astype(np.float32)
-        idxs, dists = self.index.get_nns_by_vector(q, top_k, include_distances=True)
-        results = []
-        for idx, dist in zip(idxs, dists):
-            key = self.keys[idx]
-            results.append({'key': key, 'distance': float(dist), 'path': self.metadata[key]['path'], 'file': self.metadata[key]['file']})
-        return results
 
-# Instantiate database
-HDB = HoughDatabase()
+        def search(cache_key=None):
+            q = query_array.flatten().astype(np.float32)
+            idxs, dists = current.search(q, top_k, **options)
+            return current.results(idxs, dists)
+        if not cached:
+            return search()
+        # Keyed by the index generation too, so a reload never serves old results
+        key = query_key(quantize(query_array, SEARCH_CACHE_STEP), top_k, sorted(options.items()), id(current))
+        return self.search_cache.get_or_load(key, search)
+
+    def find_similar_to_key(self, key, top_k=10, **options):
+        """Neighbors of an indexed image, read from the index itself; the image is left out"""
+        current = self.current
+        idxs, dists = current.search(None, top_k + 1, item=current.item_of(key), **options)
+        return current.results(idxs, dists, exclude=key)[:top_k]
+
+    def space(self, use_embedding=True):
+        return self.current.space(use_embedding) if self.current else None
+
+    def find_similar_batch(self, queries, top_k=10, workers=BATCH_WORKERS, **options):
+        """Yield (i, results) for every query, in input order, while later ones are still searched.
+
+        queries is an (N, dim) array (or anything whose rows flatten to dim values)
+        or a list of corpus keys. Unknown keys yield an {'error': ...} dict instead of results.
+        """
+        if self.current is None:
+            return
+
+        def search_one(query):
+            if isinstance(query, str):
+                try:
+                    return self.find_similar_to_key(query, top_k, **options)
+                except KeyError:
+                    return {'error': f"Unknown key '{query}'"}
+            return self.find_similar(np.asarray(query), top_k, cached=False, **options)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from enumerate(pool.map(search_one, queries))
+
+# Instantiate database, except in process-pool children: spawn imports the parent's
+# __main__ (this file, when run directly) again in each of them
+HDB = HoughDatabase() if multiprocessing.parent_process() is None else None
+
+@app.before_request
+def refresh_index():
+    HDB.refresh()
+
+def index_unavailable():
+    """503 while no index is loaded: still loading, or the build failed (see /status)"""
+    if HDB.loading_complete.is_set() and HDB.error:
+        return jsonify({'error': f"No index: {HDB.error}", 'status': 'error'}), 503
+    return jsonify({'error': 'Database still loading', 'status': 'loading'}), 503
 
 @app.route('/status')
 def status():
-    return jsonify({'loading_complete': HDB.loading_complete.is_set(), 'total_images': len(HDB.keys)})
+    return jsonify({'loading_complete': HDB.loading_complete.is_set(), 'error': HDB.error, 'total_images': len(HDB),
+                    'embedding_dims': HDB.current.embedding.dims if HDB.space() == 'embedding' else None,
+                    'reranking': HDB.current is not None and HDB.current.vectors is not None,
+                    'search_cache': HDB.search_cache.stats(),
+                    'part_cache': HDB.parts.stats(), 'thumbnail_cache': HDB.thumbnails.stats()})
+
+def decoded_array(encoded):
+    """gzip+base64 array -> {'shape', 'dtype', 'data'}: raw uint8 bytes, base64 only, nothing left to inflate"""
+    arr = HDB.decode_base64_gzip(encoded)
+    return {'shape': list(arr.shape), 'dtype': 'uint8', 'data': base64.b64encode(arr.tobytes()).decode('ascii')}
+
+def item_response(key):
+    try:
+        val = HDB.item(key)
+    except KeyError:
+        return jsonify({'error': f"Unknown key '{key}'"}), 404
+    item = {'key': key, 'path': val.get('path', ''), 'file': HDB.meta(key)['file'],
+            'total_images': len(HDB)}
+    for field in ('edges_downscaled', 'hough_sinusoids'):
+        if field in val:
+            item[field] = decoded_array(val[field])
+    return jsonify(item)
+
+@app.route('/item/<path:key>')
+def item(key):
+    """One image's decoded edges and sinusoids, so pages never download the part files"""
+    if HDB.current is None:
+        return index_unavailable()
+    return item_response(key)
+
+@app.route('/random')
+def random_item():
+    if HDB.current is None:
+        return index_unavailable()
+    current = HDB.current
+    if current is None or not len(current):
+        return jsonify({'error': 'No images indexed'}), 404
+    return item_response(current.random_key())
+
+@app.route('/thumbnail/<path:key>')
+def thumbnail(key):
+    if HDB.current is None:
+        return index_unavailable()
+    try:
+        HDB.meta(key)
+    except KeyError:
+        abort(404)
+    size = min(max(request.args.get('size', THUMBNAIL_SIZE, type=int), 16), MAX_THUMBNAIL_SIZE)
+    data = HDB.thumbnail(key, size)
+    if data is None:
+        abort(404)
+    response = app.response_class(data, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    response.add_etag()
+    return response.make_conditional(request)
+
+def parse_shape(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.replace('x', ',').split(',')
+    try:
+        shape = tuple(int(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Bad shape {value!r}, expected e.g. 180,180")
+    if not shape or any(v <= 0 for v in shape):
+        raise ValueError(f"Bad shape {shape}")
+    return shape
+
+def packed_array(buffer, shape):
+    """uint8 view of a packed buffer (no copy), checked against the shape and the index dimension"""
+    arr = np.frombuffer(buffer, dtype=np.uint8)
+    if shape is not None:
+        if int(np.prod(shape)) != arr.size:
+            raise ValueError(f"Shape {shape} does not match {arr.size} bytes")
+        arr = arr.reshape(shape)
+    if HDB.dim is not None and arr.size != HDB.dim:
+        raise ValueError(f"Query has {arr.size} values, the index expects {HDB.dim}")
+    return arr
+
+def parse_top_k(req, data=None):
+    """top_k from the JSON body or the query string: an integer in 1..MAX_TOP_K"""
+    value = data['top_k'] if isinstance(data, dict) and 'top_k' in data else req.args.get('top_k', 10)
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('top_k must be an integer')
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+    return top_k
+
+def search_options(req, data=None):
+    """Search parameters shared by /search and /search_batch, from the query string or the JSON body"""
+    def param(name, default):
+        if isinstance(data, dict) and name in data:
+            return data[name]
+        return req.args.get(name, default)
+    space = param('index', 'embedding')
+    if space not in ('embedding', 'raw'):
+        raise ValueError(f"index must be 'embedding' or 'raw', got {space!r}")
+    try:
+        search_k = int(param('search_k', -1))
+        candidates = int(param('candidates', CANDIDATES))
+    except (TypeError, ValueError):
+        raise ValueError('search_k and candidates must be integers')
+    if not 1 <= candidates <= MAX_CANDIDATES:
+        raise ValueError(f"candidates must be between 1 and {MAX_CANDIDATES}")
+    return {'use_embedding': space == 'embedding', 'search_k': search_k, 'candidates': candidates}
+
+def parse_query(req):
+    """(query array, top_k) from a /search request"""
+    if req.mimetype == 'application/octet-stream':
+        shape = parse_shape(req.headers.get('X-Hough-Shape') or req.args.get('shape'))
+        return packed_array(req.get_data(), shape), parse_top_k(req)
+
+    data = req.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError('Expected an application/octet-stream or JSON body')
+    top_k = parse_top_k(req, data)
+    if 'hough_b64' in data:
+        try:
+            buffer = base64.b64decode(data['hough_b64'], validate=True)
+        except (TypeError, ValueError):
+            raise ValueError('hough_b64 is not valid base64')
+        shape = parse_shape(data.get('shape') or req.headers.get('X-Hough-Shape') or req.args.get('shape'))
+        return packed_array(buffer, shape), top_k
+    if 'hough_data' in data:
+        try:
+            arr = np.array(data['hough_data'], dtype=np.uint8)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError('hough_data must be nested lists of integers 0-255')
+        if HDB.dim is not None and arr.size != HDB.dim:
+            raise ValueError(f"Query has {arr.size} values, the index expects {HDB.dim}")
+        return arr, top_k
+    raise ValueError('Missing hough_data or hough_b64')
 
 @app.route('/search', methods=['POST'])
 def search():
-    if not HDB.loading_complete.is_set():
-        return jsonify({'error': 'Database still loading'}), 503
-    data = request.get_json()
-    if 'hough_data' not in data:
-        return jsonify({'error': 'Missing hough_data'}), 400
-    query = np.array(data['hough_data'], dtype=np.uint8)
-    top_k = data.get('top_k', 10)
+    """Nearest images to one Hough array.
+
+    The query may come as
+      - a raw uint8 body (Content-Type: application/octet-stream), shape in the
+        X-Hough-Shape header or ?shape=180,180, top_k in ?top_k=
+      - JSON {"hough_b64": base64 of the packed uint8 array, "shape": [h, w], "top_k": k}
+      - JSON {"hough_data": nested lists, "top_k": k} (slow, kept for old pages)
+    index=raw (query string or JSON) searches the 32,400-dim vectors instead of
+    the PCA embedding, which is used whenever hough_embedding.py has built it.
+    search_k (Annoy nodes to inspect, -1 = default) and candidates (how many
+    times top_k to fetch for the exact re-rank, 1 = none) trade latency for recall.
+    """
+    if HDB.current is None:
+        return index_unavailable()
+    try:
+        query, top_k = parse_query(request)
+        options = search_options(request, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    start = time.time()
+    results = HDB.find_similar(query, top_k=top_k, **options)
+    elapsed = (time.time() - start) * 1000
+    return jsonify({'results': results, 'index': HDB.space(options['use_embedding']),
+                    'reranked': HDB.current.vectors is not None and options['candidates'] > 1,
+                    'search_time_ms': round(elapsed, 2)})
+
+def parse_batch(req):
+    """(queries, top_k) from a /search_batch request: packed (N, dim) uint8 rows or a list of keys"""
+    dim = HDB.dim
+    if req.mimetype == 'application/octet-stream':
+        buffer, top_k = req.get_data(), parse_top_k(req)
+    else:
+        data = req.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError('Expected an application/octet-stream or JSON body')
+        top_k = parse_top_k(req, data)
+        if 'keys' in data:
+            if not isinstance(data['keys'], list) or not all(isinstance(k, str) for k in data['keys']):
+                raise ValueError('keys must be a list of strings')
+            return data['keys'], top_k
+        if 'hough_b64' not in data:
+            raise ValueError('Missing keys or hough_b64')
+        try:
+            buffer = base64.b64decode(data['hough_b64'], validate=True)
+        except (TypeError, ValueError):
+            raise ValueError('hough_b64 is not valid base64')
+
+    if len(buffer) % dim:
+        raise ValueError(f"Body of {len(buffer)} bytes is not a whole number of {dim}-value queries")
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(-1, dim), top_k
+
+@app.route('/search_batch', methods=['POST'])
+def search_batch():
+    """Many queries at once, answered as NDJSON: one {"index", "key", "results"} line per query.
+
+    Body: packed uint8 queries (application/octet-stream, N * dim bytes, ?top_k=),
+    JSON {"hough_b64": ..., "top_k": k} with the same bytes, or JSON {"keys": [...]}
+    to search with images already in the index. The last line is a summary.
+    index, search_k and candidates work as on /search.
+    """
+    if HDB.current is None:
+        return index_unavailable()
+    try:
+        queries, top_k = parse_batch(request)
+        options = search_options(request, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        start = time.time()
+        count = 0
+        for i, results in HDB.find_similar_batch(queries, top_k=top_k, **options):
+            line = {'index': i, 'key': queries[i] if isinstance(queries, list) else None}
+            if isinstance(results, dict):
+                line.update(results)
+            else:
+                line['results'] = results
+            count += 1
+            yield json.dumps(line) + '\n'
+        elapsed = (time.time() - start) * 1000
+        yield json.dumps({'done': True, 'count': count, 'search_time_ms': round(elapsed, 2)}) + '\n'
+
+    return app.response_class(generate(), mimetype='application/x-ndjson')
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Swap in a rebuilt index without a restart: {"ann_file": ..., "meta_file": ...}, both optional.
+
+    Only answered for local clients. Rebuilt files under the current names are
+    picked up by every process without this call (see HoughDatabase.refresh);
+    other names only reach the process that answers.
+    """
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(403)
+    data = request.get_json(silent=True) or {}
+    ann_file = data.get('ann_file', HDB.ann_file)
+    meta_file = data.get('meta_file', HDB.meta_file)
+    if not (os.path.exists(ann_file) and os.path.exists(meta_file)):
+        return jsonify({'error': f"Missing '{ann_file}' or '{meta_file}'"}), 404
     start = time.time()
-    results = HDB.find_similar(query, top_k=top_k)
+    try:
+        new = HDB.reload(ann_file, meta_file)
+    except Exception as e:
+        logger.error(f"Reload failed, still serving the previous index: {e}")
+        return jsonify({'error': str(e)}), 500
     elapsed = (time.time() - start) * 1000
-    return jsonify({'results': results, 'search_time_ms': round(elapsed, 2)})
+    return jsonify({'total_images': len(new), 'dim': new.dim, 'ann_file': ann_file, 'reload_time_ms': round(elapsed, 2)})
 
 if __name__ == '__main__':
     print("Starting Hough Similarity Search Server with precomputed Annoy index on http://localhost:5000")
@@ -10,6 +10,7 @@ INPUT_FOLDER = './wikiart/'
 OUTPUT_DIR = './pickles_by_style/'
 NUM_WORKERS = 8
 RESIZE_FACTOR = 0.25  # More aggressive downscale to reduce memory use
+MAX_PIXELS = 2_000_000
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -57,6 +58,23 @@ def create_hough_sinusoids(edges, num_rho=180, num_theta=180):
     hough_vis = np.clip(hough_vis, 0, 255).astype(np.uint8)
     return hough_vis
 
+def compute_hough_data(gray):
+    """Edges, Hough accumulator and sinusoids of a grayscale image already limited to MAX_PIXELS"""
+    if RESIZE_FACTOR != 1.0:
+        gray = cv2.resize(gray, (0, 0), fx=RESIZE_FACTOR, fy=RESIZE_FACTOR, interpolation=cv2.INTER_AREA)
+
+    edges = canny_edge(gray)
+    acc = hough_find_lines3(gray, 180, 180, t=0.2)
+    acc = nonmaxima_suppression_box(acc)
+    sinusoids_vis = create_hough_sinusoids(edges, 180, 180)
+
+    return {
+        'shape': gray.shape,
+        'edges': edges.astype(np.uint8),
+        'accumulator': acc.astype(np.float32),
+        'sinusoids_vis': sinusoids_vis,
+    }
+
 def process_single_image(img_path, base_folder):
     original = imread_unicode(img_path)
     if original is None:
@@ -64,41 +82,22 @@ def process_single_image(img_path, base_folder):
         return None, img_path
 
     # Auto resize if very large
-    if original.shape[0] * original.shape[1] > 2_000_000:
-        scale = np.sqrt(2_000_000 / (original.shape[0] * original.shape[1]))
+    if original.shape[0] * original.shape[1] > MAX_PIXELS:
+        scale = np.sqrt(MAX_PIXELS / (original.shape[0] * original.shape[1]))
         original = cv2.resize(original, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
 
     gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
 
-    if RESIZE_FACTOR != 1.0:
-        gray = cv2.resize(gray, (0, 0), fx=RESIZE_FACTOR, fy=RESIZE_FACTOR, interpolation=cv2.INTER_AREA)
-
-    edges = canny_edge(gray)
-    acc = hough_find_lines3(gray, 180, 180, t=0.2)
-    acc = nonmaxima_suppression_box(acc)
-    sinusoids_vis = create_hough_sinusoids(edges, 180, 180)
-
     rel_path = os.path.relpath(img_path, base_folder)
     key = rel_path.replace(os.sep, '_')
 
-    data = {
-        'path': img_path,
-        'shape': gray.shape,
-        'edges': edges.astype(np.uint8),
-        'accumulator': acc.astype(np.float32),
-        'sinusoids_vis': sinusoids_vis,
-    }
+    data = {'path': img_path, **compute_hough_data(gray)}
     return key, data
 
 def process_style_folder(style_folder_path, max_workers=NUM_WORKERS):
     style_name = os.path.basename(style_folder_path)
     output_file = os.path.join(OUTPUT_DIR, f"hough_data_{style_name}.pkl")
 
-    # Skip if pickle file already exists
-    if os.path.exists(output_file):
-        print(f"Skipping '{style_name}' because pickle file already exists at {output_file}")
-        return
-
     print(f"\nProcessing style folder: {style_folder_path}")
     image_paths = [os.path.join(style_folder_path, f)
                    for f in os.listdir(style_folder_path)
@@ -124,11 +123,11 @@ def process_style_folder(style_folder_path, max_workers=NUM_WORKERS):
     print(f"Done processing style '{style_name}'.")
 
 def main():
-    style_folders = [os.path.join(INPUT_FOLDER, d) for d in os.listdir(INPUT_FOLDER)
-                     if os.path.isdir(os.path.join(INPUT_FOLDER, d))]
-
-    for style_folder in style_folders:
-        process_style_folder(style_folder, NUM_WORKERS)
+    # Only new or changed images are recomputed and merged into their style's pickle;
+    # images deleted from INPUT_FOLDER are pruned. process_style_folder() rebuilds one style.
+    from feature_extraction import HoughExtractor, find_images_recursive, run_extractors
+    image_files = find_images_recursive(INPUT_FOLDER)
+    run_extractors([HoughExtractor()], image_files, INPUT_FOLDER, NUM_WORKERS)
 
 if __name__ == "__main__":
     main()
@@ -5,6 +5,11 @@ import random
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider
 from pathlib import Path
+from functools import lru_cache
+
+from thumbnails import thumbnail_for
+
+TILE_SIZE = 256  # px on the longest side; a 12 inch figure of 10 x 10 cells needs ~120
 
 def load_data(mode='mean', dominant_k=3):
     """Load precomputed data from your original analysis"""
@@ -61,14 +66,18 @@ def create_instant_viewer(color_data, grid_size=10):
         
         # Update display
         for (i, j), (_, path) in grid_matches.items():
-            img = cv2.imread(path)
+            img = load_tile(path)
             if img is not None:
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
                 axes[i][j].imshow(img, aspect='auto')
         
         plt.suptitle(f"Hue: {int(hue_value)}°", y=0.95)
         plt.draw()
     
+    @lru_cache(maxsize=1024)
+    def load_tile(path):
+        img = cv2.imread(thumbnail_for(path, TILE_SIZE))
+        return None if img is None else cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
     # Add slider
     ax_slider = plt.axes([0.2, 0.02, 0.6, 0.03])
     hue_slider = Slider(ax_slider, 'Hue', 0, 179, valinit=120)
@@ -9,6 +9,8 @@ from collections import defaultdict
 from threading import Thread
 from queue import Queue
 
+from thumbnails import thumbnail_for
+
 class HSLColorPicker:
     def __init__(self, root, pickle_path="pickles/mean_colors.pkl", grid_size=16, bucket_granularity=16):
         self.root = root
@@ -45,7 +47,8 @@ class HSLColorPicker:
                 
             cell_id, path, size = task
             try:
-                img = Image.open(path)
+                # fit() crops the longer side away, so ask for twice the cell on the longest side
+                img = Image.open(thumbnail_for(path, size * 2))
                 img = ImageOps.fit(img, (size, size), method=Image.LANCZOS)
                 photo = ImageTk.PhotoImage(img)
                 self.root.after(0, self._update_cell, cell_id, photo)
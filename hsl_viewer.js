@@ -4,6 +4,8 @@ const hueValue = document.getElementById('hueValue');
 
 const GRID_SIZE = 16;
 const BUCKET_GRANULARITY = 16;
+// Tiles are 60 CSS px: they load a thumbnail from main.py instead of the full painting
+const TILE_PIXELS = Math.round(60 * (window.devicePixelRatio || 1));
 
 const JSON_FILES = [
   'Abstract_Expressionism.json', 'Art_Nouveau_Modern.json', 'Baroque.json',
@@ -105,6 +107,10 @@ function findClosestImage(targetH, targetS, targetL) {
   return candidates[Math.floor(Math.random() * candidates.length)];
 }
 
+function thumbnailUrl(imagePath, size) {
+  return `/thumbnail/${imagePath.replace(/^\.?\/?wikiart\//, '')}?size=${size}`;
+}
+
 function createTile(imagePath) {
   const div = document.createElement('div');
   div.className = 'tile';
@@ -114,7 +120,7 @@ function createTile(imagePath) {
 
   if (imagePath) {
     const img = document.createElement('img');
-    img.src = imagePath;
+    img.src = thumbnailUrl(imagePath, TILE_PIXELS);
     div.appendChild(img);
   }
 
@@ -0,0 +1,12 @@
+import cv2
+import numpy as np
+
+
+def imread_unicode(path):
+    """Decode an image as BGR; works with non-ASCII paths on every platform"""
+    try:
+        img_array = np.fromfile(path, np.uint8)
+        return cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None
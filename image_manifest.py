@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+
+MANIFEST_DIR = os.path.join("pickles", "manifests")
+
+# sha1 per (path, mtime_ns, size), shared by every manifest in this process
+_hash_cache = {}
+
+
+def file_signature(img_path):
+    """Cheap per-file signature: [mtime_ns, size]"""
+    st = os.stat(img_path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def content_hash(img_path, signature):
+    """sha1 of the file contents, computed at most once per file version"""
+    key = (img_path, *signature)
+    if key not in _hash_cache:
+        h = hashlib.sha1()
+        with open(img_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _hash_cache[key] = h.hexdigest()
+    return _hash_cache[key]
+
+
+def scan_signatures(image_files, folder_path):
+    """{rel_path: (img_path, signature)} for every image that can be stat'ed"""
+    current = {}
+    for img_path in image_files:
+        try:
+            current[os.path.relpath(img_path, folder_path)] = (img_path, file_signature(img_path))
+        except OSError:
+            continue
+    return current
+
+
+class ImageManifest:
+    """Which version of every image is already reflected in one feature store.
+
+    Entries are keyed by path relative to the image folder and hold
+    [mtime_ns, size] plus, with use_hash, the sha1 of the contents. With hashing
+    a file whose mtime changed but whose bytes did not (copied, touched,
+    re-synced) is not recomputed.
+    """
+
+    def __init__(self, name, use_hash=False, manifest_dir=MANIFEST_DIR):
+        self.name = name
+        self.use_hash = use_hash
+        self.path = os.path.join(manifest_dir, f"{name}.json")
+        self.entries = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if self.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def entry(self, img_path, signature):
+        if self.use_hash:
+            return [*signature, content_hash(img_path, signature)]
+        return list(signature)
+
+    def is_current(self, rel_path, img_path, signature):
+        old = self.entries.get(rel_path)
+        if old is None:
+            return False
+        if old[:2] == list(signature):
+            return True
+        # Same size, different mtime: only the content hash can tell
+        if self.use_hash and len(old) > 2 and old[1] == signature[1]:
+            return old[2] == content_hash(img_path, signature)
+        return False
+
+    def diff(self, current):
+        """Split the current scan ({rel_path: (img_path, signature)}) into (stale, removed) rel_paths"""
+        stale = set()
+        for rel_path, (img_path, signature) in current.items():
+            if not self.is_current(rel_path, img_path, signature):
+                stale.add(rel_path)
+            elif self.entries[rel_path][:2] != list(signature):
+                # Unchanged content under a new mtime: refresh so the next scan is cheap again
+                self.mark(rel_path, img_path, signature)
+        removed = set(self.entries) - set(current)
+        return stale, removed
+
+    def mark(self, rel_path, img_path, signature):
+        self.entries[rel_path] = self.entry(img_path, signature)
+
+    def forget(self, rel_path):
+        self.entries.pop(rel_path, None)
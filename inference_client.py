@@ -0,0 +1,116 @@
+import io
+import os
+import json
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+# Must match inference_server.py
+SERVER_URL = "http://127.0.0.1:5055"
+TIMEOUT = 600  # seconds; the first request to a model may wait for it to load
+
+
+class InferenceServerError(RuntimeError):
+    pass
+
+
+class InferenceImageError(InferenceServerError):
+    """The server could not process one image of a batch; the others have results"""
+
+
+class InferenceClient:
+    """Talks to inference_server.py, which keeps the pose, face and object models loaded.
+
+    Images are sent either as paths (the server reads them itself, nothing is
+    copied) or as decoded BGR arrays packed into one .npz body.
+    """
+
+    def __init__(self, url=SERVER_URL, timeout=TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, route, body=None, content_type=None, timeout=None):
+        req = urllib.request.Request(self.url + route, data=body)
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or self.timeout) as resp:
+                return json.loads(resp.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            raise InferenceServerError(f"{route}: {e.read().decode('utf-8', 'replace')[:200]}") from e
+        except urllib.error.URLError as e:
+            raise InferenceServerError(f"Inference server not reachable at {self.url} "
+                                       f"(start it with: python inference_server.py)") from e
+
+    def status(self):
+        return self._request('/status', timeout=5)
+
+    def available(self):
+        try:
+            self.status()
+            return True
+        except InferenceServerError:
+            return False
+
+    def infer(self, model, images):
+        """Run a model ('pose', 'face' or 'objects') on a list of image paths or BGR arrays.
+
+        Returns one output per image. An image the server failed on gets an
+        InferenceImageError instance instead of an output, so the rest of the batch is kept.
+        """
+        if not images:
+            return []
+        if all(isinstance(img, str) for img in images):
+            body = json.dumps({'paths': [os.path.abspath(p) for p in images]}).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            buffer = io.BytesIO()
+            np.savez(buffer, *[np.ascontiguousarray(img, dtype=np.uint8) for img in images])
+            body, content_type = buffer.getvalue(), 'application/octet-stream'
+        response = self._request(f'/infer/{model}', body, content_type)
+        results = response['results']
+        for error in response.get('errors', []):
+            results[error['index']] = InferenceImageError(f"{model} failed on image {error['index']}: {error['error']}")
+        return results
+
+
+def _landmark_results(landmarks):
+    """Server pose output -> object shaped like a MediaPipe Pose result"""
+    if not landmarks:
+        return SimpleNamespace(pose_landmarks=None)
+    return SimpleNamespace(pose_landmarks=SimpleNamespace(
+        landmark=[SimpleNamespace(**lm) for lm in landmarks]))
+
+
+class RemotePose:
+    """Drop-in for mp.solutions.pose.Pose(static_image_mode=True): process(rgb) runs on the server"""
+
+    def __init__(self, url=SERVER_URL):
+        self.client = InferenceClient(url)
+
+    def process(self, rgb_img):
+        bgr = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2BGR)
+        output = self.client.infer('pose', [bgr])[0]
+        if isinstance(output, InferenceImageError):
+            raise output
+        return _landmark_results(output)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pose_detector(server=None, min_detection_confidence=0.5):
+    """MediaPipe Pose for still images: remote when a server URL is given, else loaded here"""
+    if server:
+        return RemotePose(server)
+    import mediapipe as mp
+    return mp.solutions.pose.Pose(static_image_mode=True, min_detection_confidence=min_detection_confidence)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import io
+import time
+import queue
+import logging
+import argparse
+import threading
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+from flask import Flask, request, jsonify
+
+from image_io import imread_unicode
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Local only: clients pass file paths, so the server must see the same disk
+HOST = '127.0.0.1'
+PORT = 5055
+MAX_BATCH = 16      # images per model call
+MAX_WAIT_MS = 5     # how long a batch waits for requests from other clients to join it
+
+app = Flask(__name__)
+
+
+# ---------------- Models (imported lazily, each loads only in its own queue thread) ----------------
+
+def load_pose():
+    from pose_detection import create_pose_detector
+    return create_pose_detector()
+
+
+def run_pose(pose, images):
+    from pose_detection import detect_pose_landmarks
+    return [_guarded(detect_pose_landmarks, pose, cv2.cvtColor(img, cv2.COLOR_BGR2RGB)) for img in images]
+
+
+def load_face():
+    from face_detection import analyze_face
+    # DeepFace builds its detector and emotion model on first use
+    analyze_face(np.zeros((64, 64, 3), dtype=np.uint8))
+    return analyze_face
+
+
+def run_face(analyze_face, images):
+    return [_guarded(analyze_face, img) for img in images]
+
+
+def load_objects():
+    from object_scale import load_model
+    return load_model()
+
+
+def run_objects(model, images):
+    # YOLO runs the whole batch in one predict call
+    from object_scale import detect_objects_batch
+    return detect_objects_batch(model, images)
+
+
+def _guarded(fn, *args):
+    """Per-image call whose exception is returned, so one bad image does not fail its batch"""
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+MODELS = {
+    'pose': (load_pose, run_pose),
+    'face': (load_face, run_face),
+    'objects': (load_objects, run_objects),
+}
+
+
+class ModelQueue:
+    """One warm model behind a queue; concurrent requests are coalesced into batches.
+
+    A single thread owns the model (MediaPipe and TensorFlow objects are not
+    shared across threads). It takes the first waiting image, then keeps
+    collecting images from any client for up to MAX_WAIT_MS or until MAX_BATCH,
+    and answers every image's Future from one model call.
+    """
+
+    def __init__(self, name, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.name = name
+        self.load, self.run = MODELS[name]
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.loaded = threading.Event()
+        self.error = None
+        self.batches = 0
+        self.images = 0
+        self.busy_seconds = 0.0
+        threading.Thread(target=self._loop, name=f"model-{name}", daemon=True).start()
+
+    def submit(self, images):
+        futures = [Future() for _ in images]
+        for img, future in zip(images, futures):
+            self.queue.put((img, future))
+        return futures
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        start = time.perf_counter()
+        try:
+            model = self.load()
+            logger.info(f"Loaded {self.name} model in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            logger.error(f"Could not load {self.name} model: {self.error}")
+            model = None
+        self.loaded.set()
+
+        while True:
+            batch = self._next_batch()
+            if model is None:
+                for _, future in batch:
+                    future.set_exception(RuntimeError(self.error))
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = self.run(model, [img for img, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.images += len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def status(self):
+        return {
+            'loaded': self.loaded.is_set() and self.error is None,
+            'error': self.error,
+            'queued': self.queue.qsize(),
+            'batches': self.batches,
+            'images': self.images,
+            'mean_batch': round(self.images / self.batches, 2) if self.batches else 0,
+            'images_per_second': round(self.images / self.busy_seconds, 2) if self.busy_seconds else 0,
+        }
+
+
+queues = {}
+
+
+def to_jsonable(value):
+    """Model outputs contain numpy scalars and tuples; make them JSON-safe"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def read_images(req):
+    """Images of a request: JSON {"paths": [...]} or an .npz body of BGR uint8 arrays.
+
+    An unreadable path is None in the list; a malformed body raises ValueError.
+    """
+    if req.is_json:
+        return [imread_unicode(path) for path in req.get_json().get('paths', [])]
+    with np.load(io.BytesIO(req.get_data()), allow_pickle=False) as npz:
+        images = [npz[f'arr_{i}'] for i in range(len(npz.files))]
+    for img in images:
+        if img.dtype != np.uint8 or img.ndim != 3 or img.shape[2] != 3:
+            raise ValueError(f"Expected HxWx3 uint8 BGR images, got {img.dtype} {img.shape}")
+    return images
+
+
+@app.route('/status')
+def status():
+    return jsonify({name: q.status() for name, q in queues.items()})
+
+
+@app.route('/infer/<model>', methods=['POST'])
+def infer(model):
+    if model not in queues:
+        return jsonify({'error': f"Unknown model '{model}', serving {sorted(queues)}"}), 404
+    try:
+        images = read_images(request)
+    except (ValueError, OSError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    # One bad image must not cost the rest of the batch: it gets None in results
+    # and an entry in errors, and the response is still a 200
+    results, errors = [None] * len(images), []
+    readable = [i for i, img in enumerate(images) if img is not None]
+    for i in range(len(images)):
+        if images[i] is None:
+            errors.append({'index': i, 'error': 'Could not read image'})
+    for i, future in zip(readable, queues[model].submit([images[i] for i in readable])):
+        try:
+            results[i] = to_jsonable(future.result())
+        except Exception as e:
+            errors.append({'index': i, 'error': str(e)[:200]})
+    return jsonify({'results': results, 'errors': sorted(errors, key=lambda e: e['index'])})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep pose, face and object models warm for local clients')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS),
+                        help='Models to load and serve')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH,
+                        help='Largest batch handed to a model')
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help='How long a batch waits to coalesce requests from other clients')
+    args = parser.parse_args()
+
+    for name in args.models:
+        queues[name] = ModelQueue(name, args.max_batch, args.max_wait_ms)
+    app.run(host=HOST, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
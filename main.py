@@ -1,13 +1,46 @@
 import subprocess
 import os
-from flask import Flask, send_from_directory, jsonify, abort, render_template_string
+import json
+import threading
+from flask import Flask, send_file, send_from_directory, jsonify, abort, render_template_string, request
 
 app = Flask(__name__, static_folder='.')
 
+HISTOGRAM_CHUNKS_DIR = 'histogram_chunks'
+CHUNK_CACHE_SECONDS = 365 * 24 * 3600  # chunk URLs carry their content hash (?v=<sha1>)
+THUMBNAIL_CACHE_SECONDS = 86400
+
+# Where the pages find the Hough and pose APIs (/services.js); serve.py mounts both under this app
+SERVICES = {'hough': 'http://localhost:5000', 'poses': 'http://localhost:7000'}
+
+# {file name: sha1} from histogram_chunks/manifest.json, reloaded when the manifest changes
+_chunk_hashes = {}
+_chunk_manifest_mtime = None
+_chunk_lock = threading.Lock()
+
+# Approximate color-histogram index, memory-mapped on first use
+_histogram_ann = None
+_histogram_ann_lock = threading.Lock()
+
+def histogram_ann():
+    global _histogram_ann
+    with _histogram_ann_lock:
+        if _histogram_ann is None:
+            from histogram_search import HistogramAnnIndex
+            _histogram_ann = HistogramAnnIndex()
+    return _histogram_ann
+
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
+@app.route('/services.js')
+def services_js():
+    services = app.config.get('SERVICES', SERVICES)
+    response = app.response_class(f"window.SERVICES = {json.dumps(services)};\n", mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/run-faces')
 def run_faces():
     print("Running detected_faces_viewer.py")
@@ -64,6 +97,101 @@ def details_index():
 
     return html
 
+def valid_histogram(histogram, dim):
+    """A list of dim non-negative numbers"""
+    return (isinstance(histogram, list) and len(histogram) == dim
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0 for v in histogram))
+
+@app.route('/api/similar-colors', methods=['GET', 'POST'])
+def similar_colors():
+    """Paintings with the most similar color histogram (Hellinger distance, approximate).
+
+    GET  ?key=<relative image path>&k=10
+    POST {"histogram": [512 floats], "k": 10}
+    """
+    from histogram_search import HistogramAnnIndex
+    if not HistogramAnnIndex.exists():
+        return jsonify({'error': 'Histogram index not built, run: python histogram_search.py --build-ann'}), 503
+    ann = histogram_ann()
+
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    if not hasattr(params, 'get'):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    try:
+        k = min(int(params.get('k', 10)), 1000)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k must be an integer'}), 400
+
+    key = params.get('key')
+    if key is not None:
+        if key not in ann.positions:
+            return jsonify({'error': f'Unknown image {key}'}), 404
+        query, exclude = ann.histogram(key), [key]
+    elif valid_histogram(params.get('histogram'), ann.dim):
+        query, exclude = params['histogram'], None
+    else:
+        return jsonify({'error': f'Give a key or a {ann.dim}-bin histogram'}), 400
+
+    results = ann.search(query, k, exclude=exclude)
+    return jsonify({'results': [{'key': key, 'path': path, 'distance': round(float(distance), 6)}
+                                for key, path, distance in results]})
+
+def chunk_hashes():
+    global _chunk_hashes, _chunk_manifest_mtime
+    manifest_path = os.path.join(HISTOGRAM_CHUNKS_DIR, 'manifest.json')
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        return {}
+    with _chunk_lock:
+        if mtime != _chunk_manifest_mtime:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            _chunk_hashes = {entry['file']: entry['sha1'] for chunk in manifest['chunks']
+                             for entry in (chunk.get('index'), chunk.get('data')) if entry}
+            _chunk_manifest_mtime = mtime
+    return _chunk_hashes
+
+@app.route('/histogram_chunks/<path:filename>')
+def serve_histogram_chunk(filename):
+    """Histogram chunks with content ETags, conditional requests and byte ranges.
+
+    The manifest is always revalidated. A chunk requested as ?v=<its sha1> can only
+    ever have that content, so it is cached for good; otherwise the sha1 ETag
+    lets the browser revalidate it with a 304.
+    """
+    if filename == 'manifest.json':
+        response = send_from_directory(HISTOGRAM_CHUNKS_DIR, filename, max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    sha1 = chunk_hashes().get(filename)
+    if sha1 is None:
+        return send_from_directory(HISTOGRAM_CHUNKS_DIR, filename)
+    immutable = request.args.get('v') == sha1
+    response = send_from_directory(HISTOGRAM_CHUNKS_DIR, filename, etag=sha1,
+                                   max_age=CHUNK_CACHE_SECONDS if immutable else 0)
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={CHUNK_CACHE_SECONDS}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/thumbnail/<path:filename>')
+def serve_thumbnail(filename):
+    """WebP thumbnail of wikiart/<filename>, ?size= px on the longest side (default 256).
+
+    Served from the thumbnails.py pyramid (the closest size at or above the request),
+    or resized on the spot and kept for the next request.
+    """
+    from thumbnails import thumbnail_file, PYRAMID_SIZES, MAX_SIZE
+    size = min(max(request.args.get('size', PYRAMID_SIZES[1], type=int), 1), MAX_SIZE)
+    path = thumbnail_file(filename, size)
+    if path is None:
+        abort(404)
+    # Absolute: send_file resolves relative paths against the app's root
+    return send_file(os.path.abspath(path), mimetype='image/webp', max_age=THUMBNAIL_CACHE_SECONDS)
+
 # Static file serving as before
 @app.route('/ratio/<path:filename>')
 def serve_ratio(filename):
@@ -20,11 +20,12 @@ No files are written.
 import os
 import cv2
 import math
+import argparse
 from pathlib import Path
 from typing import List, Tuple, Optional
 
 from tqdm import tqdm
-import mediapipe as mp
+from inference_client import pose_detector
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -91,14 +92,17 @@ def clip_bbox_to_image(
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", default=None, metavar="URL",
+                        help="Run pose detection on a running inference_server.py instead of loading MediaPipe")
+    args = parser.parse_args()
     images = find_images_recursive(FOLDER_PATH)
     if not images:
         print(f"No images found under: {FOLDER_PATH}")
         return
 
     # Init single-person pose detector (same as your program)
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+    pose = pose_detector(args.server, min_detection_confidence=0.5)
 
     # Global minima trackers: (value, img_path)
     min_w   = (float("inf"), "")
@@ -18,12 +18,13 @@ We print per-image thresholds and global minima. No files saved.
 import os
 import cv2
 import math
+import argparse
 import numpy as np
 from pathlib import Path
 from typing import Tuple, Optional, List, Dict
 
 from tqdm import tqdm
-import mediapipe as mp
+from inference_client import pose_detector
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -185,9 +186,12 @@ def search_limit(img_bgr: np.ndarray, pose, mode: str) -> Optional[Dict[str, flo
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", default=None, metavar="URL",
+                        help="Run pose detection on a running inference_server.py instead of loading MediaPipe")
+    args = parser.parse_args()
     # Init detector (single-person, like your code)
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=DET_MIN_CONF)
+    pose = pose_detector(args.server, min_detection_confidence=DET_MIN_CONF)
 
     images = find_images_recursive(FOLDER_PATH)
     if not images:
@@ -11,14 +11,14 @@ Flow:
 4) Print and (optionally) visualize.
 
 Usage:
-  python pose_limit_test.py /path/to/standing_man.jpg [--show]
+  python pose_limit_test.py /path/to/standing_man.jpg [--show] [--server URL]
 """
 
 import sys, os, math, cv2, numpy as np, warnings
 warnings.filterwarnings("ignore")
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
 
-import mediapipe as mp
+from inference_client import pose_detector
 
 # -------------------- Tunables --------------------
 MIN_LANDMARKS_REQUIRED = 3
@@ -103,18 +103,18 @@ def draw_bbox(img, bbox, label=""):
 
 def main():
     if len(sys.argv)<2:
-        print("Usage: python pose_limit_test.py <image_path> [--show]")
+        print("Usage: python pose_limit_test.py <image_path> [--show] [--server URL]")
         sys.exit(1)
     image_path = sys.argv[1]
     show_flag = ("--show" in sys.argv)
+    server = sys.argv[sys.argv.index("--server") + 1] if "--server" in sys.argv[:-1] else None
 
     img = cv2.imread(image_path)
     if img is None or img.size==0:
         sys.exit(f"Could not read {image_path}")
 
     H0,W0 = img.shape[:2]
-    pose = mp.solutions.pose.Pose(static_image_mode=True,
-                                  min_detection_confidence=DET_MIN_CONF)
+    pose = pose_detector(server, min_detection_confidence=DET_MIN_CONF)
 
     # Detect original
     bbox0 = detect_pose_bbox(img, pose)
@@ -22,12 +22,13 @@ Usage:
 import os
 import cv2
 import math
+import argparse
 import numpy as np
 from pathlib import Path
 from typing import List, Tuple, Optional
 
 from tqdm import tqdm
-import mediapipe as mp
+from inference_client import pose_detector
 import warnings
 warnings.filterwarnings("ignore")
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")  # quieter TF logs
@@ -209,13 +210,16 @@ def summarize(name: str, values_pct: List[float]):
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", default=None, metavar="URL",
+                        help="Run pose detection on a running inference_server.py instead of loading MediaPipe")
+    args = parser.parse_args()
     images = find_images_recursive(FOLDER_PATH)
     if not images:
         print(f"No images found under: {FOLDER_PATH}")
         return
 
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=DET_MIN_CONF)
+    pose = pose_detector(args.server, min_detection_confidence=DET_MIN_CONF)
 
     all_area_percentages: List[float] = []
     poses_processed = 0
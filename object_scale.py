@@ -1,12 +1,11 @@
 import cv2
 import os
+import argparse
+import numpy as np
 import matplotlib.pyplot as plt
-from tqdm import tqdm
-import torch
-from ultralytics import YOLO
 import warnings
 import pickle
-from pathlib import Path
+from feature_store import write_store_for_pickle
 
 # 🔇 SILENCE EVERYTHING
 warnings.filterwarnings("ignore")
@@ -17,6 +16,8 @@ PICKLE_DIR = "pickles"
 RATIO_PICKLE_FILE = os.path.join(PICKLE_DIR, "ratio_results.pkl")
 DETAILS_PICKLE_FILE = os.path.join(PICKLE_DIR, "details_results.pkl")
 FOLDER_PATH = './wikiart/'
+NUM_WORKERS = 1  # > 1 runs detection on a process pool, one YOLO model per worker
+IMG_SIZE = 640  # YOLO input size
 
 # Ensure pickle directory exists
 os.makedirs(PICKLE_DIR, exist_ok=True)
@@ -30,76 +31,106 @@ def find_images_recursive(root_folder):
                 image_files.append(os.path.join(dirpath, filename))
     return image_files
 
-def process_images(model, image_files, folder_path):
-    """Process all images and return detection results"""
-    all_ratios = {}
-    image_details = {}
-    
-    for img_path in tqdm(image_files, desc="Scanning Images", unit="img"):
+def load_model():
+    """Load the first available YOLO model"""
+    from ultralytics import YOLO
+    for model_name in ['yolov9c.pt', 'yolov8x.pt']:
         try:
-            img = cv2.imread(img_path)
-            if img is None: 
-                continue
-
-            results = model.predict(
-                img,
-                imgsz=640,
-                conf=0.4,
-                iou=0.45,
-                device='0' if torch.cuda.is_available() else 'cpu',
-                verbose=False
-            )
-
-            h, w = img.shape[:2]
-            img_area = h * w
-            rel_path = os.path.relpath(img_path, folder_path)
-            
-            # Initialize entry for this image
-            image_details[rel_path] = {
-                'detections': [],
-                'img_shape': img.shape,
-                'img_area': img_area,
-                'img_path': img_path
-            }
-            
-            for box in results[0].boxes:
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id]
-                conf = float(box.conf[0])
-                
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                box_area = (x2 - x1) * (y2 - y1)
-                ratio = min(100, int((box_area / img_area) * 100))
-                
-                # Update ratio statistics
-                if class_name not in all_ratios:
-                    all_ratios[class_name] = {}
-                if ratio not in all_ratios[class_name]:
-                    all_ratios[class_name][ratio] = []
-                all_ratios[class_name][ratio].append(rel_path)
-                
-                # Store detailed detection info
-                detection = {
-                    'class_id': class_id,
-                    'class_name': class_name,
-                    'confidence': conf,
-                    'box_coords': (x1, y1, x2, y2),
-                    'box_area': box_area,
-                    'ratio': ratio,
-                    'normalized_ratio': box_area / img_area
-                }
-                image_details[rel_path]['detections'].append(detection)
-
-        except Exception as e:
-            print(f"\n⚠️ Error in {img_path}: {str(e)[:50]}...")
-    
-    return all_ratios, image_details
+            model = YOLO(model_name)
+            print(f"🔥 Loaded {model_name} successfully!")
+            return model
+        except:
+            continue
+    raise FileNotFoundError("No YOLO models found!")
+
+def predict(model, images):
+    """One model.predict call over an image or a list of equally sized images"""
+    import torch
+    return model.predict(
+        images,
+        imgsz=IMG_SIZE,
+        conf=0.4,
+        iou=0.45,
+        device='0' if torch.cuda.is_available() else 'cpu',
+        verbose=False
+    )
+
+def letterbox(img, size=IMG_SIZE):
+    """Resize keeping the aspect ratio and pad to size x size (YOLO gray border)
+
+    Returns the padded image, the scale and the (left, top) padding needed to
+    map boxes back to the original image.
+    """
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    new_h, new_w = round(h * scale), round(w * scale)
+    if (new_h, new_w) != (h, w):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    padded = np.full((size, size, 3), 114, dtype=np.uint8)
+    padded[top:top + new_h, left:left + new_w] = img
+    return padded, scale, (left, top)
+
+def detect_objects_batch(model, images):
+    """Run YOLO once over a batch of decoded BGR images, one detection list per image"""
+    if not images:
+        return []
+    boxed = [letterbox(img) for img in images]
+    results = predict(model, [padded for padded, _, _ in boxed])
+    return [boxes_to_detections(model, result.boxes, img.shape, scale, pad)
+            for img, (_, scale, pad), result in zip(images, boxed, results)]
+
+def boxes_to_detections(model, boxes, img_shape, scale=1.0, pad=(0, 0)):
+    """Detection list of one image; boxes of a letterboxed input are mapped back to the original"""
+    h, w = img_shape[:2]
+    img_area = h * w
+    detections = []
+    for box in boxes:
+        class_id = int(box.cls[0])
+        x1, y1, x2, y2 = box.xyxy[0].tolist()
+        x1, x2 = (min(max((x - pad[0]) / scale, 0), w) for x in (x1, x2))
+        y1, y2 = (min(max((y - pad[1]) / scale, 0), h) for y in (y1, y2))
+        x1, y1, x2, y2 = map(int, (x1, y1, x2, y2))
+        box_area = (x2 - x1) * (y2 - y1)
+        detections.append({
+            'class_id': class_id,
+            'class_name': model.names[class_id],
+            'confidence': float(box.conf[0]),
+            'box_coords': (x1, y1, x2, y2),
+            'box_area': box_area,
+            'ratio': min(100, int((box_area / img_area) * 100)),
+            'normalized_ratio': box_area / img_area
+        })
+    return detections
+
+def image_entry(img_path, img_shape, detections):
+    """Details record of one image"""
+    return {
+        'detections': detections,
+        'img_shape': img_shape,
+        'img_area': img_shape[0] * img_shape[1],
+        'img_path': img_path
+    }
+
+def add_ratios(all_ratios, rel_path, detections):
+    """Update ratio statistics (class -> ratio -> [rel_path]) with one image's detections"""
+    for detection in detections:
+        by_ratio = all_ratios.setdefault(detection['class_name'], {})
+        by_ratio.setdefault(detection['ratio'], []).append(rel_path)
+
+def ratios_from_details(image_details):
+    """Rebuild the ratio statistics from the per-image details"""
+    all_ratios = {}
+    for rel_path, details in image_details.items():
+        add_ratios(all_ratios, rel_path, details['detections'])
+    return all_ratios
 
 def save_results(data, filename):
     """Save results to pickle file"""
     with open(filename, 'wb') as f:
         pickle.dump(data, f)
     print(f"✅ Saved results to {filename}")
+    write_store_for_pickle(filename, data)
 
 def load_results(filename):
     """Load results from pickle file"""
@@ -141,32 +172,24 @@ def visualize_results(all_ratios, image_details):
     plt.grid(True, alpha=0.3)
     plt.show()
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Detect objects and their relative size in the wikiart collection')
+    parser.add_argument('--batch-size', type=int, default=8,
+                        help='Images per YOLO call; tune for throughput (img/s is reported at the end)')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                        help='Worker processes, one YOLO model each (batching applies to 1 worker only)')
+    parser.add_argument('--server', default=None, metavar='URL',
+                        help='Use the warm model of a running inference_server.py instead of loading YOLO')
+    return parser.parse_args()
+
 def main():
-    # Check for existing results
-    if Path(RATIO_PICKLE_FILE).exists() and Path(DETAILS_PICKLE_FILE).exists():
-        print(f"🔍 Found existing results files")
-        all_ratios = load_results(RATIO_PICKLE_FILE)
-        image_details = load_results(DETAILS_PICKLE_FILE)
-    else:
-        # Load model
-        model = None
-        for model_name in ['yolov9c.pt', 'yolov8x.pt']:
-            try:
-                model = YOLO(model_name)
-                print(f"🔥 Loaded {model_name} successfully!")
-                break
-            except:
-                continue
-        if model is None:
-            raise FileNotFoundError("No YOLO models found!")
-
-        # Process images
-        image_files = find_images_recursive(FOLDER_PATH)
-        all_ratios, image_details = process_images(model, image_files, FOLDER_PATH)
-        
-        # Save both result types
-        save_results(all_ratios, RATIO_PICKLE_FILE)
-        save_results(image_details, DETAILS_PICKLE_FILE)
+    args = parse_arguments()
+    # Process only new or changed images and merge them into the existing results
+    from feature_extraction import ObjectExtractor, run_extractors
+    image_files = find_images_recursive(FOLDER_PATH)
+    extractor = ObjectExtractor(batch_size=args.batch_size, server=args.server)
+    run_extractors([extractor], image_files, FOLDER_PATH, args.workers)
+    all_ratios, image_details = load_results(RATIO_PICKLE_FILE), load_results(DETAILS_PICKLE_FILE)
     
     # Output results
     print_summary(all_ratios)
@@ -1,10 +1,8 @@
-import cv2
 import os
 import pickle
-from pathlib import Path
-from tqdm import tqdm
-import mediapipe as mp
+import argparse
 import warnings
+from feature_store import write_store_for_pickle
 
 # 🔇 Silence warnings
 warnings.filterwarnings("ignore")
@@ -12,6 +10,7 @@ warnings.filterwarnings("ignore")
 # Constants
 POSE_PICKLE_FILE = "./pickles/pose_results.pkl"
 FOLDER_PATH = './wikiart/'  # Change to your image folder
+NUM_WORKERS = 1  # > 1 runs detection on a process pool, one Pose model per worker
 
 def find_images_recursive(root_folder):
     """Recursively find all image files in directory"""
@@ -22,53 +21,35 @@ def find_images_recursive(root_folder):
                 image_files.append(os.path.join(dirpath, filename))
     return image_files
 
-def process_images_for_poses(image_files, folder_path):
-    """Process all images and return pose detection results"""
-    pose_results = {}
-    
-    # Initialize MediaPipe Pose
+def create_pose_detector():
+    """Initialize MediaPipe Pose for still images"""
+    import mediapipe as mp
     mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
-    
-    for img_path in tqdm(image_files, desc="Detecting Poses", unit="img"):
-        try:
-            img = cv2.imread(img_path)
-            if img is None:
-                continue
-                
-            # Convert to RGB and process
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb_img)
-            
-            rel_path = os.path.relpath(img_path, folder_path)
-            
-            if results.pose_landmarks:
-                # Store normalized landmark coordinates (0-1 scale)
-                landmarks = []
-                for landmark in results.pose_landmarks.landmark:
-                    landmarks.append({
-                        'x': landmark.x,
-                        'y': landmark.y,
-                        'z': landmark.z,
-                        'visibility': landmark.visibility
-                    })
-                
-                pose_results[rel_path] = {
-                    'landmarks': landmarks,
-                    'img_path': img_path,
-                    'img_shape': img.shape
-                }
-                
-        except Exception as e:
-            print(f"\n⚠️ Error in {img_path}: {str(e)[:50]}...")
-    
-    return pose_results
+    return mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+
+def detect_pose_landmarks(pose, rgb_img):
+    """Run pose detection on an RGB image, return normalized landmarks or None"""
+    results = pose.process(rgb_img)
+    if not results.pose_landmarks:
+        return None
+
+    # Store normalized landmark coordinates (0-1 scale)
+    landmarks = []
+    for landmark in results.pose_landmarks.landmark:
+        landmarks.append({
+            'x': landmark.x,
+            'y': landmark.y,
+            'z': landmark.z,
+            'visibility': landmark.visibility
+        })
+    return landmarks
 
 def save_results(data, filename):
     """Save results to pickle file"""
     with open(filename, 'wb') as f:
         pickle.dump(data, f)
     print(f"✅ Saved pose results to {filename}")
+    write_store_for_pickle(filename, data)
 
 def load_results(filename):
     """Load results from pickle file"""
@@ -81,16 +62,24 @@ def print_summary(pose_results):
     print(f"Total images processed: {len(pose_results)}")
     print(f"Images with poses detected: {sum(1 for v in pose_results.values() if v['landmarks'])}")
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Detect human poses in the wikiart collection')
+    parser.add_argument('--server', default=None, metavar='URL',
+                        help='Use the warm model of a running inference_server.py instead of loading MediaPipe')
+    parser.add_argument('--batch-size', type=int, default=8,
+                        help='Images per request to the inference server')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                        help='Worker processes, one Pose model each (batching applies to 1 worker only)')
+    return parser.parse_args()
+
 def main():
-    # Check for existing results
-    if Path(POSE_PICKLE_FILE).exists():
-        print(f"🔍 Found existing results file")
-        pose_results = load_results(POSE_PICKLE_FILE)
-    else:
-        # Process images
-        image_files = find_images_recursive(FOLDER_PATH)
-        pose_results = process_images_for_poses(image_files, FOLDER_PATH)
-        save_results(pose_results, POSE_PICKLE_FILE)
+    args = parse_arguments()
+    # Process only new or changed images and merge them into the existing results
+    from feature_extraction import PoseExtractor, run_extractors
+    image_files = find_images_recursive(FOLDER_PATH)
+    extractor = PoseExtractor(server=args.server, batch_size=args.batch_size if args.server else 1)
+    run_extractors([extractor], image_files, FOLDER_PATH, args.workers)
+    pose_results = load_results(POSE_PICKLE_FILE)
     
     # Output results
     print_summary(pose_results)
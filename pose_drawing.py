@@ -0,0 +1,22 @@
+import cv2
+
+# Landmark index pairs of the MediaPipe pose skeleton (same as mp.solutions.pose.POSE_CONNECTIONS),
+# kept here so drawing does not need the mediapipe import
+POSE_CONNECTIONS = [
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32)
+]
+
+
+def draw_landmarks(image, landmarks, color=(0, 255, 0), thickness=2):
+    """Draw a landmark list (normalized dicts) onto a BGR image in place"""
+    h, w = image.shape[:2]
+    points = [(int(lm['x'] * w), int(lm['y'] * h)) for lm in landmarks]
+    for start, end in POSE_CONNECTIONS:
+        cv2.line(image, points[start], points[end], color, thickness)
+    for point in points:
+        cv2.circle(image, point, thickness + 1, (0, 0, 255), -1)
+    return image
@@ -0,0 +1,84 @@
+import numpy as np
+
+# Directional queries widen their k-nearest search by this factor until a pose in the cone turns up
+DIRECTION_START_K = 16
+DIRECTION_GROWTH = 4
+
+
+class PoseSpace:
+    """KD-tree over the 2D UMAP embedding of the poses, built once per embedding.
+
+    Nearest and k-nearest lookups are O(log N); row i of the embedding is pose i.
+    scipy comes with scikit-learn / umap-learn and is only imported when an index is built.
+    """
+
+    def __init__(self, embedding):
+        from scipy.spatial import cKDTree
+
+        self.points = np.asarray(embedding, dtype=np.float64).reshape(-1, 2)
+        self.tree = cKDTree(self.points) if len(self.points) else None
+
+    def __len__(self):
+        return len(self.points)
+
+    def knn(self, point, k):
+        """(rows, distances) of the k poses closest to point, nearest first"""
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        distances, rows = self.tree.query(np.asarray(point, dtype=np.float64), k=k)
+        return np.atleast_1d(rows).astype(np.int64), np.atleast_1d(distances)
+
+    def nearest(self, point):
+        """(row, distance) of the closest pose, or (None, None) for an empty space"""
+        rows, distances = self.knn(point, 1)
+        if not len(rows):
+            return None, None
+        return int(rows[0]), float(distances[0])
+
+    def in_direction(self, origin, direction, max_angle=30.0, max_distance=None, exclude=None):
+        """Closest pose inside the cone from origin along direction (half-angle max_angle degrees).
+
+        Returns (row, distance) or (None, None). exclude is a row to skip, usually the
+        pose at origin. Fetches k nearest neighbours and grows k until one lies in
+        the cone, so it is only as slow as the cone is empty.
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        length = np.linalg.norm(direction)
+        if length == 0 or not len(self):
+            return None, None
+        direction = direction / length
+        min_cos = np.cos(np.radians(max_angle))
+
+        k = DIRECTION_START_K
+        while True:
+            rows, distances = self.knn(origin, k)
+            offsets = self.points[rows] - origin
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cos = offsets @ direction / distances
+            inside = (distances > 0) & (cos >= min_cos)
+            if exclude is not None:
+                inside &= rows != exclude
+            if max_distance is not None:
+                inside &= distances <= max_distance
+            if inside.any():
+                first = int(np.argmax(inside))
+                return int(rows[first]), float(distances[first])
+            if len(rows) == len(self) or (max_distance is not None and distances[-1] > max_distance):
+                return None, None
+            k *= DIRECTION_GROWTH
+
+    def in_bbox(self, x_min, y_min, x_max, y_max):
+        """Rows of the poses inside the box (edges included), in row order"""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        low = np.array([min(x_min, x_max), min(y_min, y_max)])
+        high = np.array([max(x_min, x_max), max(y_min, y_max)])
+        # The tree answers squares (Chebyshev balls); trim the covering square to the box
+        center, half = (low + high) / 2, (high - low) / 2
+        rows = np.array(self.tree.query_ball_point(center, r=float(half.max()), p=np.inf), dtype=np.int64)
+        if len(rows):
+            points = self.points[rows]
+            rows = rows[np.all((points >= low) & (points <= high), axis=1)]
+        return np.sort(rows)
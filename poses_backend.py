@@ -1,17 +1,42 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, jsonify, send_file, send_from_directory, request
 from flask_cors import CORS
 import os
 import cv2
 import numpy as np
+import json
 import pickle
-import base64
+import threading
 from pathlib import Path
+from urllib.parse import quote
+
+from feature_store import pose_columns, LANDMARK_FIELDS
+from pose_space import PoseSpace
+from pose_drawing import draw_landmarks
+from thumbnails import thumbnail_file, MAX_SIZE as MAX_THUMBNAIL_SIZE
+from query_cache import QueryCache, quantize, query_key
 
 # Constants from poses_viewer.py
 POSE_RESULTS_FILE = "./pickles/pose_results.pkl"
 UMAP_CACHE_FILE = "./pickles/umap_cache.pkl"
 IMAGE_DIR = "./wikiart/"  # Base directory for images
 
+# Hover lookups: points closer than NEAREST_CACHE_STEP (UMAP units) share one answer
+NEAREST_CACHE_STEP = 0.01
+nearest_cache = QueryCache(max_items=8192, ttl_seconds=600)
+MAX_NEIGHBORS = 500     # k limit of /api/nearest-poses
+MAX_BOX_RESULTS = 5000  # default limit of /api/poses-in-box
+
+# Rendered /api/pose-image overlays; safe to delete, they are drawn again on demand
+OVERLAY_CACHE_DIR = "./pickles/pose_overlays"
+OVERLAY_WIDTH = 1024
+MIN_OVERLAY_WIDTH, MAX_OVERLAY_WIDTH = 64, 2048
+OVERLAY_WIDTH_STEP = 64  # bounds the number of cached sizes per pose
+OVERLAY_CACHE_SECONDS = 86400
+OVERLAY_FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg', [cv2.IMWRITE_JPEG_QUALITY, 85]),
+    'webp': ('.webp', 'image/webp', [cv2.IMWRITE_WEBP_QUALITY, 85]),
+}
+
 app = Flask(__name__, static_folder='.')
 CORS(app)
 
@@ -19,252 +44,375 @@ def load_results(filename):
     """Load results from pickle file"""
     with open(filename, 'rb') as f:
         return pickle.load(f)
-        
-def load_umap_cache():
-    """Load UMAP embedding data from cache"""
-    if not os.path.exists(UMAP_CACHE_FILE):
-        return None
-    with open(UMAP_CACHE_FILE, 'rb') as f:
-        return pickle.load(f)
+
+def normalize_id(pose_id):
+    """Case- and separator-insensitive form of a pose ID, without './'"""
+    pose_id = pose_id.replace('\\', '/').lower()
+    while pose_id.startswith('./'):
+        pose_id = pose_id[2:]
+    return pose_id.strip('/')
+
+IMAGE_PREFIX = normalize_id(IMAGE_DIR) + '/'
+
+class PoseIdIndex:
+    """Resolves every accepted form of a pose ID to a row with dict lookups, built once per load.
+
+    Accepted forms, tried in order: the key itself, the key normalized (case, slashes, './'),
+    the path relative to IMAGE_DIR, and a trailing run of path components
+    ('style/image.jpg', 'image.jpg'), longest first. A suffix shared by several poses
+    resolves to the first of them in sorted key order, and all of them are reported.
+    """
+    def __init__(self, keys):
+        self.keys = keys
+        self.exact = {key: i for i, key in enumerate(keys)}
+        self.full = {}
+        self.suffixes = {}
+        # Sorted order makes every ambiguous list, and so every answer, independent of load order
+        for i in sorted(range(len(keys)), key=lambda i: keys[i]):
+            full = normalize_id(keys[i])
+            self.full.setdefault(full, i)
+            parts = self.relative(full).split('/')
+            for start in range(len(parts)):
+                self.suffixes.setdefault('/'.join(parts[start:]), []).append(i)
+
+    @staticmethod
+    def relative(normalized):
+        return normalized[len(IMAGE_PREFIX):] if normalized.startswith(IMAGE_PREFIX) else normalized
+
+    def resolve(self, pose_id):
+        """(row, matching keys) for pose_id, or (None, []) when nothing matches"""
+        if pose_id in self.exact:
+            return self.exact[pose_id], [pose_id]
+        full = normalize_id(pose_id)
+        if full in self.full:
+            i = self.full[full]
+            return i, [self.keys[i]]
+        parts = self.relative(full).split('/')
+        for start in range(len(parts)):
+            rows = self.suffixes.get('/'.join(parts[start:]))
+            if rows:
+                return rows[0], [self.keys[i] for i in rows]
+        return None, []
+
+class PoseData:
+    """Detected poses as arrays: landmarks (N, 33, 4) float32 [x, y, z, visibility], row i = keys[i]"""
+    def __init__(self, pose_results):
+        keys, columns, _ = pose_columns(pose_results)
+        self.keys = keys
+        self.ids = PoseIdIndex(keys)
+        self.landmarks = columns['landmarks']
+        self.img_paths = [p.decode('utf-8') for p in columns['img_path']]
+        self._json = None
+
+    def landmark_dicts(self, i):
+        return [dict(zip(LANDMARK_FIELDS, lm)) for lm in self.landmarks[i].tolist()]
+
+    def to_json(self):
+        """/api/poses body, serialized once per load"""
+        if self._json is None:
+            self._json = json.dumps({key: {'img_path': self.img_paths[i], 'landmarks': self.landmark_dicts(i)}
+                                     for i, key in enumerate(self.keys)})
+        return self._json
+
+class UmapData:
+    """2D UMAP embedding of the poses: embedding (N, 2) float32, row i = keys[i], with its KD-tree"""
+    def __init__(self, cache_data):
+        self.embedding = np.asarray(cache_data['embedding'], dtype=np.float32)
+        self.keys = [str(k) for k in cache_data['keys']]
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.space = PoseSpace(self.embedding)
+        self._json = None
+
+    def point(self, row, distance=None):
+        result = {'pose_id': self.keys[row], 'embedding': self.embedding[row].tolist()}
+        if distance is not None:
+            result['distance'] = distance
+        return result
+
+    def to_json(self):
+        if self._json is None:
+            self._json = json.dumps({'embedding': self.embedding.tolist(), 'keys': self.keys})
+        return self._json
+
+class ResidentStore:
+    """A pickle loaded into memory once and loaded again only when the file's mtime changes"""
+    def __init__(self, path, convert):
+        self.path = path
+        self.convert = convert
+        self.mtime = None
+        self.data = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Current data, or None while the file does not exist"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime != self.mtime:
+            with self.lock:
+                if mtime != self.mtime:
+                    try:
+                        self.data = self.convert(load_results(self.path))
+                        print(f"Loaded {self.path}")
+                    except Exception as e:
+                        # Most likely still being written; keep serving the previous data
+                        # and try again only once the file changes
+                        print(f"ERROR: Could not load {self.path}: {e}")
+                    self.mtime = mtime
+        return self.data
+
+pose_store = ResidentStore(POSE_RESULTS_FILE, PoseData)
+umap_store = ResidentStore(UMAP_CACHE_FILE, UmapData)
+
+def json_response(body):
+    return app.response_class(body, mimetype='application/json')
 
 @app.route('/api/poses')
 def get_poses():
     """Return pose data for all images"""
-    if not os.path.exists(POSE_RESULTS_FILE):
+    poses = pose_store.get()
+    if poses is None:
         return jsonify({"error": "Pose data not found"}), 404
-    
-    pose_results = load_results(POSE_RESULTS_FILE)
-    
-    # Filter for successful pose detections and convert to serializable format
-    valid_poses = {}
-    for key, data in pose_results.items():
-        if data.get('landmarks'):
-            valid_poses[key] = {
-                'img_path': data['img_path'],
-                'landmarks': [
-                    {
-                        'x': lm['x'], 
-                        'y': lm['y'], 
-                        'z': lm['z'], 
-                        'visibility': float(lm['visibility'])
-                    } for lm in data['landmarks']
-                ]
-            }
-    
-    return jsonify(valid_poses)
+    return json_response(poses.to_json())
 
 @app.route('/api/umap')
 def get_umap():
     """Return UMAP embedding data"""
-    cache_data = load_umap_cache()
-    if not cache_data:
+    umap_data = umap_store.get()
+    if umap_data is None:
         return jsonify({"error": "UMAP data not found"}), 404
-    
-    # Convert numpy arrays to lists for JSON serialization
-    return jsonify({
-        'embedding': cache_data['embedding'].tolist(),
-        'keys': cache_data['keys'].tolist()
-    })
+    return json_response(umap_data.to_json())
 
 @app.route('/api/pose/<path:pose_id>')
 def get_single_pose(pose_id):
     """Get data for a specific pose"""
-    if not os.path.exists(POSE_RESULTS_FILE):
+    poses = pose_store.get()
+    if poses is None:
         return jsonify({"error": "Pose data not found"}), 404
-    
-    pose_results = load_results(POSE_RESULTS_FILE)
-    
-    # Normalize path for better matching
-    pose_id = pose_id.replace('\\', '/')
-    
-    # First try exact match
-    if pose_id in pose_results:
-        pass # Use exact match
-    else:
-        # Try with IMAGE_DIR prefix
-        alt_id = os.path.join(IMAGE_DIR, pose_id).replace('\\', '/')
-        if alt_id in pose_results:
-            pose_id = alt_id
-        else:
-            # Try more flexible matching
-            pose_id_norm = pose_id.lower()
-            for key in pose_results.keys():
-                key_norm = key.lower().replace('\\', '/')
-                if key_norm.endswith(pose_id_norm) or os.path.basename(key_norm) == os.path.basename(pose_id_norm):
-                    pose_id = key
-                    break
-    
-    if pose_id in pose_results and pose_results[pose_id].get('landmarks'):
-        pose_data = pose_results[pose_id]
-        return jsonify({
-            'img_path': pose_data['img_path'],
-            'landmarks': pose_data['landmarks']
-        })
-    else:
+
+    i, matches = poses.ids.resolve(pose_id)
+    if i is None:
         return jsonify({"error": "Pose not found"}), 404
+    result = {
+        'img_path': poses.img_paths[i],
+        'landmarks': poses.landmark_dicts(i)
+    }
+    if len(matches) > 1:
+        result['ambiguous_matches'] = matches
+    return jsonify(result)
+
+def find_image_file(pose_id, img_path):
+    """The painting's file: img_path, or where it most likely is under IMAGE_DIR; None if missing"""
+    if os.path.exists(img_path):
+        return img_path
+    print(f"ERROR: Image file not found at: {img_path}")
+
+    # Try options to find the actual image file
+    possible_paths = [
+        os.path.join(IMAGE_DIR, os.path.basename(img_path)),  # Just the filename in IMAGE_DIR
+        os.path.join(IMAGE_DIR, pose_id)  # Use pose_id as relative path
+    ]
+
+    # Extract style and artist from pose_id if possible
+    parts = pose_id.split('/')
+    if len(parts) >= 2:
+        style = parts[-2]
+        # Try standard pattern: style/artist_title.jpg
+        possible_paths.append(os.path.join(IMAGE_DIR, style, os.path.basename(img_path)))
+
+    for path in possible_paths:
+        if os.path.exists(path):
+            print(f"Found image at: {path}")
+            return path
+    return None
+
+def render_overlay(img_path, landmarks, width, fmt, output_file):
+    """Draw the pose skeleton on the painting, scaled down to width, and write it atomically"""
+    img = cv2.imread(img_path)
+    if img is None:
+        return False
+    h, w = img.shape[:2]
+    if w > width:
+        img = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    draw_landmarks(img, landmarks, thickness=max(2, img.shape[1] // 400))
+    ok, buffer = cv2.imencode(OVERLAY_FORMATS[fmt][0], img, OVERLAY_FORMATS[fmt][2])
+    if not ok:
+        return False
+    os.makedirs(OVERLAY_CACHE_DIR, exist_ok=True)
+    # Unique temporary name: two requests may render the same overlay at once
+    tmp_file = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(buffer.tobytes())
+    os.replace(tmp_file, output_file)
+    return True
+
+def overlay_options():
+    """(width, format) of an overlay request; widths are rounded up to OVERLAY_WIDTH_STEP"""
+    width = request.args.get('width', OVERLAY_WIDTH, type=int)
+    width = min(max(width, MIN_OVERLAY_WIDTH), MAX_OVERLAY_WIDTH)
+    width = -(-width // OVERLAY_WIDTH_STEP) * OVERLAY_WIDTH_STEP
+    fmt = request.args.get('format')
+    if fmt not in OVERLAY_FORMATS:
+        fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+    return width, fmt
 
 @app.route('/api/pose-image/<path:pose_id>')
 def get_pose_image(pose_id):
-    """Return a rendered image of the pose with landmarks"""
-    if not os.path.exists(POSE_RESULTS_FILE):
+    """The painting with its pose skeleton drawn on, as an image (?width=, ?format=jpeg|webp).
+
+    Overlays are rendered once per pose, width and format into OVERLAY_CACHE_DIR and
+    named by a hash that also covers the landmarks and the painting's mtime, which
+    doubles as the ETag: a replaced painting gets a new overlay.
+    """
+    poses = pose_store.get()
+    if poses is None:
         print(f"ERROR: Pose results file not found: {POSE_RESULTS_FILE}")
         return jsonify({"error": "Pose data file not found"}), 404
-    
-    pose_results = load_results(POSE_RESULTS_FILE)
-    
-    # Debug info
-    print(f"Looking for pose ID: {pose_id}")
-    
-    # Normalize path for better matching (convert backslashes to forward slashes)
-    pose_id = pose_id.replace('\\', '/')
-    
-    # First try exact match
-    if pose_id in pose_results:
-        pose_data = pose_results[pose_id]
-    else:
-        # Try with IMAGE_DIR prefix
-        alt_id = os.path.join(IMAGE_DIR, pose_id).replace('\\', '/')
-        if alt_id in pose_results:
-            pose_id = alt_id
-            print(f"Found using alternative ID with IMAGE_DIR prefix: {pose_id}")
-        else:
-            # Try a more flexible matching approach - look for partial matches
-            possible_matches = []
-            pose_id_norm = pose_id.lower()  # Case-insensitive matching
-            
-            for key in pose_results.keys():
-                key_norm = key.lower().replace('\\', '/')
-                
-                # Check if the key ends with our pose_id (file path ending)
-                if key_norm.endswith(pose_id_norm):
-                    possible_matches.append(key)
-                # Also check if pose_id contains the filename from the key
-                elif os.path.basename(key_norm) == os.path.basename(pose_id_norm):
-                    possible_matches.append(key)
-            
-            # If we found exactly one match, use it
-            if len(possible_matches) == 1:
-                pose_id = possible_matches[0]
-                print(f"Found using flexible matching: {pose_id}")
-            # If multiple matches, try to find the best one
-            elif len(possible_matches) > 1:
-                # Prefer keys that contain more of the original pose_id path components
-                path_parts = pose_id.split('/')
-                best_match = None
-                best_score = 0
-                
-                for match in possible_matches:
-                    score = sum(1 for part in path_parts if part in match)
-                    if score > best_score:
-                        best_score = score
-                        best_match = match
-                
-                if best_match:
-                    pose_id = best_match
-                    print(f"Found best match from multiple: {pose_id} (score: {best_score})")
-                else:
-                    # Fall back to first match
-                    pose_id = possible_matches[0]
-                    print(f"Found using first of multiple matches: {pose_id}")
-    
-    # Final check if we found a valid pose
-    if pose_id not in pose_results or not pose_results[pose_id].get('landmarks'):
+
+    i, matches = poses.ids.resolve(pose_id)
+    if i is None:
         print(f"ERROR: No valid pose found for: {pose_id}")
         return jsonify({"error": f"Pose not found: {pose_id}"}), 404
-    
-    pose_data = pose_results[pose_id]
-    img_path = pose_data['img_path']
-    
-    print(f"Found pose, image path: {img_path}")
-    
+    if len(matches) > 1:
+        print(f"Ambiguous pose ID {pose_id}: {len(matches)} matches, using {matches[0]}")
+
+    img_path = find_image_file(poses.keys[i].replace('\\', '/'), poses.img_paths[i])
+    if img_path is None:
+        return jsonify({"error": f"Could not locate image file"}), 404
+
+    width, fmt = overlay_options()
+    etag = query_key(poses.keys[i], width, fmt, poses.landmarks[i], os.path.getmtime(img_path))
+    extension, mimetype, _ = OVERLAY_FORMATS[fmt]
+    # Absolute: send_file would resolve a relative path against the app's root, not the working directory
+    output_file = os.path.abspath(os.path.join(OVERLAY_CACHE_DIR, etag + extension))
+
     try:
-        # Check if the image exists at the specified path
-        if not os.path.exists(img_path):
-            print(f"ERROR: Image file not found at: {img_path}")
-            
-            # Try options to find the actual image file
-            possible_paths = [
-                img_path,  # Original path
-                os.path.join(IMAGE_DIR, os.path.basename(img_path)),  # Just the filename in IMAGE_DIR
-                os.path.join(IMAGE_DIR, pose_id)  # Use pose_id as relative path
-            ]
-            
-            # Extract style and artist from pose_id if possible
-            parts = pose_id.split('/')
-            if len(parts) >= 2:
-                style = parts[-2]
-                # Try standard pattern: style/artist_title.jpg
-                possible_paths.append(os.path.join(IMAGE_DIR, style, os.path.basename(img_path)))
-            
-            # Try all possible paths
-            for path in possible_paths:
-                if os.path.exists(path):
-                    img_path = path
-                    print(f"Found image at: {img_path}")
-                    break
-        
-        # Still couldn't find the image
-        if not os.path.exists(img_path):
-            return jsonify({"error": f"Could not locate image file"}), 404
-        
-        # Read the image
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"ERROR: Could not read image: {img_path}")
-            return jsonify({"error": f"Could not read image: {img_path}"}), 404
-        
-        # Draw pose landmarks on the image
-        h, w = img.shape[:2]
-        for landmark in pose_data['landmarks']:
-            x, y = int(landmark['x'] * w), int(landmark['y'] * h)
-            if 0 <= x < w and 0 <= y < h:
-                cv2.circle(img, (x, y), 5, (0, 255, 0), -1)
-        
-        # Convert image to base64 for transmission
-        _, buffer = cv2.imencode('.jpg', img)
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        return jsonify({
-            'image_data': f"data:image/jpeg;base64,{img_base64}"
-        })
+        if not os.path.exists(output_file):
+            if not render_overlay(img_path, poses.landmark_dicts(i), width, fmt, output_file):
+                print(f"ERROR: Could not read image: {img_path}")
+                return jsonify({"error": f"Could not read image: {img_path}"}), 404
+
+        response = send_file(output_file, mimetype=mimetype, etag=etag, max_age=OVERLAY_CACHE_SECONDS)
+        response.headers['X-Pose-Id'] = quote(poses.keys[i])
+        if len(matches) > 1:
+            response.headers['X-Pose-Matches'] = str(len(matches))
+        if 'format' not in request.args:
+            response.vary.add('Accept')
+        return response
     except Exception as e:
         print(f"ERROR processing image: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"Error processing image: {str(e)}"}), 500
 
+def find_nearest_pose(x, y):
+    """Nearest pose in UMAP space to (x, y), or None without UMAP data"""
+    umap_data = umap_store.get()
+    if umap_data is None:
+        return None
+
+    row, _ = umap_data.space.nearest((x, y))
+    if row is None:
+        return None
+    return umap_data.point(row)
+
 @app.route('/api/nearest-pose')
 def get_nearest_pose():
     """Find nearest pose in UMAP space to given coordinates"""
     try:
         x = float(request.args.get('x', 0))
         y = float(request.args.get('y', 0))
-        
-        cache_data = load_umap_cache()
-        if not cache_data:
+
+        if umap_store.get() is None:
+            return jsonify({"error": "UMAP data not found"}), 404
+        # A reloaded UMAP cache changes the key, so stale answers are never served
+        key = query_key(quantize((x, y), NEAREST_CACHE_STEP), umap_store.mtime)
+        result = nearest_cache.get_or_load(key, lambda _: find_nearest_pose(x, y))
+        if result is None:
             return jsonify({"error": "UMAP data not found"}), 404
-        
-        embedding = cache_data['embedding']
-        keys = cache_data['keys']
-        
-        # Find closest point in embedding space
-        query_point = np.array([x, y])
-        distances = np.linalg.norm(embedding - query_point, axis=1)
-        nearest_idx = np.argmin(distances)
-        
-        nearest_key = keys[nearest_idx]
-        
-        return jsonify({
-            'pose_id': nearest_key,
-            'embedding': embedding[nearest_idx].tolist()
-        })
+        return jsonify(result)
     except Exception as e:
         return jsonify({"error": f"Error finding nearest pose: {str(e)}"}), 500
 
+@app.route('/api/nearest-poses')
+def get_nearest_poses():
+    """The k poses closest to (x, y) in UMAP space, nearest first"""
+    umap_data = umap_store.get()
+    if umap_data is None:
+        return jsonify({"error": "UMAP data not found"}), 404
+    try:
+        x, y = float(request.args['x']), float(request.args['y'])
+        k = min(int(request.args.get('k', 10)), MAX_NEIGHBORS)
+    except (KeyError, ValueError):
+        return jsonify({"error": "Expected numeric x, y and optional k"}), 400
+    rows, distances = umap_data.space.knn((x, y), k)
+    return jsonify({'poses': [umap_data.point(r, d) for r, d in zip(rows.tolist(), distances.tolist())]})
+
+@app.route('/api/next-pose')
+def get_next_pose():
+    """Closest pose in a direction: from pose_id (or x, y) along (dx, dy) within +-angle degrees"""
+    umap_data = umap_store.get()
+    if umap_data is None:
+        return jsonify({"error": "UMAP data not found"}), 404
+    pose_id = request.args.get('pose_id')
+    try:
+        if pose_id is not None:
+            if pose_id not in umap_data.positions:
+                return jsonify({"error": f"Pose not found: {pose_id}"}), 404
+            exclude = umap_data.positions[pose_id]
+            origin = umap_data.embedding[exclude]
+        else:
+            exclude = None
+            origin = (float(request.args['x']), float(request.args['y']))
+        direction = (float(request.args['dx']), float(request.args['dy']))
+        angle = float(request.args.get('angle', 30))
+        max_distance = float(request.args['max_distance']) if 'max_distance' in request.args else None
+    except (KeyError, ValueError):
+        return jsonify({"error": "Expected pose_id or numeric x, y, and numeric dx, dy"}), 400
+    row, distance = umap_data.space.in_direction(origin, direction, angle, max_distance, exclude)
+    if row is None:
+        return jsonify({"error": "No pose in that direction"}), 404
+    return jsonify(umap_data.point(row, distance))
+
+@app.route('/api/poses-in-box')
+def get_poses_in_box():
+    """Poses whose UMAP point lies in the viewport box [x0, x1] x [y0, y1]"""
+    umap_data = umap_store.get()
+    if umap_data is None:
+        return jsonify({"error": "UMAP data not found"}), 404
+    try:
+        box = [float(request.args[name]) for name in ('x0', 'y0', 'x1', 'y1')]
+        limit = int(request.args.get('limit', MAX_BOX_RESULTS))
+    except (KeyError, ValueError):
+        return jsonify({"error": "Expected numeric x0, y0, x1, y1 and optional limit"}), 400
+    rows = umap_data.space.in_bbox(*box)
+    return jsonify({
+        'total': len(rows),
+        'poses': [umap_data.point(r) for r in rows[:max(limit, 0)].tolist()],
+    })
+
+@app.route('/status')
+def status():
+    poses, umap_data = pose_store.get(), umap_store.get()
+    return jsonify({
+        'poses': len(poses.keys) if poses else 0,
+        'poses_mtime': pose_store.mtime,
+        'umap_points': len(umap_data.keys) if umap_data else 0,
+        'umap_mtime': umap_store.mtime,
+        'nearest_cache': nearest_cache.stats(),
+    })
+
 @app.route('/images/<path:filename>')
 def serve_image(filename):
-    """Serve image files from the wikiart directory"""
-    return send_from_directory(IMAGE_DIR, filename)
+    """Serve image files from the wikiart directory; with ?size= a WebP thumbnail of them"""
+    size = request.args.get('size', type=int)
+    if not size:
+        return send_from_directory(IMAGE_DIR, filename)
+    path = thumbnail_file(filename, min(max(size, 1), MAX_THUMBNAIL_SIZE), IMAGE_DIR)
+    if path is None:
+        return jsonify({"error": f"Image not found: {filename}"}), 404
+    return send_file(os.path.abspath(path), mimetype='image/webp', max_age=OVERLAY_CACHE_SECONDS)
 
 @app.route('/')
 def index():
@@ -273,6 +421,7 @@ def index():
 
 if __name__ == '__main__':
     print("Starting Poses API Server...")
-    print(f"Pose data: {os.path.exists(POSE_RESULTS_FILE)}")
-    print(f"UMAP data: {os.path.exists(UMAP_CACHE_FILE)}")
+    # Load both once up front; requests only reload them after the files change
+    print(f"Pose data: {pose_store.get() is not None}")
+    print(f"UMAP data: {umap_store.get() is not None}")
     app.run(debug=True, port=7000)
\ No newline at end of file
@@ -8,6 +8,8 @@ from matplotlib.backends.backend_agg import FigureCanvasAgg
 import mediapipe as mp
 import os
 
+from pose_space import PoseSpace
+
 # Initialize MediaPipe
 mp_pose = mp.solutions.pose
 
@@ -205,17 +207,18 @@ def draw_pose(image, landmarks):
     
     return cv2.addWeighted(image, 0.7, overlay, 0.3, 0)
 
-def find_next_pose(embedding, current_idx, direction, step_size=0.5):
+def find_next_pose(space, current_idx, direction, step_size=0.5):
     """Find next pose in the specified direction"""
-    target_point = embedding[current_idx] + direction * step_size
-    distances = np.linalg.norm(embedding - target_point, axis=1)
-    distances[current_idx] = np.inf
-    return np.argmin(distances)
+    target_point = space.points[current_idx] + direction * step_size
+    # The current pose may itself be the closest to the target: take two
+    rows, _ = space.knn(target_point, 2)
+    return next((int(r) for r in rows if r != current_idx), current_idx)
 
 def display_pose_sequence():
     """Display pose sequence with fixed sizes"""
     pose_results = load_results(POSE_RESULTS_FILE)
     embedding, keys, valid_poses = prepare_umap_data(pose_results)
+    space = PoseSpace(embedding)
     current_idx = np.random.choice(len(keys))
     direction = np.array([1.0, 0.0])
     
@@ -247,7 +250,7 @@ def display_pose_sequence():
         if key == ord('q'):
             break
         elif key == ord('n'):
-            current_idx = find_next_pose(embedding, current_idx, direction)
+            current_idx = find_next_pose(space, current_idx, direction)
         elif key == ord('r'):
             current_idx = np.random.choice(len(keys))
         elif key == ord('a'):  # Rotate direction left
@@ -2,12 +2,21 @@
 import os
 import json
 import gzip
+import time
 import base64
+import shutil
 import numpy as np
 from annoy import AnnoyIndex
 import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-print("Precomputing Annoy index for Hough data...")
+from feature_store import write_store_for_pickle
+from hough_embedding import EMBED_DIMS, build_embedding_index, generation_probe
+
+# Row i of VECTORS_FILE is Annoy item i: the raw uint8 sinusoids, kept for exact re-ranking
+VECTORS_FILE = 'pickles/hough_vectors.npy'
+NUM_WORKERS = max(1, (os.cpu_count() or 2) - 1)
 
 def decode_base64_gzip(encoded):
     b64data    = encoded['data']
@@ -17,55 +26,124 @@ def decode_base64_gzip(encoded):
     shape = encoded['shape']
     return arr.reshape(shape)
 
-def load_hough_data(json_folder):
-    keys = []
-    hough_list = []
-    metadata = {}
+def decode_part(job):
+    """Worker: decode one part file into a uint8 shard on disk.
 
-    for filename in sorted(os.listdir(json_folder)):
-        if not filename.endswith('.json'):
-            continue
-        filepath = os.path.join(json_folder, filename)
-        with open(filepath, 'r') as f:
+    Only this one part is ever in the worker's memory. Returns
+    (filename, keys, paths, shard file or None, error or None).
+    """
+    json_folder, filename, shard_file = job
+    try:
+        with open(os.path.join(json_folder, filename), 'r') as f:
             data = json.load(f)
+        keys, paths, rows = [], [], []
         for key, val in data.items():
             if 'hough_sinusoids' in val:
-                arr = decode_base64_gzip(val['hough_sinusoids'])
-                hough_list.append(arr.flatten().astype(np.float32))
+                rows.append(decode_base64_gzip(val['hough_sinusoids']).ravel())
                 keys.append(key)
-                metadata[key] = {
-                    'path': val.get('path', ''),
-                    'file': filename
-                }
-
-    flattened = np.vstack(hough_list)
-    return keys, flattened, metadata
-
-def build_and_save_index(flattened, keys, metadata,
-                         output_index='pickles/hough.ann',
-                         output_meta='pickles/hough_meta.pkl',
-                         n_trees=10):
-    # ensure output dir exists
+                paths.append(val.get('path', ''))
+        del data
+        if not rows:
+            return filename, [], [], None, None
+        np.save(shard_file, np.vstack(rows))
+        return filename, keys, paths, shard_file, None
+    except Exception as e:
+        return filename, [], [], None, f"{type(e).__name__}: {e}"
+
+def decode_parts(json_folder, shard_dir, workers=NUM_WORKERS):
+    """Yield decoded parts in file order while the pool works on the next ones.
+
+    workers <= 1 decodes in this process, without a pool: spawned workers import
+    the caller's __main__ again, which must not happen inside a running server.
+    """
+    filenames = [f for f in sorted(os.listdir(json_folder)) if f.endswith('.json')]
+    jobs = [(json_folder, f, os.path.join(shard_dir, f"{i:05d}.npy")) for i, f in enumerate(filenames)]
+    if workers <= 1:
+        yield from map(decode_part, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # chunksize 1: parts are large, one at a time per worker keeps memory flat
+        yield from pool.map(decode_part, jobs)
+
+def build_index(json_folder='json_minimal_edges_base64',
+                output_index='pickles/hough.ann',
+                output_meta='pickles/hough_meta.pkl',
+                output_vectors=VECTORS_FILE,
+                n_trees=10, workers=NUM_WORKERS):
+    """Stream every part file into a uint8 memmap and an on-disk Annoy index.
+
+    Peak memory is a few part files in the workers, independent of the number of
+    images: decoded rows go to shards, the shards are copied into one
+    preallocated memmap, and Annoy builds its trees in the index file, not in RAM.
+    """
     os.makedirs(os.path.dirname(output_index), exist_ok=True)
+    start = time.time()
+
+    # 1. Decode parts in parallel into per-part shards
+    shard_dir = output_vectors + '.shards'
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.makedirs(shard_dir)
+    keys, metadata, shards = [], {}, []
+    try:
+        for filename, part_keys, paths, shard_file, error in decode_parts(json_folder, shard_dir, workers):
+            if error:
+                print(f"⚠️ Skipping {filename}: {error}")
+                continue
+            if shard_file is None:
+                continue
+            shards.append(shard_file)
+            keys.extend(part_keys)
+            for key, path in zip(part_keys, paths):
+                metadata[key] = {'path': path, 'file': filename}
+            print(f"Decoded {filename} ({len(part_keys)} images, {len(keys)} total)")
+        if not keys:
+            raise ValueError(f"No Hough data found in '{json_folder}'")
+
+        # 2. Merge the shards into one preallocated memmap (row = Annoy item id)
+        dim = int(np.load(shards[0], mmap_mode='r').shape[1])
+        vectors = np.lib.format.open_memmap(output_vectors + '.tmp', mode='w+', dtype=np.uint8, shape=(len(keys), dim))
+        row = 0
+        for shard_file in shards:
+            shard = np.load(shard_file, mmap_mode='r')
+            vectors[row:row + len(shard)] = shard
+            row += len(shard)
+            del shard
+            os.remove(shard_file)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
 
-    dim = flattened.shape[1]
+    # 3. Build on disk, trees in parallel threads. Everything is written under
+    # temporary names and renamed: a running hough_server.py has the old files
+    # memory-mapped and must never see them half written
     index = AnnoyIndex(dim, metric='angular')
-    for i, vec in enumerate(flattened):
-        index.add_item(i, vec)
-    index.build(n_trees)
-    index.save(output_index)
+    index.on_disk_build(output_index + '.tmp')
+    for i in range(len(vectors)):
+        index.add_item(i, vectors[i].astype(np.float32))
+    index.build(n_trees, n_jobs=-1)
+    index.unload()
+    vectors.flush()
+    probe = generation_probe(vectors)
+    del vectors
 
     # save metadata, keys and dim
     meta = {
         'keys':     keys,
         'metadata': metadata,
-        'dim':      dim
+        'dim':      dim,
+        'probe':    probe
     }
-    with open(output_meta, 'wb') as f:
+    with open(output_meta + '.tmp', 'wb') as f:
         pickle.dump(meta, f)
+    # Memory-mappable key table first, so the server loads without unpickling the key
+    # list, and the .ann last: the server checks the probe of every file against it
+    write_store_for_pickle(output_meta, meta)
+    os.replace(output_vectors + '.tmp', output_vectors)
+    os.replace(output_meta + '.tmp', output_meta)
+    os.replace(output_index + '.tmp', output_index)
 
-    print(f"Built and saved Annoy index to {output_index}")
-    print(f"Saved metadata (with dim={dim}) to {output_meta}")
+    print(f"Built and saved Annoy index ({len(keys)} items, {n_trees} trees) to {output_index} in {time.time() - start:.1f}s")
+    print(f"Saved metadata (with dim={dim}) to {output_meta} and vectors to {output_vectors}")
+    print("Running servers pick it up on their next request")
 
 if __name__ == '__main__':
     import argparse
@@ -78,12 +156,23 @@ if __name__ == '__main__':
                         help='Output Annoy index file (in pickles/)')
     parser.add_argument('--meta-out', default='pickles/hough_meta.pkl',
                         help='Output metadata pickle (in pickles/)')
+    parser.add_argument('--vectors-out', default=VECTORS_FILE,
+                        help='Output uint8 vector matrix (.npy, memory-mappable)')
     parser.add_argument('--trees', type=int, default=10,
                         help='Number of trees for Annoy')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                        help='Processes decoding part files')
+    parser.add_argument('--dims', type=int, default=EMBED_DIMS,
+                        help='Also build a PCA embedding index of this size (0 = raw index only)')
     args = parser.parse_args()
 
-    keys, flattened, metadata = load_hough_data(args.json_folder)
-    build_and_save_index(flattened, keys, metadata,
-                         output_index=args.index_out,
-                         output_meta=args.meta_out,
-                         n_trees=args.trees)
+    print("Precomputing Annoy index for Hough data...")
+    build_index(args.json_folder,
+                output_index=args.index_out,
+                output_meta=args.meta_out,
+                output_vectors=args.vectors_out,
+                n_trees=args.trees,
+                workers=args.workers)
+    if args.dims:
+        stem = os.path.splitext(args.index_out)[0]
+        build_embedding_index(args.vectors_out, stem + '_pca.npz', stem + '_pca.ann', dims=args.dims)
@@ -0,0 +1,78 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class QueryCache:
+    """Bounded, thread-safe LRU of query results with an optional time-to-live.
+
+    get_or_load(key, load) returns the cached value or runs load(key) on a miss.
+    Two threads missing the same key at once both run load; the result is the same.
+    """
+
+    def __init__(self, max_items=1024, ttl_seconds=None):
+        self.max_items = max_items
+        self.ttl = ttl_seconds
+        self.items = OrderedDict()  # key -> (stored at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """(True, value) for a live entry, else (False, None)"""
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self.items.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self.items[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic(), value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        hit, value = self.get(key)
+        if not hit:
+            value = load(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.items), 'max_items': self.max_items, 'ttl_seconds': self.ttl,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+def quantize(values, step):
+    """Snap a query to a grid so near-identical queries share a cache entry"""
+    return np.floor_divide(np.asarray(values), step)
+
+
+def query_key(*parts):
+    """Short stable hash of a query: arrays by dtype, shape and bytes, anything else by repr"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            h.update(f"{part.dtype.str}{part.shape}".encode())
+            h.update(part.data)
+        else:
+            h.update(repr(part).encode())
+        h.update(b'|')
+    return h.hexdigest()
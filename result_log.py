@@ -0,0 +1,111 @@
+import os
+import time
+import zlib
+import pickle
+import struct
+
+# Record layout: <payload length: uint32><crc32 of payload: uint32><pickled (key, value)>
+HEADER = struct.Struct('<II')
+CHECKPOINT_EVERY = 200       # records between fsyncs
+CHECKPOINT_SECONDS = 30.0    # ... or this many seconds, whichever comes first
+
+
+class ResultLog:
+    """Append-only, crash-safe log of (key, result) records for long extraction runs.
+
+    Results are appended as they are produced and fsync'ed every CHECKPOINT_EVERY
+    records / CHECKPOINT_SECONDS, so a crash loses at most one checkpoint interval.
+    On open the log is scanned, a torn record at the tail (partial write or bad
+    checksum) is cut off, and the keys already logged are available via done_keys
+    so the run resumes after the last committed record. Only keys are kept in
+    memory; values are streamed back from disk by items().
+    """
+
+    def __init__(self, path, checkpoint_every=CHECKPOINT_EVERY, checkpoint_seconds=CHECKPOINT_SECONDS):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.done_keys = set()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        valid_end = self._scan()
+        if os.path.exists(path) and os.path.getsize(path) > valid_end:
+            print(f"⚠️ Dropping torn tail of {path} ({os.path.getsize(path) - valid_end} bytes)")
+            os.truncate(path, valid_end)
+        self._file = open(path, 'ab')
+        if self.done_keys:
+            print(f"🔁 Resuming from {path}: {len(self.done_keys)} results already logged")
+
+    def _records(self):
+        """Yield (end offset, key, value) for every intact record"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                length, crc = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                offset += HEADER.size + length
+                key, value = pickle.loads(payload)
+                yield offset, key, value
+
+    def _scan(self):
+        valid_end = 0
+        for valid_end, key, _ in self._records():
+            self.done_keys.add(key)
+        return valid_end
+
+    def __contains__(self, key):
+        return key in self.done_keys
+
+    def __len__(self):
+        return len(self.done_keys)
+
+    def append(self, key, value):
+        payload = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self.done_keys.add(key)
+        self._pending += 1
+        if (self._pending >= self.checkpoint_every or
+                time.monotonic() - self._last_commit >= self.checkpoint_seconds):
+            self.commit()
+
+    def commit(self):
+        """Make every appended record durable"""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def items(self):
+        """Stream (key, value) back from disk; a later record for a key overrides an earlier one"""
+        self.commit()
+        for _, key, value in self._records():
+            yield key, value
+
+    def close(self):
+        if not self._file.closed:
+            self.commit()
+            self._file.close()
+
+    def remove(self):
+        """Delete the log once its contents are safely in the final store"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""One process tree for the whole site instead of main.py, poses_backend.py and hough_server.py.
+
+    /          main.py (pages, chunks, thumbnails, /api/similar-colors)
+    /hough     hough_server.py
+    /poses     poses_backend.py
+
+With gunicorn (Linux/macOS) the apps and their read-only data (Annoy index, key
+tables, pose and UMAP arrays) are loaded once in the master before it forks, so the
+workers share that memory copy-on-write and the GIL is per worker. Without gunicorn
+(Windows) it runs one threaded process.
+"""
+import os
+import argparse
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
+# The pages read these from /services.js to find the APIs on the same origin
+MOUNTS = {'hough': '/hough', 'poses': '/poses'}
+HOST = '127.0.0.1'  # main.py's /run-* routes and the Hough admin endpoints are on this port too
+PORT = 8000
+WORKERS = min(4, os.cpu_count() or 1)  # every worker holds its own caches on top of the shared data
+THREADS = 4                            # threads per worker, for requests waiting on disk
+TIMEOUT = 120                          # s; a Hough index built from JSON on first start takes longer, see preload()
+PRELOAD_TIMEOUT = 600                  # s to wait for that build before serving without the index
+
+
+def create_app():
+    import main
+    import hough_server
+    import poses_backend
+
+    main.app.config['SERVICES'] = MOUNTS
+    return DispatcherMiddleware(main.app, {
+        MOUNTS['hough']: hough_server.app,
+        MOUNTS['poses']: poses_backend.app,
+    })
+
+
+def preload():
+    """Load everything the workers only read, before they are forked"""
+    import main
+    import hough_server
+    import poses_backend
+    from histogram_search import HistogramAnnIndex
+
+    if not hough_server.HDB.loading_complete.is_set():
+        # Built in a thread of this process, which the workers do not inherit
+        print("⏳ Waiting for the Hough index (run precompute_annoy.py to skip this)...")
+        if not hough_server.HDB.loading_complete.wait(PRELOAD_TIMEOUT):
+            print(f"⚠️ Hough index still building after {PRELOAD_TIMEOUT}s: serving without it, "
+                  "the workers load it once it is written (see /hough/status)")
+    if hough_server.HDB.error:
+        raise SystemExit(f"❌ Could not build the Hough index: {hough_server.HDB.error}")
+    print(f"Hough index: {len(hough_server.HDB)} images")
+    print(f"Pose data: {poses_backend.pose_store.get() is not None}, "
+          f"UMAP data: {poses_backend.umap_store.get() is not None}")
+    if HistogramAnnIndex.exists():
+        main.histogram_ann()
+    main.chunk_hashes()
+
+
+def run_gunicorn(app, args):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{args.host}:{args.port}")
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', TIMEOUT)
+            self.cfg.set('preload_app', True)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the site and the Hough and pose APIs from one port')
+    parser.add_argument('--host', default=HOST, help='Interface to bind; 0.0.0.0 makes every app public')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Worker processes (gunicorn only)')
+    parser.add_argument('--threads', type=int, default=THREADS, help='Threads per worker')
+    args = parser.parse_args()
+
+    app = create_app()
+    preload()
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        from werkzeug.serving import run_simple
+        print("⚠️ gunicorn not available (it does not run on Windows): serving from one threaded process")
+        print(f"Serving on http://localhost:{args.port}")
+        run_simple(args.host, args.port, app, threaded=True)
+        return
+    print(f"Serving on http://localhost:{args.port} with {args.workers} workers x {args.threads} threads")
+    run_gunicorn(app, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 import sys
+import argparse
 import cv2
-import mediapipe as mp
 
 IMAGE_PATH = "./wikiart/Abstract_Expressionism/andy-warhol_oxidation-painting-1978-1.jpg"
 
@@ -11,6 +11,7 @@ def draw_pose_on_image(image_path: str) -> None:
 
     annotated = image_bgr.copy()
 
+    import mediapipe as mp
     mp_pose = mp.solutions.pose
     mp_drawing = mp.solutions.drawing_utils
     mp_styles = mp.solutions.drawing_styles
@@ -34,11 +35,41 @@ def draw_pose_on_image(image_path: str) -> None:
                 connection_drawing_spec=mp_drawing.DrawingSpec(color=(0,255,0), thickness=2, circle_radius=2)
             )
 
+    show(annotated)
+
+def draw_pose_from_server(image_path: str, server: str) -> None:
+    """Same as draw_pose_on_image, but the pose comes from a running inference_server.py"""
+    from inference_client import InferenceClient
+    from pose_drawing import draw_landmarks
+
+    image_bgr = cv2.imread(image_path)
+    if image_bgr is None:
+        raise FileNotFoundError(f"Could not read image: {image_path}")
+
+    annotated = image_bgr.copy()
+    landmarks = InferenceClient(server).infer('pose', [image_path])[0]
+    if isinstance(landmarks, Exception):
+        raise landmarks
+    if not landmarks:
+        print("No pose detected.")
+    else:
+        draw_landmarks(annotated, landmarks)
+    show(annotated)
+
+def show(annotated) -> None:
     cv2.imshow("Pose Detection", annotated)
     print("Press any key in the image window to close.")
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Draw the detected pose on one image')
+    parser.add_argument('image', nargs='?', default=IMAGE_PATH)
+    parser.add_argument('--server', default=None, metavar='URL',
+                        help='Get the pose from a running inference_server.py instead of loading MediaPipe')
+    args = parser.parse_args()
 
-    draw_pose_on_image(IMAGE_PATH)
+    if args.server:
+        draw_pose_from_server(args.image, args.server)
+    else:
+        draw_pose_on_image(args.image)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import os
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+from tqdm import tqdm
+
+from image_manifest import ImageManifest, scan_signatures
+
+# WebP thumbnails of every painting, by longest side:
+#   thumbnails/<size>/<path relative to IMAGE_DIR>.webp
+# PYRAMID_SIZES are built ahead by this script; other sizes are resized on request
+# (thumbnail_file) and kept next to them.
+IMAGE_DIR = './wikiart/'
+THUMBNAIL_DIR = './thumbnails'
+PYRAMID_SIZES = (64, 256, 1024)
+MAX_SIZE = 2048             # requests above the pyramid are capped here
+ON_DEMAND_STEP = 256        # ... and rounded up to this, so few sizes get cached
+THUMBNAIL_QUALITY = 80
+NUM_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+def level_for(size):
+    """Thumbnail size that serves a request for size px: the closest pyramid level at or above it"""
+    for level in PYRAMID_SIZES:
+        if size <= level:
+            return level
+    return min(MAX_SIZE, -(-size // ON_DEMAND_STEP) * ON_DEMAND_STEP)
+
+
+def thumbnail_path(rel_path, size):
+    return os.path.join(THUMBNAIL_DIR, str(size), rel_path + '.webp')
+
+
+def render_levels(img_path, rel_path, sizes):
+    """Decode the painting once and write a thumbnail per size, largest first, each atomically"""
+    with Image.open(img_path) as img:
+        # JPEGs decode straight at a reduced scale, never smaller than the largest size
+        img.draft('RGB', (max(sizes), max(sizes)))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        for size in sorted(sizes, reverse=True):
+            img.thumbnail((size, size), Image.LANCZOS)
+            output = thumbnail_path(rel_path, size)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            tmp_file = f"{output}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_file, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+            os.replace(tmp_file, output)
+
+
+def thumbnail_file(rel_path, size, image_dir=IMAGE_DIR):
+    """Thumbnail file covering size px of the painting at rel_path (relative to image_dir).
+
+    Uses the pyramid when it is up to date with the painting, else resizes now and keeps
+    the result. None when the painting does not exist or cannot be decoded.
+    """
+    rel_path = os.path.normpath(rel_path.replace('\\', '/'))
+    if os.path.isabs(rel_path) or rel_path.split(os.sep)[0] == '..':
+        return None
+    img_path = os.path.join(image_dir, rel_path)
+    try:
+        source_mtime = os.path.getmtime(img_path)
+    except OSError:
+        return None
+    level = level_for(size)
+    output = thumbnail_path(rel_path, level)
+    try:
+        if os.path.getmtime(output) >= source_mtime:
+            return output
+    except OSError:
+        pass
+    try:
+        render_levels(img_path, rel_path, [level])
+    except Exception as e:
+        print(f"⚠️ Could not make a thumbnail of {img_path}: {e}")
+        return None
+    return output
+
+
+def thumbnail_for(img_path, size):
+    """Thumbnail of an image path as stored in the pickles, or the path itself when there is none"""
+    rel_path = os.path.relpath(img_path, IMAGE_DIR)
+    return thumbnail_file(rel_path, size) or img_path
+
+
+def _build_one(job):
+    img_path, rel_path = job
+    try:
+        render_levels(img_path, rel_path, PYRAMID_SIZES)
+        return rel_path, None
+    except Exception as e:
+        return rel_path, f"{type(e).__name__}: {e}"
+
+
+def remove_thumbnails(rel_path):
+    """Every size of one painting's thumbnail, pyramid and on-demand"""
+    if not os.path.isdir(THUMBNAIL_DIR):
+        return
+    for size in os.listdir(THUMBNAIL_DIR):
+        path = thumbnail_path(rel_path, size)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_pyramid(image_dir=IMAGE_DIR, workers=NUM_WORKERS):
+    """Bring the pyramid up to date: only new and changed paintings are decoded"""
+    from feature_extraction import find_images_recursive
+
+    start = time.time()
+    manifest = ImageManifest('thumbnails').load()
+    current = scan_signatures(find_images_recursive(image_dir), image_dir)
+    stale, removed = manifest.diff(current)
+    # Thumbnails deleted by hand are rebuilt too
+    stale |= {rel for rel in current if not os.path.exists(thumbnail_path(rel, PYRAMID_SIZES[-1]))}
+    print(f"🖼️ {len(current)} paintings: {len(stale)} to render, {len(removed)} removed")
+
+    for rel_path in removed:
+        remove_thumbnails(rel_path)
+        manifest.forget(rel_path)
+
+    jobs = [(current[rel][0], rel) for rel in sorted(stale)]
+    errors = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for rel_path, error in tqdm(pool.map(_build_one, jobs, chunksize=16), total=len(jobs), desc="Thumbnails"):
+                if error:
+                    errors += 1
+                    print(f"⚠️ Skipping {rel_path}: {error}")
+                    continue
+                manifest.mark(rel_path, *current[rel_path])
+    finally:
+        # Also after an interruption: the next run continues where this one stopped
+        manifest.save()
+    print(f"✅ Thumbnail pyramid {PYRAMID_SIZES} up to date in {THUMBNAIL_DIR} "
+          f"({len(jobs) - errors} rendered, {errors} failed) in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or update the WebP thumbnail pyramid of the paintings')
+    parser.add_argument('--image-dir', default=IMAGE_DIR)
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    args = parser.parse_args()
+    build_pyramid(args.image_dir, args.workers)
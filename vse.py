@@ -83,6 +83,19 @@ def encode_array(arr: np.ndarray) -> dict:
         'data': b64_str
     }
 
+def compute_minimal_edges(gray):
+    """Encoded downscaled edges and Hough sinusoids of a full-resolution grayscale image"""
+    edges_full = canny_edge(gray)
+    edges_ds = quantize_downscale(edges_full, RESIZE_FACTOR)
+
+    # Precompute Hough sinusoids visualization on downscaled edges
+    hough_sinusoids_vis = create_hough_sinusoids(edges_ds)
+
+    return {
+        'edges_downscaled': encode_array(edges_ds),
+        'hough_sinusoids': encode_array(hough_sinusoids_vis),
+    }
+
 def process_single_image(img_path, base_folder):
     original = imread_unicode(img_path)
     if original is None:
@@ -90,20 +103,11 @@ def process_single_image(img_path, base_folder):
         return None, img_path
 
     gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
-    edges_full = canny_edge(gray)
-    edges_ds = quantize_downscale(edges_full, RESIZE_FACTOR)
-
-    # Precompute Hough sinusoids visualization on downscaled edges
-    hough_sinusoids_vis = create_hough_sinusoids(edges_ds)
 
     rel_path = os.path.relpath(img_path, base_folder)
     key = rel_path.replace(os.sep, '_')
 
-    data = {
-        'path': img_path,
-        'edges_downscaled': encode_array(edges_ds),
-        'hough_sinusoids': encode_array(hough_sinusoids_vis),
-    }
+    data = {'path': img_path, **compute_minimal_edges(gray)}
     return key, data
 
 def save_json_chunks(data_dict, base_output_path, max_json_size=MAX_JSON_SIZE_BYTES):
@@ -161,23 +165,15 @@ def process_style_folder(style_folder_path, max_workers=NUM_WORKERS):
     save_json_chunks(all_data, base_output_path)
 
 def main():
-    style_folders = [os.path.join(INPUT_FOLDER, d) for d in os.listdir(INPUT_FOLDER)
-                     if os.path.isdir(os.path.join(INPUT_FOLDER, d))]
-    if not style_folders:
+    if not os.path.isdir(INPUT_FOLDER):
         print(f"No style folders found in {INPUT_FOLDER}")
         return
 
-    for style_folder in style_folders:
-        style_name = os.path.basename(style_folder)
-        output_folder = os.path.join(JSON_OUTPUT_DIR, style_name)
-
-        # Check if output folder exists and has JSON files
-        if os.path.exists(output_folder) and any(f.endswith('.json') for f in os.listdir(output_folder)):
-            print(f"Skipping '{style_name}' — already processed.")
-            continue
-
-        print(f"Processing style folder: {style_folder}")
-        process_style_folder(style_folder, NUM_WORKERS)
+    # Only new or changed images are recomputed and merged into their style's JSON parts;
+    # images deleted from INPUT_FOLDER are pruned. process_style_folder() rebuilds one style.
+    from feature_extraction import MinimalEdgesExtractor, find_images_recursive, run_extractors
+    image_files = find_images_recursive(INPUT_FOLDER)
+    run_extractors([MinimalEdgesExtractor()], image_files, INPUT_FOLDER, NUM_WORKERS)
 
 
 if __name__ == "__main__":